@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""bench_daemon.py
+Records request latency and throughput of wifipasswords serve against
+calling WifiPasswords directly, which runs its subprocesses for every query.
+The server and the direct calls use the linux class with the stub nmcli
+from stubs.py, so latency is the stub latency per subprocess.
+Usage: python benchmarks/bench_daemon.py [--profiles 100] [--latency 0.01]
+       [--requests 2000] [--clients 1,4,16] [--duration 2] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import StubEnvironment  # noqa: E402
+from wifipasswords import WifiPasswords  # noqa: E402
+from wifipasswords.client import WifiPasswordsClient  # noqa: E402
+from wifipasswords.daemon import SnapshotServer  # noqa: E402
+from wifipasswords.wifipasswords_linux import WifiPasswordsLinux  # noqa: E402
+
+
+class BenchWifiPasswords(WifiPasswords):
+    # an existing but empty NetworkManager directory, so everything comes from the stub nmcli
+    def __init__(self, nm_path: str) -> None:
+        self.platform = "Linux"
+        self._WifiPasswordsSubclass = WifiPasswordsLinux(nm_path=nm_path, use_keyfiles=False)
+
+
+OPERATIONS = {
+    "password": lambda pw: pw.get_single_password("network:1"),
+    "connected_passwords": lambda pw: pw.get_currently_connected_passwords(),
+    "passwords": lambda pw: pw.get_passwords(),
+    "visible": lambda pw: pw.get_visible_networks(True),
+}
+
+
+def percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def latency(function, requests: int) -> dict:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+    }
+
+
+def throughput(socket_path: str, clients: int, duration: float) -> float:
+    counts = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int) -> None:
+        with WifiPasswordsClient(socket_path) as client:
+            while time.perf_counter() < deadline:
+                client.get_single_password("network:1")
+                counts[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Latency and throughput of wifipasswords serve.")
+    parser.add_argument("--profiles", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--direct-requests", type=int, default=5)
+    parser.add_argument("--clients", default="1,4,16")
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--json", metavar="PATH", help="also save results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    with StubEnvironment(args.profiles, args.latency) as stubs:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            socket_path = os.path.join(temp_dir, "wifipasswords.sock")
+            server = SnapshotServer(
+                socket_path, refresh_interval=3600, wifipasswords=BenchWifiPasswords(temp_dir)
+            )
+            start = time.perf_counter()
+            server.start()
+            server.serve_in_thread()
+            print(
+                f"first snapshot {time.perf_counter() - start:.3f}s, {stubs.forks()} forks, "
+                f"{args.profiles} profiles, {args.latency}s per subprocess"
+            )
+            print(f"{'operation':<20} {'mode':<8} {'p50 ms':>9} {'p99 ms':>9} {'forks':>6}")
+            try:
+                with WifiPasswordsClient(socket_path) as client:
+                    for operation, function in OPERATIONS.items():
+                        for mode, target, requests in (
+                            ("direct", None, args.direct_requests),
+                            ("serve", client, args.requests),
+                        ):
+                            stubs.reset()
+                            if target is None:
+                                # a fresh instance per query, as a tool shelling out would have
+                                result = latency(
+                                    lambda: function(BenchWifiPasswords(temp_dir)), requests
+                                )
+                            else:
+                                result = latency(lambda: function(target), requests)
+                            result.update(
+                                operation=operation,
+                                mode=mode,
+                                forks_per_request=stubs.forks() / requests,
+                            )
+                            results.append(result)
+                            print(
+                                f"{operation:<20} {mode:<8} {result['p50_ms']:>9.3f} "
+                                f"{result['p99_ms']:>9.3f} {result['forks_per_request']:>6.1f}"
+                            )
+
+                print(f"{'clients':>7} {'requests/s':>11}")
+                for clients in [int(clients) for clients in args.clients.split(",")]:
+                    rate = throughput(socket_path, clients, args.duration)
+                    results.append({"clients": clients, "requests_per_second": round(rate)})
+                    print(f"{clients:>7} {rate:>11.0f}")
+            finally:
+                server.close()
+
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(results, fout, indent=1)
+
+
+if __name__ == "__main__":
+    main()
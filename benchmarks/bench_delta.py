@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""bench_delta.py
+Compares the size and time of a full JSON export with a delta export against
+the manifest of the previous one, at several churn rates, and the time for the
+receiving side to verify and apply each delta.
+Usage: python benchmarks/bench_delta.py [profiles]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wifipasswords import delta, export  # noqa: E402
+from wifipasswords.records import NetworkProfile  # noqa: E402
+
+
+def profiles(count: int) -> dict:
+    return {
+        f"network {n}": NetworkProfile(auth="WPA2-Personal", psk=f"passphrase {n}")
+        for n in range(count)
+    }
+
+
+def churned(data: dict, fraction: float) -> dict:
+    # a third of the churn each changed, removed and added
+    churn = max(1, int(len(data) * fraction / 3)) if fraction else 0
+    result = dict(data)
+    ssids = list(data)
+    for ssid in ssids[:churn]:
+        result[ssid] = NetworkProfile(auth="WPA2-Personal", psk=f"changed {ssid}")
+    for ssid in ssids[churn : 2 * churn]:
+        del result[ssid]
+    for n in range(churn):
+        result[f"new network {n}"] = NetworkProfile(auth="WPA2-Personal", psk=f"new {n}")
+    return result
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    old = profiles(count)
+    manifest = delta.Manifest.from_data(old)
+    print(f"profiles={count}")
+    print(
+        f"{'churn':>6} {'full KB':>9} {'full ms':>8} {'delta KB':>9} {'delta ms':>9} {'apply ms':>9}"
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "networks_data.json")
+        for fraction in (0.0, 0.01, 0.1):
+            new = churned(old, fraction)
+            start = time.perf_counter()
+            export.save_json(path, new, fsync=False)
+            full_ms = (time.perf_counter() - start) * 1000
+            full_kb = os.path.getsize(path) / 1024
+
+            start = time.perf_counter()
+            export.save_json(path, new, fsync=False, since=manifest)
+            delta_ms = (time.perf_counter() - start) * 1000
+            delta_kb = os.path.getsize(path) / 1024
+
+            # the receiving side keeps the manifest of what it has, so it only
+            # fingerprints the profiles in the delta
+            start = time.perf_counter()
+            delta_data = delta.load_delta(path)
+            new_manifest = manifest.apply(delta_data)
+            applied = delta.apply_delta(old, delta_data, verify=False)
+            apply_ms = (time.perf_counter() - start) * 1000
+            assert applied == new and new_manifest.etag == delta_data["etag"]
+            print(
+                f"{fraction:>6.0%} {full_kb:>9.1f} {full_ms:>8.1f} {delta_kb:>9.1f} "
+                f"{delta_ms:>9.1f} {apply_ms:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""bench_export.py
+Times each export format on its own, every single file format saved one after
+another, and the same formats written by export.save() from a single pass,
+from a dictionary and from WifiPasswordsLinux.iter_passwords() reading
+NetworkManager keyfiles, where each separate save reads every profile again.
+Usage: python benchmarks/bench_export.py [profiles]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wifipasswords import export  # noqa: E402
+from wifipasswords.records import NetworkProfile  # noqa: E402
+from wifipasswords.wifipasswords_linux import WifiPasswordsLinux  # noqa: E402
+
+FILE_FORMATS = ("json", "ndjson", "csv", "wpa_supplicant")
+
+
+def profiles(count: int) -> dict:
+    return {
+        f"network {n}": NetworkProfile(
+            auth="WPA2-Personal" if n % 4 else "Open", psk=f"passphrase {n}" if n % 4 else ""
+        )
+        for n in range(count)
+    }
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    data = profiles(count)
+    print(f"profiles={count}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        def target(name: str) -> tuple:
+            return (name, os.path.join(temp_dir, name))
+
+        separate = 0.0
+        for name in FILE_FORMATS:
+            elapsed = timed(lambda: export.save(data, [target(name)], fsync=False))
+            separate += elapsed
+            print(f"{name:<16} {elapsed:9.1f}ms")
+        subset = dict(list(data.items())[: count // 10])
+        for name in ("keyfile", "wlanprofile"):
+            elapsed = timed(lambda: export.save(subset, [target(name)], fsync=False))
+            print(f"{name:<16} {elapsed:9.1f}ms  ({len(subset)} files)")
+        print(f"{'separate':<16} {separate:9.1f}ms  ({len(FILE_FORMATS)} passes)")
+        together = timed(
+            lambda: export.save(data, [target(name) for name in FILE_FORMATS], fsync=False)
+        )
+        print(f"{'one pass':<16} {together:9.1f}ms")
+
+        # the keyfiles written above as the source, a new instance per pass so nothing is cached
+        def source():
+            return WifiPasswordsLinux(
+                nm_path=os.path.join(temp_dir, "keyfile")
+            ).iter_passwords()
+
+        print(f"from iter_passwords() over {len(subset)} keyfiles")
+        separate = sum(
+            timed(lambda: export.save(source(), [target(name)], fsync=False))
+            for name in FILE_FORMATS
+        )
+        print(f"{'separate':<16} {separate:9.1f}ms  ({len(FILE_FORMATS)} passes)")
+        together = timed(
+            lambda: export.save(source(), [target(name) for name in FILE_FORMATS], fsync=False)
+        )
+        print(f"{'one pass':<16} {together:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""bench_nmcli_batch.py
+Measures forks per profile for WifiPasswordsLinux.get_passwords when
+keyfiles can't be read and profiles are fetched through nmcli.
+A stub nmcli is put on PATH so this runs on any linux box.
+Usage: python benchmarks/bench_nmcli_batch.py [profiles] [latency seconds]
+"""
+
+import os
+import sys
+import stat
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wifipasswords.wifipasswords_linux import WifiPasswordsLinux  # noqa: E402
+
+STUB_NMCLI = """#!{python}
+import sys, time
+with open({counter!r}, "a") as fout:
+    fout.write("x")
+time.sleep({latency})
+args = sys.argv[1:]
+if args[-1] == "c":
+    for n in range({profiles}):
+        print("network\\\\:%d:802-11-wireless" % n)
+    sys.exit(0)
+ids = [args[i + 1] for i, arg in enumerate(args) if arg == "id"]
+for name in ids:
+    n = name.split(":")[1]
+    print("connection.id:" + name.replace(":", "\\\\:"))
+    print("connection.metered:no")
+    print("802-11-wireless.cloned-mac-address:")
+    print("802-11-wireless-security.key-mgmt:wpa-psk")
+    print("802-11-wireless-security.psk:secret\\\\:%s" % n)
+"""
+
+
+def run(profiles: int, latency: float, batch_size: int, stub_dir: str, counter: str) -> None:
+    open(counter, "w").close()
+    wifipw = WifiPasswordsLinux(nm_path=stub_dir, use_keyfiles=False, batch_size=batch_size)
+    start = time.perf_counter()
+    results = wifipw.get_passwords()
+    elapsed = time.perf_counter() - start
+    with open(counter) as fin:
+        # one fork is the NAME,TYPE profile listing
+        forks = len(fin.read()) - 1
+    assert len(results) == profiles
+    print(
+        f"batch_size={batch_size:<4} forks={forks:<5} forks/profile={forks / profiles:<7.3f} "
+        f"time={elapsed:.3f}s"
+    )
+
+
+def main() -> None:
+    profiles = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    with tempfile.TemporaryDirectory() as stub_dir:
+        counter = os.path.join(stub_dir, "forks")
+        stub_path = os.path.join(stub_dir, "nmcli")
+        with open(stub_path, "w") as fout:
+            fout.write(
+                STUB_NMCLI.format(
+                    python=sys.executable, counter=counter, latency=latency, profiles=profiles
+                )
+            )
+        os.chmod(stub_path, os.stat(stub_path).st_mode | stat.S_IEXEC)
+        os.environ["PATH"] = stub_dir + os.pathsep + os.environ["PATH"]
+
+        print(f"{profiles} profiles, {latency}s per nmcli call")
+        for batch_size in (1, 4, 16, 64):
+            run(profiles, latency, batch_size, stub_dir, counter)
+
+
+if __name__ == "__main__":
+    main()
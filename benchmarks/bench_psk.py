@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""bench_psk.py
+Times precomputing wpa_supplicant psks serially, in a process pool and
+from a warm persistent cache.
+Usage: python benchmarks/bench_psk.py [networks]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wifipasswords.psk import PskCache, precompute_psks  # noqa: E402
+
+
+def timed(name: str, networks: list, **kwargs) -> None:
+    start = time.perf_counter()
+    results = precompute_psks(networks, **kwargs)
+    elapsed = time.perf_counter() - start
+    assert len(results) == len(networks)
+    print(f"{name:<12} {elapsed * 1000:9.1f}ms {elapsed / len(networks) * 1e6:8.1f}us/network")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    networks = [(f"network {n}", f"passphrase {n}") for n in range(count)]
+    print(f"networks={count} cpus={os.cpu_count()}")
+    timed("serial", networks, processes=1)
+    timed("pool", networks)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "psk_cache.json")
+        precompute_psks(networks, cache=PskCache(path))
+        timed("warm cache", networks, cache=PskCache(path))
+
+
+if __name__ == "__main__":
+    main()
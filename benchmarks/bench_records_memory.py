@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""bench_records_memory.py
+Compares the memory used by network profiles held as plain dictionaries
+against NetworkProfile __slots__ records.
+Usage: python benchmarks/bench_records_memory.py [records]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wifipasswords.records import NetworkProfile  # noqa: E402
+
+AUTHS = ("wpa-psk", "Open", "WPA2-Personal", "sae")
+
+
+def as_dict(n: int) -> dict:
+    return {
+        "auth": AUTHS[n % 4],
+        "psk": f"secret{n}",
+        "metered": False,
+        "macrandom": "Disabled",
+    }
+
+
+def as_record(n: int) -> NetworkProfile:
+    return NetworkProfile(auth=AUTHS[n % 4], psk=f"secret{n}")
+
+
+def measure(name: str, build, records: int) -> int:
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = {f"network {n}": build(n) for n in range(records)}
+    elapsed = time.perf_counter() - start
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(data) == records
+    print(
+        f"{name:<14} total={used / 2**20:8.1f}MiB per record={used / records:6.1f}B "
+        f"build={elapsed:.2f}s"
+    )
+    return used
+
+
+def main() -> None:
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dict_used = measure("dict", as_dict, records)
+    record_used = measure("NetworkProfile", as_record, records)
+    print(f"NetworkProfile uses {record_used / dict_used:.0%} of the dict memory")
+
+
+if __name__ == "__main__":
+    main()
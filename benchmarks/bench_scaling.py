@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""bench_scaling.py
+Records latency and fork count of get_passwords, get_visible_networks and
+get_dns_config for each platform class against the number of profiles /
+networks / interfaces and the subprocess concurrency.
+Stub nmcli, netsh, security, airport, scutil and ifconfig binaries are put
+on PATH (see stubs.py) so every platform runs on a plain linux box.
+windows-export is the Windows class reading every profile from one
+netsh wlan export, windows is the per profile netsh wlan show profile path.
+macos-dump reads every secret from one security dump-keychain -d, macos
+runs security find-generic-password per SSID.
+Usage: python benchmarks/bench_scaling.py [--sizes 10,100] [--concurrency 1,4,adaptive]
+       [--latency 0.01] [--platforms linux,windows,windows-export,macos,macos-dump] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import StubEnvironment  # noqa: E402
+from wifipasswords import concurrency, metrics  # noqa: E402
+from wifipasswords import wifipasswords_linux, wifipasswords_macos  # noqa: E402
+from wifipasswords import wifipasswords_windows  # noqa: E402
+from wifipasswords.metrics import run_command  # noqa: E402
+
+PLATFORM_MODULES = (wifipasswords_linux, wifipasswords_macos, wifipasswords_windows)
+# run_command in metrics holds the slots that gate forks, the platform modules only size pools
+CONTROLLER_MODULES = (metrics,) + PLATFORM_MODULES
+
+
+class BenchWifiPasswordsWindows(wifipasswords_windows.WifiPasswordsWindows):
+    # the windows runner passes STARTUPINFO which only exists on windows
+    @staticmethod
+    def _command_runner(shell_commands: list) -> str:
+        return run_command(
+            shell_commands, stderr=subprocess.PIPE, stdin=subprocess.PIPE
+        ).stdout.decode("utf-8")
+
+
+def make_linux(temp_dir: str):
+    # an existing but empty NetworkManager directory, so profiles come from nmcli
+    return wifipasswords_linux.WifiPasswordsLinux(nm_path=temp_dir, use_keyfiles=False)
+
+
+PLATFORMS = {
+    "linux": make_linux,
+    "windows": lambda temp_dir: BenchWifiPasswordsWindows(),
+    "windows-export": lambda temp_dir: BenchWifiPasswordsWindows(use_export=True),
+    "macos": lambda temp_dir: wifipasswords_macos.WifiPasswordsMacos(),
+    "macos-dump": lambda temp_dir: wifipasswords_macos.WifiPasswordsMacos(use_dump=True),
+}
+
+OPERATIONS = {
+    "get_passwords": lambda wifipw: len(wifipw.get_passwords()),
+    "get_visible_networks": lambda wifipw: len(wifipw.get_visible_networks(True)),
+    "get_dns_config": lambda wifipw: len(wifipw.get_dns_config(True)),
+}
+
+
+def use_controller(limit: str) -> None:
+    """
+    Installs a fixed size controller, or a fresh adaptive one, in metrics and every
+    platform module.\n
+    """
+    if limit == "adaptive":
+        controller = concurrency.ConcurrencyController()
+    else:
+        controller = concurrency.ConcurrencyController(int(limit), int(limit), int(limit))
+    for module in CONTROLLER_MODULES:
+        module.controller = controller
+
+
+def run(stubs, platform: str, operation: str, size: int, limit: str, latency: float) -> dict:
+    stubs.configure(size, latency)
+    use_controller(limit)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        wifipw = PLATFORMS[platform](temp_dir)
+        start = time.perf_counter()
+        items = OPERATIONS[operation](wifipw)
+        elapsed = time.perf_counter() - start
+    forks = stubs.forks()
+    return {
+        "platform": platform,
+        "operation": operation,
+        "size": size,
+        "concurrency": limit,
+        "latency": latency,
+        "seconds": round(elapsed, 4),
+        "forks": forks,
+        "items": items,
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Scaling benchmark for the platform classes.")
+    parser.add_argument("--sizes", default="10,100,500")
+    parser.add_argument("--concurrency", default="1,4,16,adaptive")
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--platforms", default=",".join(PLATFORMS))
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--json", metavar="PATH", help="also save results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(
+        f"{'platform':<14} {'operation':<21} {'size':>5} {'conc':>8} "
+        f"{'seconds':>8} {'forks':>6} {'forks/item':>10}"
+    )
+    with StubEnvironment() as stubs:
+        for platform in args.platforms.split(","):
+            for operation in args.operations.split(","):
+                for size in [int(size) for size in args.sizes.split(",")]:
+                    for limit in args.concurrency.split(","):
+                        result = run(stubs, platform, operation, size, limit, args.latency)
+                        results.append(result)
+                        print(
+                            f"{platform:<14} {operation:<21} {size:>5} {limit:>8} "
+                            f"{result['seconds']:>8.3f} {result['forks']:>6} "
+                            f"{result['forks'] / max(1, size):>10.3f}"
+                        )
+                        if result["items"] != size:
+                            print(f"  expected {size} items, got {result['items']}")
+
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(results, fout, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""bench_wpa_supplicant.py
+Times parsing a large wpa_supplicant.conf and looking up single passwords
+through WifiPasswordsLinux, against the previous per-lookup regex scan.
+The file is read through a stub command runner so no sudo is needed.
+Usage: python benchmarks/bench_wpa_supplicant.py [networks] [lookups]
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wifipasswords.wifipasswords_linux import WifiPasswordsLinux  # noqa: E402
+
+
+def make_conf(networks: int) -> str:
+    blocks = ["ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev", "update_config=1"]
+    for n in range(networks):
+        if n % 3 == 0:
+            blocks.append(
+                f'network={{\n\tssid="network {n}"\n\tpsk="secret{n}"\n\tkey_mgmt=WPA-PSK\n}}'
+            )
+        elif n % 3 == 1:
+            ssid = f"hex {n}".encode().hex()
+            blocks.append(f"network={{\n\tscan_ssid=1\n\tssid={ssid}\n\tkey_mgmt=NONE\n}}")
+        else:
+            blocks.append(
+                f'network={{\n\tbssid=aa:bb:cc:dd:ee:ff\n\tssid="network {n}"\n\tpsk="pw{n}"\n}}'
+            )
+    return "\n".join(blocks) + "\n"
+
+
+def legacy_single(file_string: str, ssid: str) -> tuple:
+    # the lookup used before the index, one regex scan over the whole file per call
+    psk = ""
+    found = False
+    for network_block in re.findall("(?<=network=)[^}]*(?=})", file_string):
+        if ssid in network_block:
+            found = True
+            for row in network_block.strip().replace("\t", "").replace("\n", " ").split(" "):
+                if "psk" in row:
+                    psk = row.split("psk=")[1][1:-1]
+    return found, psk
+
+
+def main() -> None:
+    networks = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    file_string = make_conf(networks)
+    ssids = [f"network {n}" for n in range(0, networks, max(3, networks // lookups // 3 * 3))]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conf = os.path.join(temp_dir, "wpa_supplicant.conf")
+        with open(conf, "w") as fout:
+            fout.write(file_string)
+        wifipw = WifiPasswordsLinux(
+            nm_path=os.path.join(temp_dir, "none"), wpa_supplicant_file_path=conf
+        )
+        wifipw._command_runner = lambda shell_commands: file_string
+
+        start = time.perf_counter()
+        parsed = wifipw._parse_wpa_supplicant(file_string)
+        parse_time = time.perf_counter() - start
+        assert len(parsed) == networks
+
+        start = time.perf_counter()
+        for ssid in ssids:
+            wifipw.cache.clear()
+            wifipw.get_single_password(ssid)
+        indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for ssid in ssids:
+        legacy_single(file_string, ssid)
+    legacy_time = time.perf_counter() - start
+
+    print(f"networks={networks} lookups={len(ssids)}")
+    print(f"single pass parse         {parse_time * 1000:9.1f}ms")
+    print(f"indexed lookups           {indexed_time * 1000:9.1f}ms (includes the first parse)")
+    print(f"legacy regex scan lookups {legacy_time * 1000:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
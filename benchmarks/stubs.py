@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""stubs.py
+Generated stand-ins for nmcli, netsh, security, airport, scutil and ifconfig
+so the platform classes can be benchmarked on any linux box.
+Each stub appends one byte to a counter file per call, sleeps for the
+configured latency then prints N profiles, networks or interfaces in the
+format the real tool uses. Configuration is read from the environment:
+ - WIFIPW_STUB_COUNT: number of profiles / BSSIDs / interfaces.
+ - WIFIPW_STUB_LATENCY: seconds slept per call.
+ - WIFIPW_STUB_COUNTER: file the fork count is appended to.
+"""
+
+import os
+import stat
+import sys
+import tempfile
+
+STUB_NAMES = ("nmcli", "netsh", "security", "airport", "scutil", "ifconfig")
+
+STUB_SOURCE = r"""#!{python}
+import os, sys, time
+
+name = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+count = int(os.environ.get("WIFIPW_STUB_COUNT", "10"))
+with open(os.environ["WIFIPW_STUB_COUNTER"], "a") as fout:
+    fout.write("x")
+time.sleep(float(os.environ.get("WIFIPW_STUB_LATENCY", "0")))
+out = []
+
+WLAN_PROFILE = '''<?xml version="1.0"?>
+<WLANProfile xmlns="http://www.microsoft.com/networking/WLAN/profile/v1">
+\t<name>network %d</name>
+\t<SSIDConfig><SSID><name>network %d</name></SSID></SSIDConfig>
+\t<MSM><security>
+\t\t<authEncryption><authentication>WPA2PSK</authentication></authEncryption>
+\t\t<sharedKey><protected>false</protected><keyMaterial>secret %d</keyMaterial></sharedKey>
+\t</security></MSM>
+</WLANProfile>
+'''
+
+
+def nmcli():
+    if "NAME,TYPE" in args:
+        out.extend("network\\:%d:802-11-wireless" % n for n in range(count))
+    elif "--show-secrets" in args:
+        ids = [args[i + 1] for i, arg in enumerate(args) if arg == "id"]
+        if not ids:
+            ids = [args[args.index("s") + 1]]
+        for ssid in ids:
+            n = ssid.split(":")[1]
+            out.append("connection.id:" + ssid.replace(":", "\\:"))
+            out.append("connection.metered:no")
+            out.append("802-11-wireless.cloned-mac-address:")
+            out.append("802-11-wireless-security.key-mgmt:wpa-psk")
+            out.append("802-11-wireless-security.psk:secret\\:%s" % n)
+    elif "SSID,CHAN,RATE,SIGNAL,SECURITY" in args:
+        out.extend(
+            "network %d:%d:54 Mbit/s:%d:WPA2" % (n, n % 13 + 1, 40 + n % 60) for n in range(count)
+        )
+    elif "BSSID,SSID,CHAN,RATE,SIGNAL" in args:
+        out.extend(
+            "AA\\:BB\\:CC\\:%02X\\:%02X\\:%02X:network %d:%d:54 Mbit/s:%d"
+            % (n >> 16 & 255, n >> 8 & 255, n & 255, n, n % 13 + 1, 40 + n % 60)
+            for n in range(count)
+        )
+    elif "GENERAL.DEVICE,GENERAL.CONNECTION,IP4.DNS,IP4.DOMAIN" in args:
+        for n in range(count):
+            out.append("GENERAL.DEVICE:eth%d" % n)
+            out.append("GENERAL.CONNECTION:connection %d" % n)
+            out.append("IP4.DNS[1]:192.168.0.1")
+            out.append("IP4.DOMAIN[1]:lan")
+            out.append("")
+    elif "connection.id,ipv4.ignore-auto-dns" in args:
+        for i, arg in enumerate(args):
+            if arg == "id":
+                out.append("connection.id:" + args[i + 1])
+                out.append("ipv4.ignore-auto-dns:no")
+                out.append("")
+
+
+def netsh():
+    if args[:3] == ["wlan", "show", "profiles"]:
+        out.append("Profiles on interface Wi-Fi:")
+        out.append("")
+        out.extend("    All User Profile     : network %d" % n for n in range(count))
+    elif args[:3] == ["wlan", "show", "profile"]:
+        out.append("    Authentication         : WPA2-Personal")
+        out.append("    Cost                   : Unrestricted")
+        out.append("    MAC Randomization      : Disabled")
+        out.append("    Key Content            : secret %s" % args[3].split(" ")[-1])
+    elif args[:3] == ["wlan", "show", "networks"]:
+        out.append("There are %d networks currently visible." % count)
+        out.append("")
+        for n in range(count):
+            out.append("SSID %d : network %d" % (n + 1, n))
+            out.append("    Network type            : Infrastructure")
+            out.append("    Authentication          : WPA2-Personal")
+            out.append("    Encryption              : CCMP")
+            out.append("    BSSID 1                 : aa:bb:cc:%02x:%02x:%02x" % (n >> 16 & 255, n >> 8 & 255, n & 255))
+            out.append("         Signal             : %d%%" % (40 + n % 60))
+            out.append("         Radio type         : 802.11n")
+            out.append("         Channel            : %d" % (n % 13 + 1))
+            out.append("         Basic rates (Mbps) : 1 2 5.5 11")
+            out.append("         Other rates (Mbps) : 6 9 12 18 24 36 48 54")
+            out.append("")
+    elif args[:3] == ["wlan", "export", "profile"]:
+        folder = args[3].split("=", 1)[1]
+        for n in range(count):
+            with open(os.path.join(folder, "Wi-Fi-network %d.xml" % n), "w") as fout:
+                fout.write(WLAN_PROFILE % (n, n, n))
+            out.append('Interface profile "network %d" is saved in file "%s"' % (n, folder))
+    elif args[:4] == ["interface", "ip", "show", "dns"]:
+        for n in range(count):
+            out.append('Configuration for interface "Ethernet %d"' % n)
+            out.append("    DNS servers configured through DHCP:  192.168.0.1")
+            out.append("    Register with which suffix:           Primary only")
+            out.append("")
+
+
+def security():
+    if args[:1] == ["dump-keychain"]:
+        for n in range(count):
+            out.append('keychain: "/Library/Keychains/System.keychain"')
+            out.append("class: \"genp\"")
+            out.append("attributes:")
+            out.append('    "acct"<blob>="network %d"' % n)
+            out.append('    "desc"<blob>="AirPort network password"')
+            out.append('    "svce"<blob>="AirPort"')
+            if "-d" in args:
+                out.append("data:")
+                out.append('"secret %d"' % n)
+    elif args[:1] == ["find-generic-password"]:
+        out.append("secret %s" % args[args.index("-a") + 1].split(" ")[-1])
+
+
+def airport():
+    out.append("                            SSID BSSID             RSSI CHANNEL HT CC SECURITY")
+    for n in range(count):
+        bssid = "aa:bb:cc:%02x:%02x:%02x" % (n >> 16 & 255, n >> 8 & 255, n & 255)
+        ssid = "network %d" % n
+        out.append("%32s %s -%02d  %-7d Y  GB WPA2(PSK/AES/AES)" % (ssid, bssid, 40 + n % 50, n % 13 + 1))
+
+
+def scutil():
+    out.extend(["DNS configuration", "", "resolver #1", "  nameserver[0] : 192.168.0.1", ""])
+    out.append("DNS configuration (for scoped queries)")
+    for n in range(count):
+        out.append("")
+        out.append("resolver #%d" % (n + 1))
+        out.append("  search domain[0] : lan")
+        out.append("  nameserver[0] : 192.168.0.1")
+        out.append("  if_index : %d (en%d)" % (n + 4, n))
+
+
+def ifconfig():
+    for n in range(count):
+        out.append("en%d: flags=8863<UP,BROADCAST,SMART,RUNNING,SIMPLEX,MULTICAST> mtu 1500" % n)
+        out.append("\tether aa:bb:cc:dd:ee:%02x" % (n & 255))
+
+
+globals()[name]()
+newline = "\r\n" if name == "netsh" else "\n"
+sys.stdout.write(newline.join(out) + newline)
+"""
+
+
+class StubEnvironment:
+    """
+    Context manager putting the stub executables first on PATH.\n
+    Arguments:\n
+    - count: number of profiles / BSSIDs / interfaces each stub reports.\n
+    - latency: seconds each stub call sleeps.\n
+    """
+
+    def __init__(self, count: int = 10, latency: float = 0.0) -> None:
+        self._temp_dir = None
+        self._saved = {}
+        self.count = count
+        self.latency = latency
+
+    def __enter__(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.path = self._temp_dir.name
+        self.counter = os.path.join(self.path, "forks")
+        source = STUB_SOURCE.replace("{python}", sys.executable)
+        for name in STUB_NAMES:
+            stub_path = os.path.join(self.path, name)
+            with open(stub_path, "w") as fout:
+                fout.write(source)
+            os.chmod(stub_path, os.stat(stub_path).st_mode | stat.S_IEXEC)
+        for key in ("PATH", "WIFIPW_STUB_COUNT", "WIFIPW_STUB_LATENCY", "WIFIPW_STUB_COUNTER"):
+            self._saved[key] = os.environ.get(key)
+        os.environ["PATH"] = self.path + os.pathsep + os.environ.get("PATH", "")
+        os.environ["WIFIPW_STUB_COUNTER"] = self.counter
+        self.configure(self.count, self.latency)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for key, value in self._saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self._temp_dir.cleanup()
+
+    def configure(self, count: int, latency: float) -> None:
+        """
+        Sets the number of items reported and the per call latency, resets the fork count.\n
+        """
+        self.count = count
+        self.latency = latency
+        os.environ["WIFIPW_STUB_COUNT"] = str(count)
+        os.environ["WIFIPW_STUB_LATENCY"] = str(latency)
+        self.reset()
+
+    def reset(self) -> None:
+        open(self.counter, "w").close()
+
+    def forks(self) -> int:
+        """
+        Returns the number of stub calls since the last reset.\n
+        """
+        with open(self.counter) as fin:
+            return len(fin.read())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import unittest
+import asyncio
+import sys
+import threading
+import time
+from unittest import mock
+from wifipasswords import AsyncWifiPasswords
+from wifipasswords.concurrency import ConcurrencyController
+
+
+class TestAsyncRunner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wifipw = AsyncWifiPasswords(max_concurrency=2)
+
+    def test_command_runner_returns_stdout(self):
+        output = asyncio.run(
+            self.wifipw._command_runner([sys.executable, "-c", "print('hi')"])
+        )
+        self.assertEqual(output.strip(), "hi")
+
+    def test_command_runner_limits_concurrency(self):
+        async def run_four():
+            sleeper = [sys.executable, "-c", "import time; time.sleep(0.3)"]
+            await asyncio.gather(*[self.wifipw._command_runner(sleeper) for _ in range(4)])
+
+        start = time.perf_counter()
+        asyncio.run(run_four())
+        # two at a time means two rounds of sleeping
+        self.assertGreaterEqual(time.perf_counter() - start, 0.6)
+
+    def test_command_runner_waits_for_controller_slot(self):
+        controller = ConcurrencyController(1, 1, 1)
+        controller.acquire()
+        threading.Timer(0.2, controller.release).start()
+        start = time.perf_counter()
+        with mock.patch("wifipasswords.wifipasswords_async.controller", controller):
+            output = asyncio.run(
+                self.wifipw._command_runner([sys.executable, "-c", "print('hi')"])
+            )
+        self.assertEqual(output.strip(), "hi")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_cancelled_wait_returns_slot(self):
+        controller = ConcurrencyController(1, 1, 1)
+        controller.acquire()
+
+        async def cancel_waiting():
+            task = asyncio.ensure_future(self.wifipw._command_runner(["true"]))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            controller.release()
+            # the executor thread takes the slot and the done callback gives it back
+            await asyncio.sleep(0.1)
+
+        with mock.patch("wifipasswords.wifipasswords_async.controller", controller):
+            asyncio.run(cancel_waiting())
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_get_passwords_dummy_returns_dictionary(self):
+        self.assertTrue(type(asyncio.run(self.wifipw.get_passwords_dummy(0))) is dict)
+
+    def test_get_visible_networks_is_dictionary(self):
+        self.assertTrue(type(asyncio.run(self.wifipw.get_visible_networks(True))) is dict)
+
+    def test_save_json_runs_off_the_event_loop(self):
+        threads = []
+
+        def save_json(*args):
+            threads.append(threading.get_ident())
+            return 2
+
+        self.wifipw._wifipasswords.save_json = save_json
+        self.assertEqual(asyncio.run(self.wifipw.save_json("networks.json", {})), 2)
+        self.assertNotEqual(threads, [threading.get_ident()])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
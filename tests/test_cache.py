@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import unittest
+import time
+from wifipasswords.cache import ProfileCache
+
+
+class TestProfileCache(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = ProfileCache(maxsize=2)
+        cache.put("a", {"psk": "1"})
+        cache.put("b", {"psk": "2"})
+        cache.get("a")
+        cache.put("c", {"psk": "3"})
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"psk": "1"})
+
+    def test_version_change_invalidates(self):
+        version = [1]
+        cache = ProfileCache(version=lambda: version[0])
+        cache.put_all({"a": {"psk": "1"}})
+        self.assertEqual(cache.get_all(), {"a": {"psk": "1"}})
+        version[0] = 2
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get_all())
+
+    def test_ttl_expiry(self):
+        cache = ProfileCache(ttl=0.05)
+        cache.put_all({"a": {"psk": "1"}})
+        self.assertEqual(cache.get_psk("a"), "1")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get_psk("a"))
+        self.assertIsNone(cache.get_all())
+
+    def test_negative_cache_raises_value_error(self):
+        cache = ProfileCache(negative_ttl=30)
+        cache.put_missing("unknown")
+        with self.assertRaises(ValueError):
+            cache.get_psk("unknown")
+        cache.put("unknown", {"psk": ""})
+        self.assertEqual(cache.get_psk("unknown"), "")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
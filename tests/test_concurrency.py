@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import unittest
+import threading
+import time
+from wifipasswords.concurrency import ConcurrencyController
+
+
+class TestConcurrencyController(unittest.TestCase):
+    def test_slot_never_exceeds_maximum(self):
+        controller = ConcurrencyController(initial=8, maximum=3)
+        peak = []
+
+        def worker():
+            with controller.slot():
+                peak.append(controller.in_flight)
+                time.sleep(0.01)
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 3)
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_limit_grows_while_latency_flat(self):
+        controller = ConcurrencyController(initial=2, maximum=32)
+        for _ in range(200):
+            controller.acquire()
+            controller.release(0.01)
+        self.assertGreater(controller.limit, 2)
+
+    def test_limit_shrinks_when_latency_rises(self):
+        controller = ConcurrencyController(initial=16, maximum=32)
+        for _ in range(64):
+            controller.acquire()
+            controller.release(0.01)
+        grown = controller.limit
+        for _ in range(64):
+            controller.acquire()
+            controller.release(0.05)
+        self.assertLess(controller.limit, grown)
+
+    def test_acquire_non_blocking_returns_false_at_limit(self):
+        controller = ConcurrencyController(initial=1, maximum=1)
+        self.assertTrue(controller.acquire(blocking=False))
+        self.assertFalse(controller.acquire(blocking=False))
+        controller.release(0.0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import unittest
+import os
+import socket
+import stat
+import tempfile
+import threading
+from unittest import mock
+from wifipasswords.records import NetworkProfile, VisibleNetwork
+from wifipasswords.snapshot import Snapshot
+
+if hasattr(socket, "AF_UNIX"):
+    from wifipasswords.client import WifiPasswordsClient
+    from wifipasswords.daemon import SnapshotServer, default_socket_path, peer_credentials
+
+
+class FakeWifiPasswords:
+    """
+    Stands in for WifiPasswords, counts the snapshots taken.\n
+    """
+
+    def __init__(self) -> None:
+        self.snapshots = 0
+
+    def snapshot(self, visible: bool = True, dns: bool = True):
+        self.snapshots += 1
+        return Snapshot(
+            "Linux",
+            {
+                "home": NetworkProfile(auth="WPA2-Personal", psk=f"secret {self.snapshots}"),
+                "cafe": NetworkProfile(auth="Open"),
+            },
+            ["home"],
+            visible_networks={"home": VisibleNetwork(signal="80", channel="6")},
+            visible_networks_text="There are 1 networks visible.",
+            number_visible_networks=1,
+            dns_config={"eth0": {"type": "DHCP", "DNS": ["192.168.0.1"], "suffix": "lan"}},
+            dns_config_text="Interface: eth0",
+            number_of_interfaces=1,
+        )
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets not supported")
+class TestSnapshotServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, "wifipasswords.sock")
+        self.wifipasswords = FakeWifiPasswords()
+        self.server = SnapshotServer(
+            self.socket_path, refresh_interval=3600, wifipasswords=self.wifipasswords
+        )
+        self.server.__enter__()
+        self.client = WifiPasswordsClient(self.socket_path)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.close()
+        self.temp_dir.cleanup()
+
+    def test_socket_is_owner_only(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+
+    def test_queries(self):
+        self.assertTrue(self.client.ping())
+        passwords = self.client.get_passwords()
+        self.assertEqual(
+            passwords["home"],
+            {
+                "auth": "WPA2-Personal",
+                "psk": "secret 1",
+                "metered": False,
+                "macrandom": "Disabled",
+            },
+        )
+        self.assertIs(type(passwords["home"]), dict)
+        self.assertEqual(self.client.get_single_password("cafe"), "")
+        self.assertEqual(self.client.get_known_ssids(), ["home", "cafe"])
+        self.assertEqual(self.client.get_currently_connected_ssids(), ["home"])
+        self.assertEqual(
+            self.client.get_currently_connected_passwords(), [("home", "secret 1")]
+        )
+        self.assertEqual(self.client.get_visible_networks(True)["home"]["channel"], "6")
+        self.assertEqual(self.client.get_visible_networks(), "There are 1 networks visible.")
+        self.assertEqual(self.client.get_dns_config(True)["eth0"]["DNS"], ["192.168.0.1"])
+        # everything above was answered from the one snapshot taken at start
+        self.assertEqual(self.wifipasswords.snapshots, 1)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.client.get_single_password("unknown")
+        with self.assertRaises(ValueError):
+            self.client.request("format_disk")
+        # the connection is still usable after an error
+        self.assertEqual(self.client.get_single_password("home"), "secret 1")
+
+    def test_refresh(self):
+        # the snapshot taken at start is younger than min_refresh_interval
+        self.client.refresh()
+        self.assertEqual(self.client.get_single_password("home"), "secret 1")
+        self.server.min_refresh_interval = 0
+        self.client.refresh()
+        self.assertEqual(self.client.get_single_password("home"), "secret 2")
+        self.assertEqual(self.client.info()["refreshes"], 2)
+
+    def test_requests_counted_from_many_threads(self):
+        def ping():
+            for _ in range(1000):
+                self.server.handle_request({"op": "ping"})
+
+        threads = [threading.Thread(target=ping) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests, 8000)
+
+    def test_reconnects_after_restart(self):
+        self.assertTrue(self.client.ping())
+        self.server.close()
+        with self.assertRaises(OSError):
+            self.client.ping()
+        self.server = SnapshotServer(self.socket_path, wifipasswords=self.wifipasswords)
+        self.server.__enter__()
+        self.assertTrue(self.client.ping())
+
+    def test_refuses_socket_in_use(self):
+        with self.assertRaises(OSError):
+            SnapshotServer(self.socket_path, wifipasswords=self.wifipasswords).start()
+
+    @unittest.skipUnless(hasattr(socket, "SO_PEERCRED"), "SO_PEERCRED not supported")
+    def test_peer_credentials(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            self.assertEqual(peer_credentials(sock), (os.getuid(), os.getgid()))
+
+    def test_refuses_other_users(self):
+        other = (os.geteuid() + 1000, os.getegid() + 1000)
+        with mock.patch("wifipasswords.daemon.peer_credentials", return_value=other):
+            with self.assertRaises(PermissionError):
+                self.client.ping()
+
+    def test_group_mode_allows_group_members(self):
+        peer = (os.geteuid() + 1000, os.getegid())
+        with mock.patch("wifipasswords.daemon.peer_credentials", return_value=peer):
+            self.assertFalse(self.server.peer_allowed(None))
+            self.server.mode = 0o660
+            self.assertTrue(self.server.peer_allowed(None))
+
+
+class TestDefaultSocketPath(unittest.TestCase):
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets not supported")
+    def test_default_socket_path(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": "/run/user/1000"}):
+            self.assertEqual(default_socket_path(), "/run/user/1000/wifipasswords.sock")
+        with mock.patch.dict(os.environ), mock.patch("os.getuid", return_value=0):
+            os.environ.pop("XDG_RUNTIME_DIR", None)
+            self.assertEqual(default_socket_path(), "/run/wifipasswords/wifipasswords.sock")
+        with mock.patch.dict(os.environ), mock.patch("os.getuid", return_value=1000):
+            os.environ.pop("XDG_RUNTIME_DIR", None)
+            with self.assertRaises(ValueError):
+                default_socket_path()
+
+
+if __name__ == "__main__":
+    unittest.main()
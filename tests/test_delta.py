@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import stat
+import unittest
+from unittest import mock
+from wifipasswords import delta, export
+from wifipasswords.records import NetworkProfile
+from wifipasswords.snapshot import Snapshot
+
+
+class TestDelta(unittest.TestCase):
+    def setUp(self) -> None:
+        self.old = {
+            "home": NetworkProfile(auth="WPA2-Personal", psk="home password"),
+            "cafe": NetworkProfile(auth="Open"),
+            "office": NetworkProfile(auth="WPA2-Personal", psk="office password"),
+        }
+        self.new = {
+            "home": NetworkProfile(auth="WPA2-Personal", psk="home password"),
+            "office": NetworkProfile(auth="WPA2-Personal", psk="new office password"),
+            "library": NetworkProfile(auth="WPA2-Personal", psk="library password"),
+        }
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "delta.json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_fingerprint_matches_plain_dictionary(self):
+        profile = self.old["home"]
+        self.assertEqual(delta.fingerprint(profile), delta.fingerprint(profile.to_dict()))
+        self.assertNotEqual(delta.fingerprint(profile), delta.fingerprint(self.new["office"]))
+
+    def test_fingerprint_is_salted(self):
+        profile = self.old["home"]
+        self.assertNotEqual(
+            delta.fingerprint(profile, b"a" * 16), delta.fingerprint(profile, b"b" * 16)
+        )
+        self.assertNotEqual(
+            delta.Manifest.from_data(self.old, b"a" * 16).etag,
+            delta.Manifest.from_data(self.old, b"b" * 16).etag,
+        )
+        with self.assertRaises(ValueError):
+            delta.diff(
+                delta.Manifest.from_data(self.old, b"a" * 16),
+                delta.Manifest.from_data(self.new, b"b" * 16),
+            )
+
+    def test_default_salt_persists_across_restarts(self):
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.temp_dir.name}):
+            with mock.patch.object(delta, "_SALT", None):
+                etag = delta.Manifest.from_data(self.old).etag
+                path = delta.default_salt_path()
+                self.assertEqual(stat.S_IMODE(os.stat(path).st_mode) & 0o077, 0)
+            # a new process reads the same salt back
+            with mock.patch.object(delta, "_SALT", None):
+                self.assertEqual(delta.Manifest.from_data(self.old).etag, etag)
+            with open(path, "w") as fout:
+                fout.write("not hex")
+            with mock.patch.object(delta, "_SALT", None):
+                self.assertNotEqual(delta.Manifest.from_data(self.old).etag, etag)
+                self.assertEqual(len(delta.default_salt()), delta.SALT_SIZE)
+
+    def test_delta_keeps_salt_of_base(self):
+        # e.g. a manifest saved by another process
+        base = delta.Manifest.from_data(self.old, b"a" * 16)
+        difference = export.save_json(self.path, self.new, since=base)
+        self.assertEqual(difference.manifest.salt, base.salt)
+        delta_data = delta.load_delta(self.path)
+        self.assertEqual(delta_data["salt"], base.salt.hex())
+        self.assertEqual(delta.apply_delta(self.old, delta_data), self.new)
+        self.assertEqual(base.apply(delta_data), difference.manifest)
+
+    def test_etag_independent_of_order(self):
+        reordered = dict(reversed(list(self.old.items())))
+        self.assertEqual(
+            delta.Manifest.from_data(self.old).etag, delta.Manifest.from_data(reordered).etag
+        )
+        self.assertNotEqual(
+            delta.Manifest.from_data(self.old).etag, delta.Manifest.from_data(self.new).etag
+        )
+
+    def test_diff(self):
+        difference = delta.diff(self.old, self.new)
+        self.assertEqual(difference.added, ["library"])
+        self.assertEqual(difference.removed, ["cafe"])
+        self.assertEqual(difference.changed, ["office"])
+        self.assertEqual(difference.base, delta.Manifest.from_data(self.old).etag)
+        self.assertEqual(difference.etag, delta.Manifest.from_data(self.new).etag)
+        self.assertFalse(delta.diff(self.new, self.new))
+
+    def test_snapshot_diff(self):
+        old = Snapshot("Linux", self.old, [])
+        new = Snapshot("Linux", self.new, [])
+        self.assertEqual(new.diff(old).to_dict(), delta.diff(self.old, self.new).to_dict())
+        self.assertEqual(new.etag, delta.Manifest.from_data(self.new).etag)
+        self.assertEqual(set(new.fingerprints()), set(self.new))
+
+    def test_manifest_round_trip(self):
+        manifest = delta.Manifest.from_data(self.old)
+        path = os.path.join(self.temp_dir.name, "manifest.json")
+        manifest.save(path)
+        self.assertEqual(delta.Manifest.load(path), manifest)
+        with open(path, "r") as fin:
+            saved = json.load(fin)
+        self.assertNotIn("home password", json.dumps(saved))
+        self.assertEqual(saved["salt"], manifest.salt.hex())
+        if os.name == "posix":
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_json_delta_applies(self):
+        difference = export.save_json(self.path, self.new, since=self.old)
+        delta_data = delta.load_delta(self.path)
+        self.assertEqual(delta_data["etag"], difference.etag)
+        self.assertEqual(
+            set(delta_data["added"]) | set(delta_data["changed"]), {"library", "office"}
+        )
+        self.assertEqual(delta.apply_delta(self.old, delta_data), self.new)
+
+    def test_ndjson_delta_applies(self):
+        export.save_json(
+            self.path, self.new, ndjson=True, since=delta.Manifest.from_data(self.old)
+        )
+        self.assertEqual(delta.apply_delta(self.old, delta.load_delta(self.path)), self.new)
+
+    def test_manifest_apply_matches_full_fingerprint(self):
+        export.save_json(self.path, self.new, since=self.old)
+        delta_data = delta.load_delta(self.path)
+        manifest = delta.Manifest.from_data(self.old).apply(delta_data)
+        self.assertEqual(manifest, delta.Manifest.from_data(self.new))
+        self.assertEqual(manifest.etag, delta_data["etag"])
+        with self.assertRaises(ValueError):
+            manifest.apply(delta_data)
+
+    def test_apply_delta_rejects_wrong_base(self):
+        export.save_json(self.path, self.new, since=self.old)
+        with self.assertRaises(ValueError):
+            delta.apply_delta(self.new, delta.load_delta(self.path))
+
+    def test_wpa_supplicant_delta(self):
+        difference = export.save_wpa_supplicant(self.path, self.new, since=self.old)
+        with open(self.path, "r") as fin:
+            conf = fin.read()
+        self.assertIn(f"# ETag: {difference.etag}", conf)
+        self.assertIn('# Removed: "cafe"', conf)
+        self.assertIn('ssid="library"', conf)
+        self.assertIn('ssid="office"', conf)
+        self.assertNotIn('ssid="home"', conf)
+
+
+if __name__ == "__main__":
+    unittest.main()
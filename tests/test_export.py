@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import unittest
+import os
+import csv
+import json
+import tempfile
+from wifipasswords import export
+from wifipasswords.records import NetworkProfile
+from wifipasswords.wifipasswords_linux import WifiPasswordsLinux
+from wifipasswords.wlanprofile import parse_profile_directory
+
+DATA = {
+    "home": NetworkProfile(auth="wpa-psk", psk="secret"),
+    'quote " network': NetworkProfile(auth="Open", metered=True),
+}
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "networks_data.json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_json_matches_json_dump(self):
+        self.assertEqual(export.save_json(self.path, DATA), 2)
+        with open(self.path) as fin:
+            self.assertEqual(fin.read(), json.dumps({k: v.to_dict() for k, v in DATA.items()}))
+
+    def test_ndjson_from_iterator(self):
+        export.save_json(self.path, iter(DATA.items()), ndjson=True, fsync=False)
+        with open(self.path) as fin:
+            lines = [json.loads(line) for line in fin]
+        self.assertEqual([line.pop("ssid") for line in lines], list(DATA))
+        self.assertEqual(lines, list(DATA.values()))
+
+    def test_failed_write_leaves_existing_file(self):
+        export.save_json(self.path, DATA)
+
+        def broken():
+            yield "home", DATA["home"]
+            raise RuntimeError("interrupted")
+
+        with self.assertRaises(RuntimeError):
+            export.save_json(self.path, broken())
+        with open(self.path) as fin:
+            self.assertEqual(len(json.load(fin)), 2)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["networks_data.json"])
+
+
+class TestExportEngine(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data = {
+            "home network": NetworkProfile(
+                auth="WPA2-Personal", psk="p&ss <1>", macrandom="Daily"
+            ),
+            "cafe/bar": NetworkProfile(auth="Open", metered=True),
+            "office": NetworkProfile(auth="WPA2-Enterprise"),
+        }
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.temp_dir.name, name)
+
+    def test_every_format_from_one_pass(self):
+        reads = []
+
+        def profiles():
+            for ssid, network in self.data.items():
+                reads.append(ssid)
+                yield ssid, network
+
+        counts = export.save(
+            profiles(),
+            [
+                ("json", self.path("networks.json")),
+                ("csv", self.path("networks.csv")),
+                ("wpa_supplicant", self.path("wpa_supplicant.conf"), {"locale": "US"}),
+                ("keyfile", self.path("keyfiles")),
+                ("wlanprofile", self.path("wlanprofiles")),
+            ],
+            fsync=False,
+        )
+        self.assertEqual(reads, list(self.data))
+        self.assertEqual(list(counts.values()), [3, 3, 2, 2, 2])
+        with open(self.path("networks.json")) as fin:
+            self.assertEqual(json.load(fin), self.data)
+        with open(self.path("networks.csv"), newline="") as fin:
+            rows = list(csv.DictReader(fin))
+        self.assertEqual([row["ssid"] for row in rows], list(self.data))
+        self.assertEqual(rows[0]["psk"], "p&ss <1>")
+        with open(self.path("wpa_supplicant.conf")) as fin:
+            self.assertIn("country=US", fin.read())
+
+    def test_keyfiles_read_back(self):
+        export.save(self.data, [("keyfile", self.path("keyfiles"))], fsync=False)
+        self.assertEqual(
+            sorted(os.listdir(self.path("keyfiles"))),
+            ["cafe_bar.nmconnection", "home network.nmconnection"],
+        )
+        linux = WifiPasswordsLinux(nm_path=self.path("keyfiles"))
+        name, network = linux._parse_nm_keyfile(
+            self.path("keyfiles/home network.nmconnection")
+        )
+        self.assertEqual(
+            (name, network["auth"], network["psk"]), ("home network", "wpa-psk", "p&ss <1>")
+        )
+        name, network = linux._parse_nm_keyfile(self.path("keyfiles/cafe_bar.nmconnection"))
+        self.assertEqual(
+            (name, network["auth"], network["metered"]), ("cafe/bar", "Open", True)
+        )
+
+    def test_wlanprofiles_read_back(self):
+        export.save(self.data, [("wlanprofile", self.path("wlanprofiles"))], fsync=False)
+        profiles = parse_profile_directory(self.path("wlanprofiles"))
+        self.assertEqual(profiles["home network"], self.data["home network"])
+        self.assertEqual(profiles["cafe/bar"]["auth"], "Open")
+        self.assertNotIn("office", profiles)
+
+    def test_failed_writer_replaces_no_file(self):
+        export.save_json(self.path("networks.json"), {"old": NetworkProfile()})
+
+        class BrokenWriter(export.Writer):
+            def write(self, ssid, network):
+                raise RuntimeError("broken")
+
+        export.register_writer("broken", BrokenWriter)
+        try:
+            with self.assertRaises(RuntimeError):
+                export.save(
+                    self.data,
+                    [("json", self.path("networks.json")), ("broken", self.path("broken"))],
+                )
+        finally:
+            del export.WRITERS["broken"]
+        with open(self.path("networks.json")) as fin:
+            self.assertEqual(list(json.load(fin)), ["old"])
+        self.assertEqual(os.listdir(self.temp_dir.name), ["networks.json"])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export.save(self.data, [("yaml", self.path("networks.yaml"))])
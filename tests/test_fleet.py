@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import unittest
+import os
+import json
+import tempfile
+from wifipasswords.fleet import FleetAggregator, find_snapshots, host_from_path
+
+HOME = {"auth": "wpa-psk", "psk": "secret", "metered": False, "macrandom": "Disabled"}
+CAFE = {"auth": "Open", "psk": "", "metered": False, "macrandom": "Disabled"}
+
+
+class TestFleetAggregator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        snapshots = {
+            "host1": {"home": HOME, "cafe": CAFE},
+            "host2": {"home": HOME},
+            "host3": {"home": dict(HOME, psk="other")},
+        }
+        for host, data in snapshots.items():
+            os.mkdir(os.path.join(self.temp_dir.name, host))
+            with open(
+                os.path.join(self.temp_dir.name, host, "networks_data.json"), "w"
+            ) as fout:
+                json.dump(data, fout)
+        with open(os.path.join(self.temp_dir.name, "broken.json"), "w") as fout:
+            fout.write("{not json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_host_from_path(self):
+        self.assertEqual(
+            host_from_path(os.path.join("a", "host1", "networks_data.json")), "host1"
+        )
+        self.assertEqual(host_from_path(os.path.join("a", "host2.json")), "host2")
+
+    def test_identical_profiles_are_deduplicated(self):
+        aggregator = FleetAggregator(processes=2)
+        aggregator.add_files(find_snapshots([self.temp_dir.name]))
+        self.assertEqual(sorted(aggregator.hosts), ["host1", "host2", "host3"])
+        self.assertEqual(aggregator.number_of_ssids, 2)
+        self.assertEqual(aggregator.number_of_profiles, 3)
+        self.assertEqual(aggregator.hosts_for("home"), ["host1", "host2", "host3"])
+        self.assertEqual(aggregator.hosts_for("cafe"), ["host1"])
+        self.assertEqual(aggregator.hosts_for("unknown"), [])
+        self.assertEqual(len(aggregator.errors), 1)
+
+    def test_json_lines_and_delta_exports(self):
+        from wifipasswords import export
+
+        ndjson_path = os.path.join(self.temp_dir.name, "host4.json")
+        export.save_json(ndjson_path, {"home": HOME, "cafe": CAFE}, ndjson=True)
+        delta_path = os.path.join(self.temp_dir.name, "host5.json")
+        export.save_json(delta_path, {"home": HOME}, since={"cafe": CAFE})
+        ndjson_delta_path = os.path.join(self.temp_dir.name, "host6.json")
+        export.save_json(ndjson_delta_path, {"home": HOME}, ndjson=True, since={})
+        aggregator = FleetAggregator()
+        for path in (ndjson_path, delta_path, ndjson_delta_path):
+            aggregator.add_file(path)
+        self.assertEqual(aggregator.hosts, ["host4"])
+        self.assertEqual(sorted(aggregator.ssids()), ["cafe", "home"])
+        self.assertEqual(
+            [path for path, _ in aggregator.errors], [delta_path, ndjson_delta_path]
+        )
+        for _, error in aggregator.errors:
+            self.assertIn("delta export", error)
+
+    def test_strings_are_interned(self):
+        aggregator = FleetAggregator()
+        aggregator.add_rows("a", [("home", "".join(["wpa", "-psk"]), "1", False, "Disabled")])
+        aggregator.add_rows("b", [("home", "".join(["wpa", "-psk"]), "2", False, "Disabled")])
+        first, second = [profile for _, profile, _ in aggregator.profiles("home")]
+        self.assertIs(first.auth, second.auth)
+
+    def test_save_json_matches_to_dict(self):
+        aggregator = FleetAggregator()
+        for path in find_snapshots([self.temp_dir.name]):
+            aggregator.add_file(path)
+        output = os.path.join(self.temp_dir.name, "fleet.out")
+        aggregator.save_json(output)
+        with open(output) as fin:
+            self.assertEqual(json.load(fin), aggregator.to_dict())
+        self.assertEqual(aggregator.to_dict()["cafe"], [dict(CAFE, hosts=["host1"])])
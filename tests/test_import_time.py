@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import unittest
+import os
+import subprocess
+import sys
+
+# wall clock budgets in microseconds are only checked when WIFIPASSWORDS_IMPORT_BUDGETS is set
+# as they depend on the machine. they are generous and catch large regressions only, the
+# heavy modules that must not be imported are always checked
+CHECK_BUDGETS = bool(os.environ.get("WIFIPASSWORDS_IMPORT_BUDGETS"))
+IMPORT_BUDGET_US = 200_000
+CLI_BUDGET_US = 500_000
+
+HEAVY_MODULES = ("asyncio", "multiprocessing", "concurrent", "ssl", "colorama", "platform")
+BACKENDS = (
+    "wifipasswords.wifipasswords_linux",
+    "wifipasswords.wifipasswords_windows",
+    "wifipasswords.wifipasswords_macos",
+)
+
+
+def import_times(*args) -> dict:
+    """
+    Runs python -X importtime with args, returns {module: cumulative us} for top level imports
+    and the set of every module imported.
+    """
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    env = dict(os.environ, PYTHONPATH=root)
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        cwd=root,
+    ).stderr.decode("utf-8")
+    top_level = {}
+    modules = set()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative)
+    return top_level, modules
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime requires python 3.7")
+class TestImportTime(unittest.TestCase):
+    def setUp(self) -> None:
+        # modules imported by the interpreter itself are not counted
+        self.baseline, _ = import_times("-c", "pass")
+
+    def _check(self, args: tuple, budget: int, forbidden: tuple) -> None:
+        top_level, modules = import_times(*args)
+        if CHECK_BUDGETS:
+            used = sum(us for name, us in top_level.items() if name not in self.baseline)
+            self.assertLess(used, budget, f"startup imports took {used}us: {top_level}")
+        loaded = [
+            name
+            for name in modules
+            if any(name == module or name.startswith(module + ".") for module in forbidden)
+        ]
+        self.assertEqual(loaded, [])
+
+    def test_import_wifipasswords(self):
+        self._check(("-c", "import wifipasswords"), IMPORT_BUDGET_US, HEAVY_MODULES + BACKENDS)
+
+    def test_cli_version(self):
+        self._check(
+            ("-m", "wifipasswords", "--version"), CLI_BUDGET_US, HEAVY_MODULES + BACKENDS
+        )
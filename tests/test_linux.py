@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+
+import unittest
+import os
+import tempfile
+import threading
+import time
+from wifipasswords.wifipasswords_linux import WifiPasswordsLinux
+
+WPA_KEYFILE = """[connection]
+id=home network
+uuid=6b1f6e2c-1111-2222-3333-444455556666
+type=wifi
+metered=1
+
+[wifi]
+mode=infrastructure
+ssid=home network
+cloned-mac-address=random
+
+[wifi-security]
+key-mgmt=wpa-psk
+psk=p%ss\\sword
+
+[ipv4]
+method=auto
+"""
+
+OPEN_KEYFILE = """[connection]
+id=cafe
+type=wifi
+
+[wifi]
+ssid=cafe
+"""
+
+ETHERNET_KEYFILE = """[connection]
+id=Wired connection 1
+type=ethernet
+"""
+
+
+class TestLinuxKeyfiles(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        for name, content in (
+            ("home network.nmconnection", WPA_KEYFILE),
+            ("cafe.nmconnection", OPEN_KEYFILE),
+            ("Wired connection 1.nmconnection", ETHERNET_KEYFILE),
+        ):
+            with open(os.path.join(self.temp_dir.name, name), "w") as fout:
+                fout.write(content)
+        self.wifipw = WifiPasswordsLinux(nm_path=self.temp_dir.name)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_read_keyfiles_only_returns_wifi_profiles(self):
+        results = self.wifipw._read_keyfiles()
+        self.assertEqual(sorted(results), ["cafe", "home network"])
+
+    def test_read_keyfiles_fills_network_record(self):
+        results = self.wifipw._read_keyfiles()
+        self.assertEqual(
+            results["home network"],
+            {"auth": "wpa-psk", "psk": "p%ss word", "metered": True, "macrandom": "random"},
+        )
+        self.assertEqual(
+            results["cafe"],
+            {"auth": "Open", "psk": "", "metered": False, "macrandom": "Disabled"},
+        )
+
+    def _profiles_runner(self, profiles: list, calls: list):
+        def runner(shell_commands):
+            calls.append(shell_commands)
+            if shell_commands == self.wifipw.NMCLI_PROFILES:
+                return "\n".join(f"{name}:802-11-wireless" for name in profiles)
+            ids = [
+                shell_commands[i + 1] for i, arg in enumerate(shell_commands) if arg == "id"
+            ]
+            return "\n\n".join(
+                f"connection.id:{name}\n802-11-wireless-security.psk:from nmcli"
+                for name in ids
+            )
+
+        return runner
+
+    def test_get_passwords_only_lists_profiles_when_keyfiles_readable(self):
+        calls = []
+        self.wifipw._command_runner = self._profiles_runner(["home network", "cafe"], calls)
+        self.assertEqual(len(self.wifipw.get_passwords()), 2)
+        self.assertEqual(self.wifipw.number_of_profiles, 2)
+        self.assertEqual(calls, [self.wifipw.NMCLI_PROFILES])
+
+    def test_get_passwords_fetches_profiles_missing_from_keyfiles(self):
+        calls = []
+        self.wifipw._command_runner = self._profiles_runner(
+            ["home network", "cafe", "ifcfg net"], calls
+        )
+        results = self.wifipw.get_passwords()
+        self.assertEqual(sorted(results), ["cafe", "home network", "ifcfg net"])
+        self.assertEqual(results["home network"]["psk"], "p%ss word")
+        self.assertEqual(results["ifcfg net"]["psk"], "from nmcli")
+        self.assertEqual(len(calls), 2)
+
+    def test_get_passwords_with_empty_keyfile_dir_uses_nmcli(self):
+        calls = []
+        with tempfile.TemporaryDirectory() as empty_dir:
+            wifipw = WifiPasswordsLinux(nm_path=empty_dir)
+            wifipw._command_runner = self._profiles_runner(["home network", "cafe"], calls)
+            results = wifipw.get_passwords()
+        self.assertEqual(sorted(results), ["cafe", "home network"])
+        self.assertEqual(results["cafe"]["psk"], "from nmcli")
+
+    def test_get_passwords_async_fetches_profiles_missing_from_keyfiles(self):
+        import asyncio
+
+        calls = []
+        runner = self._profiles_runner(["cafe", "ifcfg net"], calls)
+
+        async def command_runner(shell_commands):
+            return runner(shell_commands)
+
+        results = asyncio.run(self.wifipw.get_passwords_async(command_runner))
+        self.assertEqual(sorted(results), ["cafe", "home network", "ifcfg net"])
+        self.assertEqual(results["ifcfg net"]["psk"], "from nmcli")
+        self.assertEqual(len(calls), 2)
+
+    def test_iter_passwords_yields_profiles_and_stores_data(self):
+        self.wifipw._command_runner = self._profiles_runner(["home network", "cafe"], [])
+        stream = self.wifipw.iter_passwords()
+        first = next(stream)
+        self.assertIn(first[0], ("cafe", "home network"))
+        self.assertEqual(self.wifipw.data, {})
+        rest = list(stream)
+        self.assertEqual(dict([first] + rest), self.wifipw.get_passwords())
+        self.assertEqual(self.wifipw.number_of_profiles, 2)
+
+    def test_get_single_password_cached_until_keyfile_changes(self):
+        calls = []
+
+        def runner(shell_commands):
+            calls.append(shell_commands)
+            return "802-11-wireless-security.psk:from nmcli\nconnection.id:cafe"
+
+        self.wifipw._command_runner = runner
+        self.assertEqual(self.wifipw.get_single_password("cafe"), "from nmcli")
+        self.assertEqual(self.wifipw.get_single_password("cafe"), "from nmcli")
+        self.assertEqual(len(calls), 1)
+
+        path = os.path.join(self.temp_dir.name, "cafe.nmconnection")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        self.wifipw.get_single_password("cafe")
+        self.assertEqual(len(calls), 2)
+
+    def test_get_single_password_negative_cache(self):
+        calls = []
+
+        def runner(shell_commands):
+            calls.append(shell_commands)
+            return ""
+
+        self.wifipw._command_runner = runner
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.wifipw.get_single_password("unknown ssid")
+        self.assertEqual(len(calls), 1)
+
+
+class TestLinuxWatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.wifipw = WifiPasswordsLinux(
+            nm_path=self.temp_dir.name,
+            wpa_supplicant_file_path=os.path.join(self.temp_dir.name, "none", "wpa.conf"),
+        )
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _change_files(self):
+        path = os.path.join(self.temp_dir.name, "cafe.nmconnection")
+        time.sleep(0.3)
+        with open(path, "w") as fout:
+            fout.write(OPEN_KEYFILE)
+        time.sleep(0.3)
+        with open(path, "w") as fout:
+            fout.write(OPEN_KEYFILE + "[wifi-security]\nkey-mgmt=wpa-psk\npsk=secret\n")
+        time.sleep(0.3)
+        os.remove(path)
+
+    def _watch_events(self, **kwargs):
+        changer = threading.Thread(target=self._change_files)
+        changer.start()
+        events = list(self.wifipw.watch(timeout=1.5, **kwargs))
+        changer.join()
+        return [(event, name, record and record["auth"]) for event, name, record in events]
+
+    def test_watch_inotify_yields_events(self):
+        self.assertEqual(
+            self._watch_events(),
+            [
+                ("added", "cafe", "Open"),
+                ("modified", "cafe", "wpa-psk"),
+                ("deleted", "cafe", None),
+            ],
+        )
+
+    def test_watch_polling_yields_events(self):
+        self.assertEqual(
+            self._watch_events(use_inotify=False, poll_interval=0.05),
+            [
+                ("added", "cafe", "Open"),
+                ("modified", "cafe", "wpa-psk"),
+                ("deleted", "cafe", None),
+            ],
+        )
+
+
+class TestLinuxNmcliBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wifipw = WifiPasswordsLinux(nm_path="/nonexistent", use_keyfiles=False)
+
+    def test_split_terse_handles_escaped_separators(self):
+        self.assertEqual(
+            self.wifipw._split_terse(r"802-11-wireless.cloned-mac-address:AA\:BB\:CC"),
+            ["802-11-wireless.cloned-mac-address", "AA:BB:CC"],
+        )
+        self.assertEqual(self.wifipw._split_terse(r"a\\:b"), ["a\\", "b"])
+
+    def test_parse_profile_batch_splits_records(self):
+        output = "\n".join(
+            [
+                r"connection.id:net\:one",
+                "connection.metered:yes",
+                "802-11-wireless.cloned-mac-address:random",
+                "802-11-wireless-security.key-mgmt:wpa-psk",
+                r"802-11-wireless-security.psk:pa\:ss",
+                "",
+                "connection.id:open net",
+                "connection.metered:no",
+                "802-11-wireless.cloned-mac-address:",
+            ]
+        )
+        results = self.wifipw._parse_profile_batch(output)
+        self.assertEqual(
+            results["net:one"],
+            {"auth": "wpa-psk", "psk": "pa:ss", "metered": True, "macrandom": "random"},
+        )
+        self.assertEqual(
+            results["open net"],
+            {"auth": "Open", "psk": "", "metered": False, "macrandom": "Disabled"},
+        )
+
+    def test_get_password_batch_uses_one_subprocess(self):
+        calls = []
+
+        def runner(shell_commands):
+            calls.append(shell_commands)
+            ids = [
+                shell_commands[i + 1] for i, arg in enumerate(shell_commands) if arg == "id"
+            ]
+            return "\n".join(f"connection.id:{name}" for name in ids)
+
+        self.wifipw._command_runner = runner
+        results = self.wifipw._get_password_batch(["a", "b", "c"])
+        self.assertEqual([name for name, _ in results], ["a", "b", "c"])
+        self.assertEqual(len(calls), 1)
+
+
+DEVICE_DNS = """GENERAL.DEVICE:eth0
+GENERAL.CONNECTION:Wired connection 1
+IP4.DNS[1]:192.168.0.1
+IP4.DNS[2]:192.168.0.2
+IP4.DOMAIN[1]:lan
+
+GENERAL.DEVICE:wlan0
+GENERAL.CONNECTION:home\\:net
+
+GENERAL.DEVICE:lo
+GENERAL.CONNECTION:
+"""
+
+
+class TestLinuxDns(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.wifipw = WifiPasswordsLinux(nm_path=self.temp_dir.name, batch_size=1)
+        self.calls = []
+
+        def runner(shell_commands):
+            self.calls.append(shell_commands)
+            if shell_commands == self.wifipw.NMCLI_DEVICE_DNS:
+                return DEVICE_DNS
+            name = shell_commands[shell_commands.index("id") + 1]
+            static = "yes" if name == "home:net" else "no"
+            return f"connection.id:{name}\nipv4.ignore-auto-dns:{static}\n"
+
+        self.wifipw._command_runner = runner
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_get_dns_config_joins_devices_and_profiles(self):
+        dns = self.wifipw.get_dns_config(True)
+        self.assertEqual(
+            dns,
+            {
+                "eth0": {
+                    "type": "DHCP",
+                    "DNS": ["192.168.0.1", "192.168.0.2"],
+                    "suffix": "lan",
+                },
+                "wlan0": {"type": "Static", "DNS": [], "suffix": ""},
+                "lo": {"type": "None", "DNS": [], "suffix": ""},
+            },
+        )
+        self.assertEqual(self.wifipw.number_of_interfaces, 3)
+        # one device call, one profile call per connected device
+        self.assertEqual(len(self.calls), 3)
+
+    def test_get_dns_config_async_matches(self):
+        import asyncio
+
+        async def runner(shell_commands):
+            return self.wifipw._command_runner(shell_commands)
+
+        dns = asyncio.run(self.wifipw.get_dns_config_async(runner, True))
+        self.assertEqual(dns, self.wifipw.get_dns_config(True))
+
+
+WPA_SUPPLICANT = """ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev
+# network={ commented out
+network={
+\tbssid=aa:bb:cc:dd:ee:ff
+\tscan_ssid=1
+\tssid="home network"
+\tpsk="secret"
+\tkey_mgmt=WPA-PSK
+}
+network={
+\tssid=636166c3a9
+\tkey_mgmt=NONE
+}
+network={
+\tssid=P"tab\\there"
+\tpsk=0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef
+}
+"""
+
+
+class TestLinuxWpaSupplicant(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.conf = os.path.join(self.temp_dir.name, "wpa_supplicant.conf")
+        with open(self.conf, "w") as fout:
+            fout.write(WPA_SUPPLICANT)
+        self.wifipw = WifiPasswordsLinux(
+            nm_path=os.path.join(self.temp_dir.name, "none"),
+            wpa_supplicant_file_path=self.conf,
+        )
+        self.calls = []
+
+        def runner(shell_commands):
+            self.calls.append(shell_commands)
+            with open(shell_commands[-1]) as fin:
+                return fin.read()
+
+        self.wifipw._command_runner = runner
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_parse_quoted_hex_and_printf_ssids(self):
+        results = self.wifipw._parse_wpa_supplicant(WPA_SUPPLICANT)
+        self.assertEqual(list(results), ["home network", "café", "tab\there"])
+        self.assertEqual(results["home network"]["psk"], "secret")
+        self.assertEqual(results["home network"]["auth"], "WPA-PSK")
+        self.assertEqual(results["café"]["auth"], "Open")
+        self.assertEqual(results["tab\there"]["psk"], "0123456789abcdef" * 4)
+
+    def test_save_round_trips_wpa_supplicant_file(self):
+        from wifipasswords import export
+
+        results = self.wifipw.get_passwords()
+        saved = os.path.join(self.temp_dir.name, "saved.conf")
+        export.save_wpa_supplicant(saved, results)
+        with open(saved) as fin:
+            saved_string = fin.read()
+        self.assertIn("\tpsk=" + "0123456789abcdef" * 4 + "\n", saved_string)
+        self.assertEqual(self.wifipw._parse_wpa_supplicant(saved_string), results)
+
+    def test_lookups_share_one_read_until_file_changes(self):
+        self.assertEqual(len(self.wifipw.get_passwords()), 3)
+        self.assertEqual(self.wifipw.get_known_ssids(), ["home network", "café", "tab\there"])
+        self.wifipw.cache.clear()
+        self.assertEqual(self.wifipw.get_single_password("home network"), "secret")
+        with self.assertRaises(ValueError):
+            self.wifipw.get_single_password("network")
+        self.assertEqual(len(self.calls), 1)
+
+        with open(self.conf, "a") as fout:
+            fout.write('network={\n\tssid="new"\n\tkey_mgmt=NONE\n}\n')
+        self.assertIn("new", self.wifipw.get_known_ssids())
+        self.assertEqual(len(self.calls), 2)
+
+
+class TestLinuxVisibleCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.wifipw = WifiPasswordsLinux(nm_path=self.temp_dir.name)
+        self.calls = []
+
+        def runner(shell_commands):
+            self.calls.append(shell_commands)
+            time.sleep(0.02)
+            return "home:6:130 Mbit/s:80:WPA2\ncafe:11:54 Mbit/s:40:\n"
+
+        self.wifipw._command_runner = runner
+
+    def tearDown(self) -> None:
+        self.wifipw.stop_scan_refresher()
+        self.temp_dir.cleanup()
+
+    def test_max_age_serves_cached_scan(self):
+        self.assertEqual(len(self.wifipw.get_visible_networks(True)), 2)
+        self.assertEqual(self.calls, [self.wifipw.NMCLI_VISIBLE_NETWORKS])
+        self.assertEqual(self.wifipw.get_number_visible_networks(max_age=60), 2)
+        self.assertEqual(len(self.calls), 1)
+
+        self.wifipw.get_visible_networks(max_age=0)
+        self.assertEqual(self.calls[1][-3:], ["list", "--rescan", "yes"])
+        self.wifipw.visible_cache.clear()
+        self.wifipw.get_visible_networks(max_age=60)
+        self.assertEqual(self.calls[2][-1], "auto")
+        self.wifipw.visible_cache.clear()
+        self.wifipw.get_visible_networks(max_age=float("inf"))
+        self.assertEqual(self.calls[3][-1], "no")
+
+    def test_concurrent_callers_share_one_scan(self):
+        threads = [
+            threading.Thread(target=self.wifipw.get_visible_networks, kwargs={"max_age": 5})
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_refresher_answers_from_cache(self):
+        self.wifipw.start_scan_refresher(interval=0.05)
+        time.sleep(0.2)
+        scans = len(self.calls)
+        self.assertGreaterEqual(scans, 2)
+        self.assertEqual(self.calls[0][-3:], ["list", "--rescan", "auto"])
+        started = time.perf_counter()
+        self.assertEqual(self.wifipw.get_number_visible_networks(), 2)
+        self.assertLess(time.perf_counter() - started, 0.01)
+        self.wifipw.stop_scan_refresher()
+        self.assertLessEqual(len(self.calls), scans + 1)
+        self.wifipw.get_visible_networks()
+        self.assertEqual(self.calls[-1], self.wifipw.NMCLI_VISIBLE_NETWORKS)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import unittest
+import asyncio
+import os
+from unittest import mock
+from wifipasswords import WifiPasswords
+from wifipasswords.wifipasswords_macos import WifiPasswordsMacos
+from wifipasswords.keychain import iter_airport_passwords, iter_keychain_items
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "keychain")
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as fin:
+        return fin.read()
+
+
+class TestMacosKeychain(unittest.TestCase):
+    def setUp(self) -> None:
+        self.calls = []
+
+    def make_wifipw(self, use_dump: bool) -> WifiPasswordsMacos:
+        wifipw = WifiPasswordsMacos(use_dump=use_dump)
+
+        def runner(shell_commands):
+            # stands in for security dump-keychain [-d] and security find-generic-password
+            self.calls.append(shell_commands)
+            if shell_commands[1] == "dump-keychain":
+                return read_fixture(
+                    "dump-keychain-d.txt" if "-d" in shell_commands else "dump-keychain.txt"
+                )
+            return f"{shell_commands[3]} password\n"
+
+        wifipw._command_runner = runner
+        return wifipw
+
+    def test_parse_dump(self):
+        with open(os.path.join(FIXTURES, "dump-keychain-d.txt"), encoding="utf-8") as fin:
+            items = list(iter_keychain_items(fin))
+        self.assertEqual(len(items), 5)
+        self.assertEqual(
+            items[1]["keychain"], "/Users/user/Library/Keychains/login.keychain-db"
+        )
+        self.assertEqual(items[1]["data"], "app secret")
+        self.assertEqual(items[4]["attributes"]["acct"], "keychain: office")
+        self.assertEqual(
+            list(iter_airport_passwords(read_fixture("dump-keychain-d.txt").splitlines())),
+            [
+                ("home network", "p&ssword <1> attributes:"),
+                ("Café", "paßword"),
+                ("office", None),
+            ],
+        )
+        self.assertEqual(
+            list(iter_airport_passwords(read_fixture("dump-keychain.txt").splitlines())),
+            [("home network", None), ("Café", None), ("office", None)],
+        )
+
+    def test_get_passwords_uses_one_dump(self):
+        results = self.make_wifipw(True).get_passwords()
+        self.assertEqual(
+            self.calls,
+            [
+                ["security", "dump-keychain", "-d"],
+                ["security", "find-generic-password", "-a", "office", "-w"],
+            ],
+        )
+        self.assertEqual(
+            {ssid: network["psk"] for ssid, network in results.items()},
+            {
+                "home network": "p&ssword <1> attributes:",
+                "Café": "paßword",
+                "office": "office password",
+            },
+        )
+
+    def test_get_passwords_without_dump(self):
+        wifipw = self.make_wifipw(False)
+        results = wifipw.get_passwords()
+        self.assertEqual(self.calls[0], ["security", "dump-keychain"])
+        self.assertEqual(len(self.calls), 4)
+        self.assertEqual(list(results), ["home network", "Café", "office"])
+        self.assertEqual(results["Café"]["psk"], "Café password")
+        self.assertEqual(wifipw.get_known_ssids(), ["home network", "Café", "office"])
+
+    def test_get_passwords_async_uses_one_dump(self):
+        wifipw = self.make_wifipw(True)
+        runner = wifipw._command_runner
+
+        async def async_runner(shell_commands):
+            return runner(shell_commands)
+
+        results = asyncio.run(wifipw.get_passwords_async(async_runner))
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(results["home network"]["psk"], "p&ssword <1> attributes:")
+        self.assertEqual(results["office"]["psk"], "office password")
+
+    def test_facade_passes_use_dump(self):
+        with mock.patch("wifipasswords._platform_system", return_value="Darwin"):
+            self.assertTrue(WifiPasswords(use_dump=True)._WifiPasswordsSubclass.use_dump)
+            self.assertFalse(WifiPasswords()._WifiPasswordsSubclass.use_dump)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import unittest
+import sys
+from wifipasswords.metrics import CommandMetrics, command_family, metrics, run_command
+
+
+class TestMetrics(unittest.TestCase):
+    def test_command_family_drops_options_and_ssids(self):
+        self.assertEqual(
+            command_family(["nmcli", "-t", "-f", "NAME,TYPE", "c", "s", "id", "home"]),
+            "nmcli c s",
+        )
+        self.assertEqual(
+            command_family(["netsh", "wlan", "show", "profile", "home", "key=clear"]),
+            "netsh wlan show profile",
+        )
+        self.assertEqual(
+            command_family(["security", "find-generic-password", "-a", "home", "-w"]),
+            "security find-generic-password",
+        )
+        self.assertEqual(
+            command_family(["/System/Library/airport", "-I"]),
+            "airport",
+        )
+
+    def test_stats_histogram_is_cumulative(self):
+        command_metrics = CommandMetrics(buckets=(0.1, 1.0))
+        command_metrics.record(["nmcli", "c"], 0.05, 10)
+        command_metrics.record(["nmcli", "c"], 0.5, 20, failed=True, wait=0.2)
+        command_metrics.record(["nmcli", "c"], 5.0, 30)
+        stats = command_metrics.stats()["nmcli c"]
+        self.assertEqual(stats["calls"], 3)
+        self.assertEqual(stats["failures"], 1)
+        self.assertEqual(stats["output_bytes"], 60)
+        self.assertEqual(stats["max_seconds"], 5.0)
+        self.assertEqual(stats["latency_buckets"], {"0.1": 1, "1.0": 2, "+Inf": 3})
+        self.assertEqual(stats["wait_buckets"], {"0.1": 2, "1.0": 3, "+Inf": 3})
+        command_metrics.reset()
+        self.assertEqual(command_metrics.stats(), {})
+
+    def test_prometheus_format(self):
+        command_metrics = CommandMetrics(buckets=(0.1,))
+        command_metrics.record(["netsh", "wlan", "show", "profiles"], 0.05, 100)
+        text = command_metrics.prometheus()
+        self.assertIn("# TYPE wifipasswords_command_duration_seconds histogram\n", text)
+        self.assertIn(
+            'wifipasswords_command_duration_seconds_bucket{command="netsh wlan show profiles",'
+            'le="+Inf"} 1\n',
+            text,
+        )
+        self.assertIn(
+            'wifipasswords_command_output_bytes_total{command="netsh wlan show profiles"} 100\n',
+            text,
+        )
+        self.assertTrue(text.endswith("\n"))
+
+    def test_run_command_records_output_and_failures(self):
+        metrics.reset()
+        command = [sys.executable, "-c", "print('x' * 9)"]
+        self.assertEqual(run_command(command).stdout.strip(), b"x" * 9)
+        with self.assertRaises(OSError):
+            run_command(["wifipasswords-missing-command"])
+        stats = metrics.stats()
+        family = command_family(command)
+        self.assertEqual(stats[family]["calls"], 1)
+        self.assertEqual(stats[family]["failures"], 0)
+        self.assertGreaterEqual(stats[family]["output_bytes"], 10)
+        self.assertEqual(stats["wifipasswords-missing-command"]["failures"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import unittest
+import json
+import os
+import tempfile
+from unittest import mock
+from wifipasswords import export
+from wifipasswords.psk import PskCache, derive_psk, precompute_psks
+from wifipasswords.records import NetworkProfile
+
+# IEEE 802.11i-2004 annex H.4 test vector
+IEEE_PSK = "f42c6fc52df0ebef9ebb4b90b38a5f902e83fe1b135a70e23aed762e9710a12e"
+
+
+class TestPsk(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.temp_dir.name, "cache", "psk_cache.json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_derive_psk_matches_test_vector(self):
+        self.assertEqual(derive_psk("IEEE", "password"), IEEE_PSK)
+
+    def test_pool_matches_serial_and_skips_invalid(self):
+        networks = [(f"network {n}", f"password{n}") for n in range(10)]
+        networks += [("short", "pw"), ("raw", IEEE_PSK.upper())]
+        results = precompute_psks(networks, processes=2)
+        self.assertEqual(len(results), 11)
+        self.assertEqual(results["network 3"], derive_psk("network 3", "password3"))
+        self.assertEqual(results["raw"], IEEE_PSK)
+
+    def test_frozen_executable_derives_in_process(self):
+        networks = [(f"network {n}", f"password{n}") for n in range(10)]
+        with mock.patch("sys.frozen", True, create=True), mock.patch(
+            "wifipasswords.psk.Pool"
+        ) as pool:
+            results = precompute_psks(networks, processes=2)
+        pool.assert_not_called()
+        self.assertEqual(results["network 3"], derive_psk("network 3", "password3"))
+
+    def test_persistent_cache_skips_derivation(self):
+        precompute_psks([("IEEE", "password")], cache=PskCache(self.cache_path))
+        if os.name == "posix":
+            self.assertEqual(os.stat(self.cache_path).st_mode & 0o777, 0o600)
+        with mock.patch("wifipasswords.psk.derive_psk") as derive:
+            results = precompute_psks([("IEEE", "password")], cache=PskCache(self.cache_path))
+        derive.assert_not_called()
+        self.assertEqual(results, {"IEEE": IEEE_PSK})
+
+    def test_cache_keys_are_salted_and_mode_restricted(self):
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, "w") as fout:
+            fout.write('{"version": 1, "psks": {"old": "entry"}}')
+        os.chmod(self.cache_path, 0o644)
+        precompute_psks([("IEEE", "password")], cache=PskCache(self.cache_path))
+        other_path = os.path.join(self.temp_dir.name, "other.json")
+        precompute_psks([("IEEE", "password")], cache=PskCache(other_path))
+        with open(self.cache_path) as fin, open(other_path) as other:
+            saved, other_saved = json.load(fin), json.load(other)
+        self.assertNotIn("old", saved["psks"])
+        self.assertNotEqual(set(saved["psks"]), set(other_saved["psks"]))
+        if os.name == "posix":
+            self.assertEqual(os.stat(self.cache_path).st_mode & 0o777, 0o600)
+
+    def test_save_wpa_supplicant_writes_precomputed_psk(self):
+        path = os.path.join(self.temp_dir.name, "wpa_supplicant.conf")
+        data = {"IEEE": NetworkProfile(auth="wpa-psk", psk="password")}
+        export.save_wpa_supplicant(path, data, precompute_psk=True, psk_cache=False)
+        with open(path) as fin:
+            conf = fin.read()
+        self.assertIn(f"\tpsk={IEEE_PSK}\n", conf)
+        self.assertNotIn('"password"', conf)
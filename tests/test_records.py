@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import unittest
+import json
+import pickle
+from wifipasswords.records import NetworkProfile, VisibleNetwork, as_dicts, json_default
+
+
+class TestRecords(unittest.TestCase):
+    def test_network_profile_behaves_as_dictionary(self):
+        network = NetworkProfile(auth="wpa-psk", psk="secret")
+        self.assertEqual(
+            network,
+            {"auth": "wpa-psk", "psk": "secret", "metered": False, "macrandom": "Disabled"},
+        )
+        self.assertEqual(network["psk"], "secret")
+        network["metered"] = True
+        self.assertTrue(network.metered)
+        self.assertEqual(list(network.keys()), ["auth", "psk", "metered", "macrandom"])
+        with self.assertRaises(KeyError):
+            network["ssid"] = "home"
+        self.assertFalse(hasattr(network, "__dict__"))
+
+    def test_copy_is_independent(self):
+        template = NetworkProfile()
+        network = template.copy()
+        network["auth"] = "Open"
+        self.assertEqual(template["auth"], "")
+
+    def test_visible_network_only_has_set_fields(self):
+        network = VisibleNetwork(auth="WPA2", channel="6")
+        self.assertEqual(network, {"auth": "WPA2", "channel": "6"})
+        self.assertNotIn("rates", network)
+        self.assertEqual(network.get("rates"), None)
+
+    def test_json_and_pickle_round_trip(self):
+        data = {"home": NetworkProfile(psk="secret"), "cafe": VisibleNetwork(bssids=["aa"])}
+        self.assertEqual(json.loads(json.dumps(data, default=json_default)), data)
+        self.assertEqual(pickle.loads(pickle.dumps(data)), data)
+
+    def test_as_dicts_returns_plain_dictionaries(self):
+        data = as_dicts([("home", NetworkProfile(psk="secret")), ("cafe", {"auth": "Open"})])
+        self.assertIs(type(data["home"]), dict)
+        self.assertEqual(json.loads(json.dumps(data))["home"]["psk"], "secret")
+        self.assertEqual(data["cafe"], {"auth": "Open"})
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import unittest
+import json
+import math
+import os
+import tempfile
+from wifipasswords.export import RotatingNdjsonWriter
+from wifipasswords.sampler import RingBuffer, VisibleNetworkSampler
+from wifipasswords.wifipasswords_linux import WifiPasswordsLinux
+from wifipasswords.wifipasswords_macos import WifiPasswordsMacos
+from wifipasswords.wifipasswords_windows import WifiPasswordsWindows
+
+NMCLI_OUTPUT = """AA\\:BB\\:CC\\:DD\\:EE\\:01:home:6:130 Mbit/s:80
+AA\\:BB\\:CC\\:DD\\:EE\\:02:home:36:270 Mbit/s:55
+AA\\:BB\\:CC\\:DD\\:EE\\:03::11:54 Mbit/s:20
+"""
+
+NETSH_OUTPUT = """\r
+Interface name : Wi-Fi\r
+There are 2 networks currently visible.\r
+\r
+SSID 1 : home\r
+    Network type            : Infrastructure\r
+    Authentication          : WPA2-Personal\r
+    Encryption              : CCMP\r
+    BSSID 1                 : aa:bb:cc:dd:ee:01\r
+         Signal             : 80%\r
+         Radio type         : 802.11n\r
+         Channel            : 6\r
+         Basic rates (Mbps) : 1 2 5.5 11\r
+         Other rates (Mbps) : 6 9 12 18 24 36 48 54\r
+    BSSID 2                 : aa:bb:cc:dd:ee:02\r
+         Signal             : 55%\r
+         Radio type         : 802.11ac\r
+         Channel            : 36\r
+\r
+SSID 2 : \r
+    Network type            : Infrastructure\r
+    Authentication          : Open\r
+    Encryption              : None\r
+    BSSID 1                 : aa:bb:cc:dd:ee:03\r
+         Signal             : 20%\r
+         Channel            : 11\r
+         Basic rates (Mbps) : 1 2 5.5 11\r
+"""
+
+AIRPORT_OUTPUT = """                            SSID BSSID             RSSI CHANNEL HT CC SECURITY (auth/unicast/group)
+                            home aa:bb:cc:dd:ee:01 -45  6       Y  GB WPA2(PSK/AES/AES)
+                      home 5 GHz aa:bb:cc:dd:ee:02 -67  36,+1   Y  GB WPA2(PSK/AES/AES)
+"""
+
+
+class FakePlatform:
+    def __init__(self) -> None:
+        self.scans = [
+            [("aa:bb:cc:dd:ee:01", "home", 80.0, 6, 130.0)],
+            [
+                ("aa:bb:cc:dd:ee:01", "home", 70.0, 6, float("nan")),
+                ("aa:bb:cc:dd:ee:02", "cafe", 30.0, 11, 54.0),
+            ],
+            [("aa:bb:cc:dd:ee:01", "home", 60.0, 1, 54.0)],
+        ]
+
+    def get_visible_bssids(self) -> list:
+        return self.scans.pop(0)
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_wraps_and_aggregates(self):
+        buffer = RingBuffer(3)
+        self.assertTrue(math.isnan(buffer.mean()))
+        for value in (1.0, 2.0, float("nan"), 4.0, 5.0):
+            buffer.append(value)
+        self.assertEqual(len(buffer), 3)
+        self.assertTrue(math.isnan(list(buffer)[0]))
+        self.assertEqual(list(buffer)[1:], [4.0, 5.0])
+        self.assertEqual((buffer.min(), buffer.max(), buffer.mean()), (4.0, 5.0, 4.5))
+        self.assertEqual(buffer.last(), 5.0)
+        buffer.append(6.0)
+        self.assertEqual(buffer.mean(), 5.0)
+
+
+class TestVisibleBssids(unittest.TestCase):
+    def test_linux(self):
+        self.assertEqual(
+            WifiPasswordsLinux()._parse_visible_bssids(NMCLI_OUTPUT),
+            [
+                ("aa:bb:cc:dd:ee:01", "home", 80.0, 6, 130.0),
+                ("aa:bb:cc:dd:ee:02", "home", 55.0, 36, 270.0),
+                ("aa:bb:cc:dd:ee:03", "Hidden", 20.0, 11, 54.0),
+            ],
+        )
+
+    def test_windows(self):
+        bssids = WifiPasswordsWindows._parse_visible_bssids(NETSH_OUTPUT)
+        self.assertEqual(bssids[0], ("aa:bb:cc:dd:ee:01", "home", 80.0, 6, 54.0))
+        self.assertEqual(bssids[1][:4], ("aa:bb:cc:dd:ee:02", "home", 55.0, 36))
+        self.assertTrue(math.isnan(bssids[1][4]))
+        self.assertEqual(bssids[2], ("aa:bb:cc:dd:ee:03", "Hidden", 20.0, 11, 11.0))
+
+    def test_macos(self):
+        bssids = WifiPasswordsMacos._parse_visible_bssids(AIRPORT_OUTPUT)
+        self.assertEqual(
+            [bssid[:4] for bssid in bssids],
+            [
+                ("aa:bb:cc:dd:ee:01", "home", -45.0, 6),
+                ("aa:bb:cc:dd:ee:02", "home 5 GHz", -67.0, 36),
+            ],
+        )
+
+
+class TestSampler(unittest.TestCase):
+    def test_aggregates_per_bssid(self):
+        sampler = VisibleNetworkSampler(FakePlatform(), capacity=2)
+        self.assertEqual(sampler.sample(), 1)
+        self.assertEqual(sampler.sample(), 2)
+        self.assertEqual(sampler.sample(), 1)
+        self.assertEqual(sampler.scans, 3)
+        self.assertEqual(sampler.bssids(), ["aa:bb:cc:dd:ee:01", "aa:bb:cc:dd:ee:02"])
+
+        home = sampler.aggregate("AA:BB:CC:DD:EE:01")
+        # capacity 2, the first sample has been overwritten
+        self.assertEqual(home["samples"], 2)
+        self.assertEqual(
+            (home["signal_min"], home["signal_max"], home["signal_mean"]), (60.0, 70.0, 65.0)
+        )
+        self.assertEqual((home["rate_mean"], home["rate_last"]), (54.0, 54.0))
+        self.assertEqual(home["channel"], 1)
+        self.assertLess(home["first_seen"], home["last_seen"])
+        self.assertEqual(
+            [sample["signal"] for sample in sampler.history("aa:bb:cc:dd:ee:01")], [70.0, 60.0]
+        )
+        self.assertEqual(sampler.aggregates()["aa:bb:cc:dd:ee:02"]["ssid"], "cafe")
+        with self.assertRaises(ValueError):
+            sampler.aggregate("00:00:00:00:00:00")
+
+    def test_ndjson_output(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "survey.ndjson")
+            sampler = VisibleNetworkSampler(FakePlatform(), path=path)
+            for _ in range(3):
+                sampler.sample()
+            sampler.stop()
+            with open(path) as fin:
+                records = [json.loads(line) for line in fin]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[1]["bssid"], "aa:bb:cc:dd:ee:01")
+        self.assertIsNone(records[1]["rate"])
+        self.assertEqual(records[2]["channel"], 11)
+
+    def test_rotation(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "survey.ndjson")
+            with RotatingNdjsonWriter(path, max_bytes=40, backup_count=2) as writer:
+                writer.write_many({"n": n, "padding": "x" * 10} for n in range(5))
+            self.assertEqual(
+                sorted(os.listdir(temp_dir)),
+                ["survey.ndjson", "survey.ndjson.1", "survey.ndjson.2"],
+            )
+            with open(path) as fin:
+                self.assertEqual(json.loads(fin.read())["n"], 4)
+            with open(path + ".2") as fin:
+                self.assertEqual(json.loads(fin.read())["n"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
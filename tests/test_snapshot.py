@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import unittest
+import time
+from wifipasswords.records import NetworkProfile, VisibleNetwork
+from wifipasswords.snapshot import Snapshot, take_snapshot
+
+
+class FakePlatform:
+    """
+    Stands in for a platform class, records every command run.\n
+    """
+
+    def __init__(self) -> None:
+        self.commands = []
+        self.number_visible_networks = 0
+        self.number_of_interfaces = 0
+
+    def _command_runner(self, shell_commands: list) -> str:
+        self.commands.append(tuple(shell_commands))
+        time.sleep(0.01)
+        return " ".join(shell_commands) + " output"
+
+    def get_currently_connected_ssids(self) -> list:
+        self._command_runner(["connected"])
+        return ["home"]
+
+    def iter_passwords(self):
+        self._command_runner(["profiles"])
+        yield "home", NetworkProfile(auth="WPA2-Personal", psk="home password")
+        yield "cafe", NetworkProfile(auth="Open")
+
+    def get_visible_networks(self, as_dictionary=False):
+        output = self._command_runner(["visible"])
+        self.number_visible_networks = 1
+        return {"home": VisibleNetwork(signal="80%")} if as_dictionary else output
+
+    def get_dns_config(self, as_dictionary=False):
+        output = self._command_runner(["dns"])
+        self.number_of_interfaces = 2
+        if as_dictionary:
+            return {"eth0": {"type": "DHCP", "DNS": ["192.168.0.1"], "suffix": "lan"}}
+        return output
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.platform = FakePlatform()
+        # instance attribute, as a shadowed staticmethod would be
+        self.platform._command_runner = self.platform._command_runner
+        self.runner = self.platform._command_runner
+
+    def test_each_command_runs_once(self):
+        rows = []
+        snapshot = take_snapshot(
+            self.platform, "Linux", on_profile=lambda *row: rows.append(row)
+        )
+        self.assertEqual(
+            sorted(self.platform.commands),
+            [("connected",), ("dns",), ("profiles",), ("visible",)],
+        )
+        self.assertEqual([row[0] for row in rows], ["home", "cafe"])
+        self.assertEqual(rows[0][2], ["home"])
+        self.assertIs(self.platform._command_runner, self.runner)
+        self.assertEqual(self.platform.number_visible_networks, 1)
+
+        self.assertEqual(
+            snapshot.get_currently_connected_passwords(), [("home", "home password")]
+        )
+        self.assertEqual(snapshot.get_single_password("cafe"), "")
+        self.assertEqual(snapshot.number_of_profiles, 2)
+        self.assertEqual(snapshot.number_of_visible_networks, 1)
+        self.assertEqual(snapshot.number_of_interfaces, 2)
+        self.assertEqual(snapshot.get_visible_networks(), "visible output")
+        self.assertEqual(snapshot.get_visible_networks(True)["home"]["signal"], "80%")
+        self.assertIs(type(snapshot.get_passwords()["home"]), dict)
+        self.assertIs(type(snapshot.get_visible_networks(True)["home"]), dict)
+        self.assertEqual(snapshot.get_dns_config(), "dns output")
+        with self.assertRaises(ValueError):
+            snapshot.get_single_password("unknown")
+
+    def test_instance_is_not_changed_during_snapshot(self):
+        # a call on the instance from another thread mid snapshot runs its own command
+        snapshot = take_snapshot(
+            self.platform,
+            "Linux",
+            visible=False,
+            dns=False,
+            on_profile=lambda *row: self.platform.get_currently_connected_ssids(),
+        )
+        self.assertEqual(self.platform.commands.count(("connected",)), 3)
+        self.assertEqual(snapshot.get_currently_connected_ssids(), ["home"])
+
+    def test_skipped_fetches(self):
+        snapshot = take_snapshot(self.platform, "Linux", visible=False, dns=False)
+        self.assertEqual(sorted(self.platform.commands), [("connected",), ("profiles",)])
+        with self.assertRaises(ValueError):
+            snapshot.get_visible_networks()
+        with self.assertRaises(ValueError):
+            snapshot.number_of_interfaces
+
+    def test_snapshot_is_immutable(self):
+        profiles = {"home": NetworkProfile(psk="home password")}
+        snapshot = Snapshot("Linux", profiles, ["home"], dns_config={"eth0": {"DNS": []}})
+        profiles["home"]["psk"] = "changed"
+        snapshot.get_passwords()["home"]["psk"] = "changed"
+        snapshot.get_dns_config(True)["eth0"]["DNS"].append("1.1.1.1")
+        self.assertEqual(snapshot.get_single_password("home"), "home password")
+        self.assertEqual(snapshot.get_dns_config(True), {"eth0": {"DNS": []}})
+        with self.assertRaises(AttributeError):
+            snapshot.platform = "Windows"
+        with self.assertRaises(TypeError):
+            snapshot._profiles["cafe"] = NetworkProfile()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import unittest
+import time
+from wifipasswords.taskgraph import TaskGraph
+
+
+class TestTaskGraph(unittest.TestCase):
+    def test_independent_tasks_run_concurrently(self):
+        graph = TaskGraph()
+        for name in ("profiles", "visible", "dns"):
+            graph.add(name, lambda name=name: time.sleep(0.1) or name)
+        graph.add("json", lambda profiles: f"saved {profiles}", "profiles")
+        started = time.perf_counter()
+        with graph:
+            results = graph.wait()
+        self.assertLess(time.perf_counter() - started, 0.25)
+        self.assertEqual(results["json"], "saved profiles")
+        self.assertEqual(list(results), ["profiles", "visible", "dns", "json"])
+        self.assertEqual(set(graph.timings), set(results))
+
+    def test_dependency_results_passed_in_order(self):
+        graph = TaskGraph()
+        graph.add("a", lambda: 1)
+        graph.add("b", lambda: time.sleep(0.02) or 2)
+        graph.add("c", lambda b, a: (b, a), "b", "a")
+        graph.add("d", lambda: graph.result("c"))
+        with graph:
+            self.assertEqual(graph.result("c"), (2, 1))
+            self.assertEqual(graph.result("d"), (2, 1))
+
+    def test_failure_propagates_to_dependents(self):
+        def fail():
+            raise ValueError("SSID not known.")
+
+        ran = []
+        graph = TaskGraph()
+        graph.add("profiles", fail)
+        graph.add("json", lambda data: ran.append(data), "profiles")
+        graph.add("dns", lambda: "dns")
+        with graph:
+            with self.assertRaises(ValueError):
+                graph.result("json")
+            self.assertEqual(graph.result("dns"), "dns")
+        self.assertEqual(ran, [])
+
+    def test_add_validates_names(self):
+        graph = TaskGraph()
+        graph.add("a", lambda: None)
+        with self.assertRaises(ValueError):
+            graph.add("a", lambda: None)
+        with self.assertRaises(ValueError):
+            graph.add("b", lambda a: None, "missing")
+        with graph:
+            with self.assertRaises(RuntimeError):
+                graph.add("c", lambda: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
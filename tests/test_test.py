@@ -21,6 +21,13 @@ class TestRunner(unittest.TestCase):
         self.wifipw.get_passwords_dummy()
         self.assertTrue(type(self.wifipw.get_passwords_data()) is dict)
 
+    def test_data_is_converted_once_per_fetch(self):
+        self.wifipw.get_passwords_dummy(0)
+        data = self.wifipw.data
+        self.assertIs(self.wifipw.data, data)
+        self.wifipw.get_passwords_dummy(0)
+        self.assertIsNot(self.wifipw.data, data)
+
     def test_get_visible_networks_is_string(self):
         self.assertTrue(type(self.wifipw.get_visible_networks()) is str)
 
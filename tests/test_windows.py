@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import unittest
+import asyncio
+import os
+import shutil
+from unittest import mock
+from wifipasswords import WifiPasswords
+from wifipasswords.wifipasswords_windows import WifiPasswordsWindows
+from wifipasswords.wlanprofile import decode_ssid_hex, parse_profile_directory
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "wlan_export")
+
+
+class TestWindowsExport(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wifipw = WifiPasswordsWindows(use_export=True)
+        self.calls = []
+
+        def runner(shell_commands):
+            # stands in for netsh wlan export profile folder=... key=clear
+            self.calls.append(shell_commands)
+            folder = shell_commands[4].split("=", 1)[1]
+            for name in os.listdir(FIXTURES):
+                shutil.copy(os.path.join(FIXTURES, name), folder)
+            return ""
+
+        self.wifipw._command_runner = runner
+
+    def test_parse_profile_directory(self):
+        results = parse_profile_directory(FIXTURES)
+        self.assertEqual(list(results), ["café", "home network", "office"])
+        self.assertEqual(
+            results["home network"],
+            {
+                "auth": "WPA2-Personal",
+                "psk": "p&ssword <1>",
+                "metered": False,
+                "macrandom": "Daily",
+            },
+        )
+        self.assertEqual(
+            results["café"],
+            {"auth": "Open", "psk": "", "metered": False, "macrandom": "Disabled"},
+        )
+        self.assertEqual(results["office"]["auth"], "WPA2-Enterprise")
+        self.assertEqual(results["office"]["macrandom"], "Enabled")
+        self.assertEqual(decode_ssid_hex("636166C3A9"), "café")
+
+    def test_get_passwords_uses_one_export(self):
+        results = self.wifipw.get_passwords()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0][:4], ["netsh", "wlan", "export", "profile"])
+        self.assertEqual(self.calls[0][-1], "key=clear")
+        self.assertEqual(results, parse_profile_directory(FIXTURES))
+        self.assertEqual(self.wifipw.number_of_profiles, 3)
+        # the folder holding clear text keys is removed
+        self.assertFalse(os.path.exists(self.calls[0][4].split("=", 1)[1]))
+
+    def test_get_passwords_async_uses_one_export(self):
+        async def runner(shell_commands):
+            return self.wifipw._command_runner(shell_commands)
+
+        results = asyncio.run(self.wifipw.get_passwords_async(runner))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(results, parse_profile_directory(FIXTURES))
+
+    def test_facade_passes_use_export(self):
+        with mock.patch("wifipasswords._platform_system", return_value="Windows"):
+            self.assertTrue(WifiPasswords(use_export=True)._WifiPasswordsSubclass.use_export)
+            self.assertFalse(WifiPasswords()._WifiPasswordsSubclass.use_export)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -27,22 +27,40 @@ __copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
 __version__ = "0.4.1-beta"
 __licence__ = "GPLv3"  # GNU General Public Licence v3
 
-import platform
+import sys
+
+# sys.platform values for the platform.system() names used to pick the backend,
+# avoids importing the platform module on startup
+_PLATFORM_NAMES = {"win32": "Windows", "cygwin": "Windows", "linux": "Linux", "darwin": "Darwin"}
+
+
+def _platform_system() -> str:
+    name = _PLATFORM_NAMES.get(sys.platform)
+    if name is None:
+        import platform
+
+        name = platform.system()
+    return name
 
 
 class WifiPasswords:
     """
     For retrieving wifi network information.\n
     Uses platform specific code to retrieve information.\n
+    Arguments:\n
+    - use_export: windows only, read every profile from a single netsh wlan export
+      instead of one netsh call per profile. metered is not reported.\n
+    - use_dump: macos only, read every secret from a single security dump-keychain -d
+      instead of one authentication prompt per SSID.\n
     """
 
-    def __init__(self) -> None:
-        self.platform = platform.system()
+    def __init__(self, use_export: bool = False, use_dump: bool = False) -> None:
+        self.platform = _platform_system()
 
         if self.platform == "Windows":
             from .wifipasswords_windows import WifiPasswordsWindows as _PlatformClass
 
-            self._WifiPasswordsSubclass = _PlatformClass()
+            self._WifiPasswordsSubclass = _PlatformClass(use_export=use_export)
         elif self.platform == "Linux":
             from .wifipasswords_linux import WifiPasswordsLinux as _PlatformClass
 
@@ -50,18 +68,27 @@ class WifiPasswords:
         elif self.platform == "Darwin":
             from .wifipasswords_macos import WifiPasswordsMacos as _PlatformClass
 
-            self._WifiPasswordsSubclass = _PlatformClass()
+            self._WifiPasswordsSubclass = _PlatformClass(use_dump=use_dump)
         elif self.platform == "Java":
             raise NotImplementedError
         else:
             raise NotImplementedError
+        # (platform data, converted dictionary), see data
+        self._data_dicts = (None, {})
 
     @property
     def data(self) -> dict:
         """
         Returns the stored data value as a dictionary. \n
+        The conversion is cached until the platform data is replaced by the next fetch,
+        so repeated reads return the same dictionary.\n
         """
-        return self._WifiPasswordsSubclass.data
+        source = self._WifiPasswordsSubclass.data
+        if self._data_dicts[0] is not source:
+            from .records import as_dicts
+
+            self._data_dicts = (source, as_dicts(source))
+        return self._data_dicts[1]
 
     @property
     def number_of_profiles(self) -> int:
@@ -82,7 +109,7 @@ class WifiPasswords:
         """
         Returns the number of network interfaces. \n
         """
-        return self._WifiPasswordsSubclass.number_visible_networks
+        return self._WifiPasswordsSubclass.number_of_interfaces
 
     def get_passwords(self) -> dict:
         """
@@ -91,7 +118,18 @@ class WifiPasswords:
         data is also maintained in the instance under data variable.\n
         can take several seconds to return.
         """
-        return self._WifiPasswordsSubclass.get_passwords()
+        from .records import as_dicts
+
+        return as_dicts(self._WifiPasswordsSubclass.get_passwords())
+
+    def iter_passwords(self):
+        """
+        Generator yielding (ssid, network dictionary) for saved network profiles.\n
+        profiles are yielded as each fetch completes, so the first arrive quickly.\n
+        data is updated once all profiles have been yielded.\n
+        """
+        for ssid, network in self._WifiPasswordsSubclass.iter_passwords():
+            yield ssid, dict(network)
 
     def get_passwords_dummy(self, delay: float = 0.5, quantity: int = 10) -> dict:
         """
@@ -100,24 +138,44 @@ class WifiPasswords:
         - delay: seconds of delay before returning. emulating netsh.\n
         - quantity: how many networks, half open, half wpa\n
         """
-        return self._WifiPasswordsSubclass.get_passwords_dummy(delay, quantity)
+        from .records import as_dicts
+
+        return as_dicts(self._WifiPasswordsSubclass.get_passwords_dummy(delay, quantity))
 
     def get_passwords_data(self) -> dict:
         """
         returns stored data as dictionary.\n
         needs to be run after get_passwords or will return empty dict.
         """
-        return self._WifiPasswordsSubclass.data
+        return self.data
 
-    def get_visible_networks(self, as_dictionary=False) -> str:
+    def get_visible_networks(self, as_dictionary=False, max_age: float = None) -> str:
         """
         returns currently visible WiFi networks.\n
         returns a formatted string or dictionary.\n
         on linux only returns wifi SSID.\n
         Arguments:\n
         - as_dictionary: if true, returns nested dictionary of dns config, false returns str.\n
+        - max_age: linux only, seconds old a cached scan may be before nmcli is run again.
+          other platforms always scan, which also satisfies max_age.\n
+        """
+        if max_age is not None and self.platform == "Linux":
+            result = self._WifiPasswordsSubclass.get_visible_networks(as_dictionary, max_age)
+        else:
+            result = self._WifiPasswordsSubclass.get_visible_networks(as_dictionary)
+        if as_dictionary:
+            from .records import as_dicts
+
+            return as_dicts(result)
+        return result
+
+    def get_visible_bssids(self) -> list:
+        """
+        returns a (bssid, ssid, signal, channel, rate) tuple for every access point seen.\n
+        signal is in percent on linux and windows, RSSI dBm on macos.
+        rate is in Mbit/s, nan if not reported.\n
         """
-        return self._WifiPasswordsSubclass.get_visible_networks(as_dictionary)
+        return self._WifiPasswordsSubclass.get_visible_bssids()
 
     def get_dns_config(self, as_dictionary=False) -> str:
         """
@@ -132,8 +190,15 @@ class WifiPasswords:
         return self._WifiPasswordsSubclass.get_dns_config(as_dictionary)
 
     def save_wpa_supplicant(
-        self, path: str, data: dict = None, include_open: bool = True, locale: str = "GB"
-    ) -> None:
+        self,
+        path: str,
+        data: dict = None,
+        include_open: bool = True,
+        locale: str = "GB",
+        precompute_psk: bool = False,
+        psk_cache: bool = True,
+        since=None,
+    ):
         """
         Saves formatted wpa_supplicant.conf file\n
         For use on linux systems to configure wifi\n
@@ -141,26 +206,84 @@ class WifiPasswords:
         - path - must be specified. Full path with filename.\n
         - data - dictionary or defaults to self.data\n
         - include open - select whether open networks in dictionary will be output.\n
-        - locale - ISO country code to add to wpa_supplicant. Should be country of use.
-        """
-        self._WifiPasswordsSubclass.save_wpa_supplicant(path, data, include_open, locale)
+        - locale - ISO country code to add to wpa_supplicant. Should be country of use.\n
+        - precompute_psk - write 64 hex digit psks as wpa_passphrase does instead of passphrases.\n
+        - psk_cache - reuse precomputed psks from the persistent cache in the user cache directory.
+        - since - Manifest, Snapshot or data of a previous export, only networks added or changed
+          since are written and the SnapshotDiff is returned, see save_json.
+        """
+        return self._WifiPasswordsSubclass.save_wpa_supplicant(
+            path, data, include_open, locale, precompute_psk, psk_cache, since
+        )
 
-    def save_json(self, path: str, data: dict = None) -> None:
+    def save_json(
+        self,
+        path: str,
+        data: dict = None,
+        ndjson: bool = False,
+        fsync: bool = True,
+        since=None,
+    ):
         """
         Saves network data as JSON.\n
+        The file is written one profile at a time to a temporary file then renamed over path,
+        so an interrupted save never leaves a truncated file.\n
         arguments:\n
         - path - must be specified. Full path including filename.
-        - data - dictionary, defaults to self.data
+        - data - dictionary or iterable of (ssid, network) pairs, defaults to self.data
+        - ndjson - write JSON Lines, one {"ssid": ..., ...} object per line.
+        - fsync - flush the file to disk before renaming, defaults to True.
+        - since - Manifest, Snapshot or data of a previous export. Only profiles added, changed
+          or removed since are written with the ETags of both, and the SnapshotDiff is returned.
+          Save diff.manifest as the since of the next export, see wifipasswords.delta.
+        """
+        return self._WifiPasswordsSubclass.save_json(path, data, ndjson, fsync, since)
+
+    def export(self, targets: list, data: dict = None, fsync: bool = True) -> dict:
         """
-        self._WifiPasswordsSubclass.save_json(path, data)
+        Saves network data in several formats from one pass over the profiles.\n
+        Returns {path: number of profiles written}.\n
+        arguments:\n
+        - targets - (format, path) or (format, path, options) tuples. Formats are json, ndjson,
+          csv, wpa_supplicant, keyfile (a directory of NetworkManager keyfiles) and wlanprofile
+          (a directory of Windows WLANProfile XML), more can be added with
+          export.register_writer. options is a dictionary of keyword arguments for the writer.
+        - data - dictionary or iterable of (ssid, network) pairs such as iter_passwords(),
+          defaults to self.data
+        - fsync - flush files to disk before renaming, defaults to True.
+        """
+        from . import export
 
-    def get_number_visible_networks(self) -> int:
+        if data is None:
+            data = self._WifiPasswordsSubclass.data
+        return export.save(data, targets, fsync)
+
+    def get_number_visible_networks(self, max_age: float = None) -> int:
         """
         number of networks visible currently.\n
-        also calls get_visible_networks.\n
+        also calls get_visible_networks, max_age as for get_visible_networks.\n
         """
+        if max_age is not None and self.platform == "Linux":
+            return self._WifiPasswordsSubclass.get_number_visible_networks(max_age)
         return self._WifiPasswordsSubclass.get_number_visible_networks()
 
+    def start_scan_refresher(self, interval: float = 10.0) -> None:
+        """
+        linux only, rescans visible networks every interval seconds on a background thread
+        so get_visible_networks() and get_number_visible_networks() answer from the cache.\n
+        raises NotImplementedError on other platforms.\n
+        """
+        if self.platform != "Linux":
+            raise NotImplementedError
+        self._WifiPasswordsSubclass.start_scan_refresher(interval)
+
+    def stop_scan_refresher(self) -> None:
+        """
+        stops the background refresh started by start_scan_refresher.\n
+        """
+        if self.platform == "Linux":
+            self._WifiPasswordsSubclass.stop_scan_refresher()
+
     def get_number_interfaces(self) -> int:
         """
         returns number of interfaces, calculated from number of DNS configs.\n
@@ -201,3 +324,98 @@ class WifiPasswords:
         if the SSID is not found raises a ValueError \n
         """
         return self._WifiPasswordsSubclass.get_single_password(ssid)
+
+    def snapshot(self, visible: bool = True, dns: bool = True, on_profile=None):
+        """
+        Fetches profiles, connected SSIDs, visible networks and DNS once, concurrently.\n
+        Returns an immutable Snapshot answering the same queries as this class
+        (get_currently_connected_passwords, get_number_interfaces, ...) without subprocesses.\n
+        arguments:\n
+        - visible - collect visible networks.\n
+        - dns - collect the DNS config.\n
+        - on_profile - called with (ssid, network, connected_ssids) as each profile is fetched.\n
+        """
+        from .snapshot import take_snapshot
+
+        return take_snapshot(self._WifiPasswordsSubclass, self.platform, visible, dns, on_profile)
+
+    def sampler(
+        self,
+        interval: float = 5.0,
+        capacity: int = 720,
+        path: str = None,
+        max_bytes: int = 10485760,
+        backup_count: int = 5,
+    ):
+        """
+        Returns a VisibleNetworkSampler keeping per BSSID signal, channel and rate history.\n
+        Call start() (or use it as a context manager) to scan every interval seconds
+        on a background thread, then query aggregate(bssid) / aggregates().\n
+        arguments:\n
+        - interval - seconds between scans.\n
+        - capacity - samples kept per BSSID.\n
+        - path - optional JSON Lines file samples are appended to.\n
+        - max_bytes - size at which path is rotated to path.1.\n
+        - backup_count - number of rotated files kept.\n
+        """
+        from . import sampler
+
+        return sampler.VisibleNetworkSampler(
+            self._WifiPasswordsSubclass, interval, capacity, path, max_bytes, backup_count
+        )
+
+    def stats(self) -> dict:
+        """
+        Returns subprocess metrics for the whole process by command family, e.g. "nmcli c s".\n
+        Each family has calls, failures, seconds, max_seconds, output_bytes, wait_seconds
+        and cumulative latency_buckets / wait_buckets histograms.\n
+        wait is the time spent queued for a concurrency slot before the subprocess started.\n
+        """
+        from .metrics import metrics
+
+        return metrics.stats()
+
+    def save_metrics(self, path: str) -> None:
+        """
+        Saves subprocess metrics in the prometheus text format.\n
+        arguments:\n
+        - path - must be specified. Full path with filename, e.g. for the node exporter
+          textfile collector /var/lib/node_exporter/textfile_collector/wifipasswords.prom\n
+        """
+        from .metrics import metrics
+
+        metrics.save_prometheus(path)
+
+
+# imported on first use so "import wifipasswords" doesn't load asyncio
+_LAZY_IMPORTS = {
+    "AsyncWifiPasswords": ".wifipasswords_async",
+    "Manifest": ".delta",
+    "NetworkProfile": ".records",
+    "Snapshot": ".snapshot",
+    "VisibleNetwork": ".records",
+    "VisibleNetworkSampler": ".sampler",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_IMPORTS:
+        from importlib import import_module
+
+        value = getattr(import_module(_LAZY_IMPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list:
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ is only supported from python 3.7
+    from .delta import Manifest  # noqa: E402, F401
+    from .records import NetworkProfile, VisibleNetwork  # noqa: E402, F401
+    from .sampler import VisibleNetworkSampler  # noqa: E402, F401
+    from .snapshot import Snapshot  # noqa: E402, F401
+    from .wifipasswords_async import AsyncWifiPasswords  # noqa: E402, F401
@@ -17,10 +17,20 @@ __copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
 
 import os
 import sys
-from argparse import ArgumentParser, RawTextHelpFormatter
-from colorama import init, Fore, Back
 
 from . import WifiPasswords, __version__, __licence__
+from .delta import Manifest
+from .taskgraph import TaskGraph
+
+
+def colors() -> tuple:
+    """
+    Returns colorama's (Fore, Back).\n
+    imported on first use so --help and --version don't load colorama.\n
+    """
+    from colorama import Fore, Back
+
+    return Fore, Back
 
 
 def get_command_line_arguments() -> dict:
@@ -28,10 +38,15 @@ def get_command_line_arguments() -> dict:
     Get Command line arguments passed to script.\n
     Returns - args as dictionary.
     """
+    from argparse import ArgumentParser, RawTextHelpFormatter
+
     helpstring = """
     Show all wifi passwords stored on windows and linux. MacOS to be added.
     For all commands below PATH is optional for saving files.
     If no path is specified, will default the current working directory.
+    Use "wifipasswords aggregate -h" to merge saved JSON from many hosts.
+    Use "wifipasswords survey -h" to sample visible networks per BSSID.
+    Use "wifipasswords serve -h" to answer queries from a cache over a Unix socket.
 
     wifipasswords version {}
     This program comes with ABSOLUTELY NO WARRANTY.
@@ -82,6 +97,43 @@ def get_command_line_arguments() -> dict:
         const=".",
         metavar="PATH",
     )
+    parser.add_argument(
+        "--precompute-psk",
+        help="write precomputed 64 hex digit psks to wpa_supplicant.conf instead of passwords.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--use-export",
+        help="windows only, read every network from a single netsh wlan export.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--use-dump",
+        help="macos only, read every password from a single security dump-keychain -d.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-e",
+        "--export",
+        help="save networks as FORMAT in PATH, may be given more than once, all are written\n"
+        "in one pass. Formats: json, ndjson, csv, wpa_supplicant, and keyfile and\n"
+        "wlanprofile which write a file per network to the PATH directory.",
+        nargs=2,
+        action="append",
+        metavar=("FORMAT", "PATH"),
+    )
+    parser.add_argument(
+        "--since",
+        help="with -j / -w save only networks changed since the manifest FILE, which is then\n"
+        "updated. Created with every network on the first run.",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "-m",
+        "--metrics",
+        help="save subprocess metrics in prometheus text format to the given file",
+        metavar="FILE",
+    )
     parser.add_argument("-v", "-V", "--version", action="version", version=__version__)
     args = vars(parser.parse_args())
     return args
@@ -91,6 +143,7 @@ def print_output_heading() -> None:
     """
     Prints the static header for the command line output.\n
     """
+    Fore, Back = colors()
     print(Fore.BLACK + Back.WHITE + "{:^92}".format("WIFI PASSWORDS " + __version__))
     print("{:^92}".format("Lists known wifi networks and passwords."))
     print("{:^92}".format("'>' before SSID denotes the currently connected network."))
@@ -103,24 +156,22 @@ def print_output_heading() -> None:
     )
 
 
-def print_network_data(networks, connected_ssids) -> None:
+def print_network_row(key, n, connected_ssids) -> None:
     """
-    Print data from the network dictionary.
+    Print a single network from the network dictionary.
     """
-    for key, n in networks.items():
-        if key in connected_ssids:
-            connected = ">"
-        else:
-            connected = " "
-        if n["metered"]:
-            metered = Fore.LIGHTBLACK_EX + "(M)"
-        else:
-            metered = ""
-        print(
-            "{:<1} {:<31} | {:<13} | {:<36} {}".format(
-                connected, key, n["auth"], n["psk"], metered
-            )
-        )
+    if key in connected_ssids:
+        connected = ">"
+    else:
+        connected = " "
+    if n["metered"]:
+        Fore, _ = colors()
+        metered = Fore.LIGHTBLACK_EX + "(M)"
+    else:
+        metered = ""
+    print(
+        "{:<1} {:<31} | {:<13} | {:<36} {}".format(connected, key, n["auth"], n["psk"], metered)
+    )
 
 
 def print_output_footer() -> None:
@@ -135,6 +186,7 @@ def print_visible_networks(current_networks) -> None:
     """
     Output for visible networks.
     """
+    Fore, Back = colors()
     print(Fore.BLACK + Back.WHITE + "{:^92}".format("Currently Visible Networks"))
     print(current_networks)
     print("*" * 92)
@@ -144,43 +196,95 @@ def print_current_dns_config(dns_config) -> None:
     """
     output for passed DNS config.
     """
+    Fore, Back = colors()
     print(Fore.BLACK + Back.WHITE + "{:^92}".format("Currently DNS Configuration"))
     print(dns_config)
     print("*" * 92)
 
 
 def cli():
+    if len(sys.argv) > 1 and sys.argv[1] == "aggregate":
+        from wifipasswords.fleet import main as aggregate
+
+        return aggregate(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "survey":
+        from wifipasswords.sampler import main as survey
+
+        return survey(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from wifipasswords.daemon import main as serve
+
+        return serve(sys.argv[2:])
 
-    init(autoreset=True)
-    pw = WifiPasswords()
     args = get_command_line_arguments()
+    from colorama import init
+
+    init(autoreset=True)
+    pw = WifiPasswords(use_export=args["use_export"], use_dump=args["use_dump"])
+    show_visible = not args["current"] is None or not args["all"] is None
+    show_dns = not args["dns"] is None or not args["all"] is None
+    if args["wpasupplicant"] is None:
+        args["wpasupplicant"] = args["all"]
+    if args["json"] is None:
+        args["json"] = args["all"]
+    since = None
+    if not args["since"] is None:
+        since = Manifest.load(args["since"]) if os.path.exists(args["since"]) else Manifest()
     print_output_heading()
-    data = pw.get_passwords()
-    active_ssids = pw.get_currently_connected_ssids()
-    print_network_data(data, active_ssids)
-    print_output_footer()
-    if not args["current"] is None or not args["all"] is None:
-        print_visible_networks(pw.get_visible_networks())
-    if not args["dns"] is None or not args["all"] is None:
-        print_current_dns_config(pw.get_dns_config())
-
-    if not args["wpasupplicant"] is None or not args["all"] is None:
-        if args["wpasupplicant"] is None:
-            args["wpasupplicant"] = args["all"]
-        print()
-        pw.save_wpa_supplicant(
-            os.path.join(args["wpasupplicant"], "wpa_supplicant.conf"), data, True, "GB"
-        )
-        print(
-            f"wpa_supplicant.conf written to {os.path.join(args['wpasupplicant'],'wpa_supplicant.conf')}"
+
+    # the snapshot fetches connected SSIDs, visible networks and DNS while the profiles are
+    # read, running each distinct command once, and prints each network as soon as it is
+    # fetched. the writers then run at the same time as each other
+    graph = TaskGraph()
+    graph.add("snapshot", lambda: pw.snapshot(show_visible, show_dns, print_network_row))
+    graph.add("profiles", lambda snapshot: snapshot.get_passwords(), "snapshot")
+    if not args["wpasupplicant"] is None:
+        wpa_supplicant_path = os.path.join(args["wpasupplicant"], "wpa_supplicant.conf")
+        graph.add(
+            "wpasupplicant",
+            lambda data: pw.save_wpa_supplicant(
+                wpa_supplicant_path, data, True, "GB", args["precompute_psk"], True, since
+            ),
+            "profiles",
         )
+    if not args["json"] is None:
+        json_path = os.path.join(args["json"], "networks_data.json")
+        graph.add("json", lambda data: pw.save_json(json_path, data, since=since), "profiles")
+    if not args["export"] is None:
+        graph.add("export", lambda data: pw.export(args["export"], data), "profiles")
+
+    with graph:
+        snapshot = graph.result("snapshot")
+        print_output_footer()
+        if show_visible:
+            print_visible_networks(snapshot.get_visible_networks())
+        if show_dns:
+            print_current_dns_config(snapshot.get_dns_config())
+        if "wpasupplicant" in graph:
+            graph.result("wpasupplicant")
+            print()
+            print(f"wpa_supplicant.conf written to {wpa_supplicant_path}")
+        if "json" in graph:
+            graph.result("json")
+            print()
+            print("JSON saved >> {}".format(json_path))
+        if "export" in graph:
+            print()
+            for path, count in graph.result("export").items():
+                print(f"{count} networks saved >> {path}")
+        if since is not None and ("json" in graph or "wpasupplicant" in graph):
+            difference = graph.result("json" if "json" in graph else "wpasupplicant")
+            difference.manifest.save(args["since"])
+            print(
+                f"{len(difference.added)} added, {len(difference.changed)} changed, "
+                f"{len(difference.removed)} removed since {since.etag}"
+            )
+            print(f"Manifest {difference.etag} saved >> {args['since']}")
 
-    if not args["json"] is None or not args["all"] is None:
-        if args["json"] is None:
-            args["json"] = args["all"]
+    if not args["metrics"] is None:
         print()
-        pw.save_json(os.path.join(args["json"], "networks_data.json"), data)
-        print("JSON saved >> {}".format(os.path.join(args["json"], "networks_data.json")))
+        pw.save_metrics(args["metrics"])
+        print(f"Metrics saved >> {args['metrics']}")
     print()
 
 
@@ -0,0 +1,291 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_directory() -> str:
+    """
+    Returns the directory of the persistent caches, $XDG_CACHE_HOME/wifipasswords.\n
+    %LOCALAPPDATA% is used on windows and ~/.cache when neither is set.\n
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "wifipasswords")
+
+
+class ProfileCache:
+    """
+    In process LRU cache of network profile records keyed by SSID.\n
+    If a version function is given the whole cache is dropped whenever its value
+    changes (e.g. profile file mtimes), otherwise entries expire after ttl seconds.\n
+    SSIDs found not to exist are kept in a separate negative cache.\n
+    Arguments:\n
+    - maxsize: maximum number of profiles held, least recently used are evicted.\n
+    - ttl: seconds a profile is valid for when there is no version function.\n
+    - negative_ttl: seconds an unknown SSID is remembered for.\n
+    - version: function returning a value that changes when the profiles change.\n
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 60.0,
+        negative_ttl: float = 30.0,
+        version=None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._version_function = version
+        self._version = None
+        self._entries = OrderedDict()
+        self._missing = OrderedDict()
+        # true when the cache holds every profile on the system
+        self._complete = False
+        self._lock = threading.Lock()
+
+    def _validate(self) -> None:
+        # must be called with the lock held
+        if self._version_function is None:
+            return
+        version = self._version_function()
+        if version != self._version:
+            self._entries.clear()
+            self._missing.clear()
+            self._complete = False
+            self._version = version
+
+    def _expiry(self, ttl: float) -> float:
+        return time.monotonic() + ttl if ttl is not None else float("inf")
+
+    def get(self, ssid: str):
+        """
+        Returns the cached record for the ssid or None if not cached.\n
+        """
+        with self._lock:
+            self._validate()
+            entry = self._entries.get(ssid)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[ssid]
+                self._complete = False
+                return None
+            self._entries.move_to_end(ssid)
+            return entry[1]
+
+    def put(self, ssid: str, record: dict) -> None:
+        """
+        Stores a record for the ssid, evicting the least recently used if full.\n
+        """
+        with self._lock:
+            self._validate()
+            if ssid not in self._entries:
+                self._complete = False
+            self._store(ssid, record)
+
+    def _store(self, ssid: str, record: dict) -> None:
+        ttl = None if self._version_function is not None else self.ttl
+        self._entries[ssid] = (self._expiry(ttl), record)
+        self._entries.move_to_end(ssid)
+        self._missing.pop(ssid, None)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._complete = False
+
+    def put_all(self, records: dict) -> None:
+        """
+        Replaces the cache contents with every profile on the system.\n
+        """
+        with self._lock:
+            self._validate()
+            self._entries.clear()
+            self._missing.clear()
+            for ssid, record in records.items():
+                self._store(ssid, record)
+            self._complete = len(records) <= self.maxsize
+
+    def get_all(self):
+        """
+        Returns a dictionary of all profiles if the cache is complete and valid, else None.\n
+        """
+        with self._lock:
+            self._validate()
+            if not self._complete:
+                return None
+            now = time.monotonic()
+            if any(entry[0] < now for entry in self._entries.values()):
+                self._complete = False
+                return None
+            return {ssid: entry[1] for ssid, entry in self._entries.items()}
+
+    def get_psk(self, ssid: str):
+        """
+        Returns the cached psk for the ssid, or None if it needs to be fetched.\n
+        Raises ValueError if the ssid was recently found not to exist.\n
+        """
+        if self.is_missing(ssid):
+            raise ValueError("SSID not known.")
+        record = self.get(ssid)
+        if record is not None:
+            return record["psk"]
+        return None
+
+    def is_missing(self, ssid: str) -> bool:
+        """
+        Returns True if the ssid was recently found not to exist.\n
+        """
+        with self._lock:
+            self._validate()
+            expires = self._missing.get(ssid)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._missing[ssid]
+                return False
+            return True
+
+    def put_missing(self, ssid: str) -> None:
+        """
+        Remembers that the ssid doesn't exist for negative_ttl seconds.\n
+        """
+        with self._lock:
+            self._validate()
+            self._missing[ssid] = self._expiry(self.negative_ttl)
+            self._missing.move_to_end(ssid)
+            while len(self._missing) > self.maxsize:
+                self._missing.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Empties the cache.\n
+        """
+        with self._lock:
+            self._entries.clear()
+            self._missing.clear()
+            self._complete = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ScanCache:
+    """
+    Holds the output of the last scan and when it ran, shared by every caller.\n
+    Concurrent callers needing a new scan wait for a single scan rather than each
+    running their own. Optionally refreshed on a background thread.\n
+    """
+
+    def __init__(self) -> None:
+        self._output = None
+        self._time = None
+        self._lock = threading.Lock()
+        # held while a scan runs so only one runs at a time
+        self._scan_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refresh_errors = 0
+
+    @property
+    def age(self):
+        """
+        Seconds since the cached scan was taken, None if there is none.\n
+        """
+        with self._lock:
+            if self._time is None:
+                return None
+            return time.monotonic() - self._time
+
+    def get(self, max_age: float):
+        """
+        Returns the cached output if it is at most max_age seconds old, else None.\n
+        """
+        with self._lock:
+            if self._time is None or time.monotonic() - self._time > max_age:
+                return None
+            return self._output
+
+    def put(self, output: str, started: float = None) -> None:
+        """
+        Stores output, started is the time.monotonic() the scan was started at.\n
+        """
+        started = time.monotonic() if started is None else started
+        with self._lock:
+            # a slower, older scan never replaces a newer one
+            if self._time is None or started >= self._time:
+                self._output = output
+                self._time = started
+
+    def fetch(self, max_age: float, scan) -> str:
+        """
+        Returns the cached output if fresh enough, otherwise runs scan() and caches it.\n
+        """
+        output = self.get(max_age)
+        if output is not None:
+            return output
+        with self._scan_lock:
+            # another caller may have scanned while this one waited
+            output = self.get(max_age)
+            if output is None:
+                started = time.monotonic()
+                output = scan()
+                self.put(output, started)
+            return output
+
+    @property
+    def refreshing(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _refresh(self, interval: float, scan) -> None:
+        while not self._stop.is_set():
+            try:
+                with self._scan_lock:
+                    started = time.monotonic()
+                    self.put(scan(), started)
+            except Exception:
+                # keep serving the last good scan
+                self.refresh_errors += 1
+            self._stop.wait(interval)
+
+    def start_refresh(self, interval: float, scan) -> None:
+        """
+        Runs scan() every interval seconds on a daemon thread, replacing the cached output.\n
+        """
+        self.stop_refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._refresh, args=(interval, scan), name="wifipasswords-scan", daemon=True
+        )
+        self._thread.start()
+
+    def stop_refresh(self, timeout: float = None) -> None:
+        """
+        Stops the background refresh, the cached output is kept.\n
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._output = None
+            self._time = None
@@ -0,0 +1,141 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import json
+import socket
+import threading
+
+from .daemon import MAX_REQUEST, default_socket_path, encode
+
+
+class WifiPasswordsClient:
+    """
+    Queries a wifipasswords serve daemon, methods mirror WifiPasswords.\n
+    One connection is kept open and shared, calls from several threads are serialised.\n
+    Raises ValueError as WifiPasswords does (e.g. unknown SSID), RuntimeError for other
+    errors reported by the server and OSError if the server can't be reached.\n
+    Arguments:\n
+    - socket_path: defaults to daemon.default_socket_path().\n
+    - timeout: seconds to wait for the server.\n
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = 5.0) -> None:
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._socket = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        self._file = sock.makefile("rb")
+
+    def _exchange(self, request: bytes) -> bytes:
+        if self._socket is None:
+            self._connect()
+        self._socket.sendall(request)
+        line = self._file.readline(MAX_REQUEST * 1024)
+        if not line:
+            raise ConnectionResetError("server closed the connection")
+        return line
+
+    def request(self, op: str, **arguments):
+        """
+        Sends one request and returns its result.\n
+        """
+        arguments["op"] = op
+        message = encode(arguments)
+        with self._lock:
+            try:
+                line = self._exchange(message)
+            except ConnectionError:
+                # the server may have restarted since the last call, reconnect once
+                self._close()
+                line = self._exchange(message)
+            except OSError:
+                # e.g. a timeout part way through a response, the connection can't be reused
+                self._close()
+                raise
+        response = json.loads(line.decode("utf-8"))
+        if response["ok"]:
+            return response["result"]
+        if response["error"] in ("ValueError", "KeyError"):
+            raise ValueError(response["message"])
+        if response["error"] == "PermissionError":
+            # the server refused this user
+            raise PermissionError(response["message"])
+        raise RuntimeError(f"{response['error']}: {response['message']}")
+
+    def ping(self) -> bool:
+        return self.request("ping") == "pong"
+
+    def info(self) -> dict:
+        """
+        Returns the server's platform, snapshot age, refresh and request counts.\n
+        """
+        return self.request("info")
+
+    def refresh(self) -> float:
+        """
+        Makes the server take a new snapshot now, returns its creation time.\n
+        The server keeps its current snapshot if it is younger than its min_refresh_interval.\n
+        """
+        return self.request("refresh")
+
+    def get_passwords(self) -> dict:
+        return self.request("passwords")
+
+    def get_single_password(self, ssid) -> str:
+        return self.request("password", ssid=ssid)
+
+    def get_known_ssids(self) -> list:
+        return self.request("known_ssids")
+
+    def get_currently_connected_ssids(self) -> list:
+        return self.request("connected")
+
+    def get_currently_connected_passwords(self) -> list:
+        return [tuple(pair) for pair in self.request("connected_passwords")]
+
+    def get_visible_networks(self, as_dictionary=False):
+        return self.request("visible", dict=as_dictionary)
+
+    def get_dns_config(self, as_dictionary=False):
+        return self.request("dns", dict=as_dictionary)
+
+    def _close(self) -> None:
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = None
+            self._file = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
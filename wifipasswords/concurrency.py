@@ -0,0 +1,137 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConcurrencyController:
+    """
+    Process wide limit on the number of subprocesses running at once.\n
+    The limit adapts to the measured subprocess latency, growing while latency
+    stays flat and shrinking when latency rises as more commands run together.\n
+    Arguments:\n
+    - initial: starting limit.\n
+    - minimum: lowest limit that will be chosen.\n
+    - maximum: hard cap on concurrent subprocesses, defaults to 4 per cpu up to 64.\n
+    """
+
+    def __init__(self, initial: int = 6, minimum: int = 1, maximum: int = None) -> None:
+        if maximum is None:
+            maximum = min(64, max(2, (os.cpu_count() or 1) * 4))
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        # latency of the current sample window and the long term baseline
+        self._window_count = 0
+        self._window_total = 0.0
+        self._baseline = None
+
+    @property
+    def limit(self) -> int:
+        """
+        Returns the currently chosen number of concurrent subprocesses.\n
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Returns the number of subprocesses currently running.\n
+        """
+        return self._in_flight
+
+    def set_maximum(self, maximum: int) -> None:
+        """
+        Sets the hard cap on concurrent subprocesses for the whole process.\n
+        """
+        with self._condition:
+            self.maximum = max(self.minimum, maximum)
+            self._limit = min(self._limit, self.maximum)
+            self._condition.notify_all()
+
+    def pool_size(self, tasks: int) -> int:
+        """
+        Returns the number of worker threads to use for the given number of tasks.\n
+        Threads above the current limit wait for a slot, so the limit can still grow.\n
+        """
+        return max(1, min(tasks, self.maximum))
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Takes a subprocess slot, waiting while the limit is reached if blocking.\n
+        Returns False if not blocking and no slot is free.\n
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                if not blocking:
+                    return False
+                self._condition.wait()
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: float = None) -> None:
+        """
+        Frees a subprocess slot and records how long the subprocess took.\n
+        latency None frees a slot no subprocess ran in without recording anything.\n
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if latency is not None:
+                self._record(latency)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        Context manager held for the duration of one subprocess.\n
+        """
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def _record(self, latency: float) -> None:
+        # must be called with the condition held
+        self._window_count += 1
+        self._window_total += latency
+        if self._window_count < max(4, int(self._limit)):
+            return
+
+        sample = self._window_total / self._window_count
+        self._window_count = 0
+        self._window_total = 0.0
+        if self._baseline is None or sample < self._baseline / 2:
+            self._baseline = sample
+        else:
+            self._baseline = 0.9 * self._baseline + 0.1 * sample
+
+        # gradient is below 1 when commands are slowing down as concurrency rises,
+        # the square root term keeps probing upwards while latency is flat
+        gradient = max(0.5, min(1.0, self._baseline / sample)) if sample > 0 else 1.0
+        new_limit = self._limit * gradient + math.sqrt(self._limit)
+        self._limit = min(self.maximum, max(self.minimum, 0.8 * self._limit + 0.2 * new_limit))
+
+
+# shared by every WifiPasswords instance in the process
+controller = ConcurrencyController()
@@ -0,0 +1,456 @@
+"""
+wifipasswords serve - answers queries from a periodically refreshed Snapshot
+over a Unix socket so tools on the host share one set of subprocess calls.\n
+Protocol: one compact JSON object per line each way.\n
+request  {"op": "password", "ssid": "home"}\n
+response {"ok": true, "result": "secret"}
+or       {"ok": false, "error": "ValueError", "message": "SSID not known."}\n
+ops: ping, info, refresh, passwords, password (ssid), known_ssids, connected,
+connected_passwords, visible (dict), dns (dict).\n
+"""
+
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from .records import json_default
+
+# longest request line accepted
+MAX_REQUEST = 65536
+
+
+# default socket directory for root, which has no XDG_RUNTIME_DIR under most init systems
+ROOT_SOCKET_DIR = "/run/wifipasswords"
+
+
+def default_socket_path() -> str:
+    """
+    $XDG_RUNTIME_DIR/wifipasswords.sock, or /run/wifipasswords/wifipasswords.sock for root.\n
+    Raises ValueError otherwise, a shared directory like /tmp would let other users
+    claim the path first, so the socket path has to be given.\n
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "wifipasswords.sock")
+    if os.getuid() == 0:
+        return os.path.join(ROOT_SOCKET_DIR, "wifipasswords.sock")
+    raise ValueError("XDG_RUNTIME_DIR isn't set, the socket path must be given.")
+
+
+def peer_credentials(connection: socket.socket):
+    """
+    Returns (uid, gid) of the process at the other end of a Unix socket connection.\n
+    Returns None where the platform can't tell (SO_PEERCRED on linux, LOCAL_PEERCRED on Macos).\n
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        # struct ucred: pid, uid, gid
+        credentials = connection.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, gid = struct.unpack("3i", credentials)
+        return uid, gid
+    if hasattr(socket, "LOCAL_PEERCRED"):
+        # struct xucred: version, uid, ngroups, groups[16], groups[0] is the effective gid
+        credentials = connection.getsockopt(
+            0, socket.LOCAL_PEERCRED, struct.calcsize("IIh16I")
+        )
+        _, uid, _, gid = struct.unpack("IIh16I", credentials)[:4]
+        return uid, gid
+    return None
+
+
+def encode(message: dict) -> bytes:
+    return (json.dumps(message, default=json_default, separators=(",", ":")) + "\n").encode(
+        "utf-8"
+    )
+
+
+# op -> function of (snapshot, request)
+OPERATIONS = {
+    "passwords": lambda snapshot, request: snapshot.get_passwords(),
+    "password": lambda snapshot, request: snapshot.get_single_password(request["ssid"]),
+    "known_ssids": lambda snapshot, request: snapshot.get_known_ssids(),
+    "connected": lambda snapshot, request: snapshot.get_currently_connected_ssids(),
+    "connected_passwords": lambda snapshot, request: (
+        snapshot.get_currently_connected_passwords()
+    ),
+    "visible": lambda snapshot, request: snapshot.get_visible_networks(
+        bool(request.get("dict"))
+    ),
+    "dns": lambda snapshot, request: snapshot.get_dns_config(bool(request.get("dict"))),
+}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def setup(self) -> None:
+        super().setup()
+        with self.server.connections_lock:
+            self.server.connections.add(self.request)
+
+    def finish(self) -> None:
+        with self.server.connections_lock:
+            self.server.connections.discard(self.request)
+        super().finish()
+
+    def handle(self) -> None:
+        allowed = self.server.snapshot_server.peer_allowed(self.request)
+        # a connection may send any number of requests, one per line
+        while True:
+            line = self.rfile.readline(MAX_REQUEST + 1)
+            if not line:
+                return
+            if not allowed:
+                # answer the request, closing before it is read would reset the connection
+                self.wfile.write(
+                    encode(
+                        {
+                            "ok": False,
+                            "error": "PermissionError",
+                            "message": "connection refused",
+                        }
+                    )
+                )
+                return
+            if len(line) > MAX_REQUEST:
+                self.wfile.write(
+                    encode({"ok": False, "error": "ValueError", "message": "request too long"})
+                )
+                return
+            self.wfile.write(self.server.snapshot_server.handle_line(line))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs) -> None:
+        # open client connections, closed with the server so clients see it go away
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def server_close(self) -> None:
+        super().server_close()
+        with self.connections_lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+class SnapshotServer:
+    """
+    Keeps a warm WifiPasswords and a Snapshot refreshed every refresh_interval seconds,
+    answering requests from the latest Snapshot over a Unix socket.\n
+    The socket is created with mode (owner only by default) since it serves passwords,
+    and each connection's peer credentials are checked as well, see peer_allowed.\n
+    Arguments:\n
+    - socket_path: defaults to default_socket_path().\n
+    - refresh_interval: seconds between snapshots.\n
+    - visible, dns: include visible networks and DNS in each snapshot.\n
+    - wifipasswords: WifiPasswords instance to use, one is created if not given.\n
+    - mode: permissions of the socket file.\n
+    - min_refresh_interval: a refresh requested by a client only takes a new snapshot
+      if the current one is at least this many seconds old, so clients can't keep the
+      server running subprocesses.\n
+    """
+
+    def __init__(
+        self,
+        socket_path: str = None,
+        refresh_interval: float = 60.0,
+        visible: bool = True,
+        dns: bool = True,
+        wifipasswords=None,
+        mode: int = 0o600,
+        min_refresh_interval: float = 5.0,
+    ) -> None:
+        if wifipasswords is None:
+            from . import WifiPasswords
+
+            wifipasswords = WifiPasswords()
+        self.socket_path = socket_path or default_socket_path()
+        self.refresh_interval = refresh_interval
+        self.visible = visible
+        self.dns = dns
+        self.mode = mode
+        self.min_refresh_interval = min_refresh_interval
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_error = None
+        self.requests = 0
+        self._wifipasswords = wifipasswords
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        # handler threads count requests concurrently
+        self._requests_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        self._server = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def refresh(self, max_age: float = None):
+        """
+        Takes a new snapshot and serves it from then on, returns it.\n
+        If the current snapshot is younger than max_age seconds it is returned instead,
+        this includes one taken by a refresh that was running when this was called.\n
+        """
+        with self._refresh_lock:
+            current = self._snapshot
+            if (
+                max_age is not None
+                and current is not None
+                and time.time() - current.created < max_age
+            ):
+                return current
+            snapshot = self._wifipasswords.snapshot(self.visible, self.dns)
+            # Snapshot is immutable so handlers can keep using the one they read
+            self._snapshot = snapshot
+            self.refreshes += 1
+            return snapshot
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # keep serving the last good snapshot
+                self.refresh_errors += 1
+                self.last_error = e
+
+    def info(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "platform": snapshot.platform,
+            "created": snapshot.created,
+            "etag": snapshot.etag,
+            "age": time.time() - snapshot.created,
+            "refresh_interval": self.refresh_interval,
+            "min_refresh_interval": self.min_refresh_interval,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "requests": self.requests,
+            "pid": os.getpid(),
+        }
+
+    def peer_allowed(self, connection: socket.socket) -> bool:
+        """
+        True if the connected process runs as the server's user or root, or with a group
+        mode (e.g. 0o660) is a member of the server's group.\n
+        Platforms that don't report peer credentials rely on the socket mode alone.\n
+        """
+        credentials = peer_credentials(connection)
+        if credentials is None:
+            return True
+        uid, gid = credentials
+        if uid in (0, os.geteuid()):
+            return True
+        if not self.mode & 0o060:
+            return False
+        group = os.getegid()
+        if gid == group:
+            return True
+        import pwd
+
+        try:
+            return group in os.getgrouplist(pwd.getpwuid(uid).pw_name, gid)
+        except KeyError:
+            return False
+
+    def handle_request(self, request: dict):
+        """
+        Returns the result of one request, raises for bad requests or failed queries.\n
+        """
+        op = request.get("op")
+        with self._requests_lock:
+            self.requests += 1
+        if op == "ping":
+            return "pong"
+        if op == "info":
+            return self.info()
+        if op == "refresh":
+            return self.refresh(self.min_refresh_interval).created
+        operation = OPERATIONS.get(op)
+        if operation is None:
+            raise ValueError(f"unknown op {op!r}")
+        return operation(self._snapshot, request)
+
+    def handle_line(self, line: bytes) -> bytes:
+        """
+        Decodes a request line and returns the encoded response line.\n
+        """
+        try:
+            request = json.loads(line.decode("utf-8"))
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            return encode({"ok": True, "result": self.handle_request(request)})
+        except Exception as e:
+            return encode({"ok": False, "error": type(e).__name__, "message": str(e)})
+
+    def _bind(self) -> None:
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                # left behind by a server that didn't exit cleanly
+                os.unlink(self.socket_path)
+            else:
+                raise OSError(f"a server is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, 0o755, exist_ok=True)
+        # create the socket with its final permissions, there is no window where it is open
+        umask = os.umask(0o777 & ~self.mode)
+        try:
+            self._server = _UnixServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, self.mode)
+        self._server.snapshot_server = self
+
+    def start(self):
+        """
+        Takes the first snapshot, binds the socket and starts the refresh thread.\n
+        Returns self, call serve_forever() or serve_in_thread() to answer requests.\n
+        """
+        self.refresh()
+        self._bind()
+        self._stop.clear()
+        self._refresher = threading.Thread(
+            target=self._refresh_loop, name="wifipasswords-refresh", daemon=True
+        )
+        self._refresher.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def serve_in_thread(self) -> threading.Thread:
+        """
+        Answers requests on a daemon thread, returns the thread.\n
+        """
+        thread = threading.Thread(
+            target=self._server.serve_forever, name="wifipasswords-serve", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def close(self) -> None:
+        """
+        Stops serving and refreshing and removes the socket.\n
+        """
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.start()
+        self.serve_in_thread()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def main(argv: list = None) -> int:
+    """
+    Command line entry point for wifipasswords serve.\n
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        prog="wifipasswords serve",
+        description="Serve cached, periodically refreshed network data over a Unix socket.",
+    )
+    parser.add_argument(
+        "-s",
+        "--socket",
+        help="socket path, needed unless XDG_RUNTIME_DIR is set or running as root",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "-r", "--refresh", type=float, default=60.0, help="seconds between refreshes"
+    )
+    parser.add_argument(
+        "--min-refresh",
+        type=float,
+        default=5.0,
+        help="seconds before a refresh requested by a client takes a new snapshot",
+    )
+    parser.add_argument(
+        "--group", action="store_true", help="allow the socket's group to connect (mode 660)"
+    )
+    parser.add_argument(
+        "--no-visible", action="store_true", help="don't collect visible networks"
+    )
+    parser.add_argument("--no-dns", action="store_true", help="don't collect the DNS config")
+    args = parser.parse_args(argv)
+
+    import signal
+
+    try:
+        socket_path = args.socket or default_socket_path()
+    except ValueError as e:
+        parser.error(str(e))
+    server = SnapshotServer(
+        socket_path,
+        args.refresh,
+        visible=not args.no_visible,
+        dns=not args.no_dns,
+        mode=0o660 if args.group else 0o600,
+        min_refresh_interval=args.min_refresh,
+    )
+    try:
+        server.start()
+    except OSError as e:
+        print(f"wifipasswords serve: {e}", file=sys.stderr)
+        return 1
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    print(f"serving on {server.socket_path}, refreshing every {args.refresh:g}s")
+    # shutdown() has to come from another thread than serve_forever()
+    thread = server.serve_in_thread()
+    try:
+        while thread.is_alive():
+            thread.join(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
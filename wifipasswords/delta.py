@@ -0,0 +1,381 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import json
+import threading
+from hashlib import blake2b
+
+from .records import json_default
+
+# canonical form of a profile: sorted keys, no whitespace
+_ENCODER = json.JSONEncoder(sort_keys=True, separators=(",", ":"), default=json_default)
+# salt of new manifests, loaded on first use by default_salt(), a manifest loaded from a
+# file keeps its own
+_SALT = None
+_SALT_LOCK = threading.Lock()
+SALT_SIZE = 16
+
+
+def default_salt_path() -> str:
+    """
+    Returns the path of the file holding the default salt, next to the psk cache.\n
+    """
+    from .cache import cache_directory
+
+    return os.path.join(cache_directory(), "etag_salt")
+
+
+def _load_salt(path: str) -> bytes:
+    try:
+        with open(path, "r") as fin:
+            salt = bytes.fromhex(fin.read().strip())
+        if len(salt) == SALT_SIZE:
+            return salt
+    except (OSError, ValueError):
+        pass
+    salt = os.urandom(SALT_SIZE)
+    try:
+        from .export import atomic_write
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        with atomic_write(path, fsync=False, mode=0o600) as fout:
+            fout.write(salt.hex())
+    except OSError:
+        # e.g. a read only home directory, ETags then only last as long as this process
+        pass
+    return salt
+
+
+def default_salt() -> bytes:
+    """
+    Returns the salt used when none is given, so Snapshot ETags stay the same across
+    restarts. It is read from default_salt_path(), which is created on first use.\n
+    """
+    global _SALT
+    if _SALT is None:
+        with _SALT_LOCK:
+            if _SALT is None:
+                _SALT = _load_salt(default_salt_path())
+    return _SALT
+
+
+def fingerprint(network, salt: bytes = None) -> str:
+    """
+    Returns a content fingerprint of a profile keyed with salt, by default default_salt().
+    Equal profiles have equal fingerprints under the same salt on every host
+    and python version.\n
+    """
+    canonical = _ENCODER.encode(dict(network))
+    key = default_salt() if salt is None else salt
+    return blake2b(canonical.encode("utf-8"), digest_size=16, key=key).hexdigest()
+
+
+def _entry(ssid: str, fingerprint: str) -> int:
+    # fingerprints are a fixed length so the concatenation is unambiguous
+    digest = blake2b((fingerprint + ssid).encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest, "big")
+
+
+def etag(fingerprints: dict) -> str:
+    """
+    Returns the ETag of a set of profiles from their {ssid: fingerprint}.\n
+    It is the xor of a hash per profile, so it doesn't depend on order and
+    Manifest.apply() can update it one profile at a time.\n
+    """
+    value = 0
+    for ssid, ssid_fingerprint in fingerprints.items():
+        value ^= _entry(ssid, ssid_fingerprint)
+    return format(value, "032x")
+
+
+class Manifest:
+    """
+    Fingerprints of every profile and their ETag.\n
+    Saved after an export so the next export can write only what changed since.\n
+    Passphrases aren't stored but fingerprints are derived from them, keyed with a random
+    salt kept in the manifest so they can't be compared across manifests or against
+    precomputed tables. A weak passphrase could still be guessed from a manifest offline,
+    so keep manifests as private as the exports.\n
+    Arguments:\n
+    - fingerprints: {ssid: fingerprint} made with salt.\n
+    - salt: defaults to default_salt().\n
+    """
+
+    __slots__ = ("fingerprints", "etag", "salt")
+
+    def __init__(self, fingerprints: dict = None, salt: bytes = None) -> None:
+        self.fingerprints = dict(fingerprints or {})
+        self.etag = etag(self.fingerprints)
+        self.salt = default_salt() if salt is None else salt
+
+    def __repr__(self) -> str:
+        return f"<Manifest etag={self.etag} profiles={len(self.fingerprints)}>"
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, Manifest)
+            and self.salt == other.salt
+            and self.fingerprints == other.fingerprints
+        )
+
+    @classmethod
+    def from_data(cls, data, salt: bytes = None):
+        """
+        Fingerprints a dictionary or iterable of (ssid, network) pairs.\n
+        """
+        items = data.items() if hasattr(data, "items") else data
+        return cls({ssid: fingerprint(network, salt) for ssid, network in items}, salt)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads a manifest saved by save(), raises ValueError if its ETag doesn't match.\n
+        """
+        with open(path, "r", encoding="utf-8") as fin:
+            saved = json.load(fin)
+        if "salt" not in saved:
+            raise ValueError(f"manifest {path} has no salt, delete it to start a new one.")
+        manifest = cls(saved["fingerprints"], bytes.fromhex(saved["salt"]))
+        if manifest.etag != saved["etag"]:
+            raise ValueError(f"manifest {path} is corrupt, ETag doesn't match.")
+        return manifest
+
+    def save(self, path: str, fsync: bool = True) -> None:
+        """
+        Atomically saves the manifest as JSON, readable by the owner only.\n
+        """
+        from .export import atomic_write
+
+        with atomic_write(path, fsync, mode=0o600) as fout:
+            json.dump(
+                {
+                    "etag": self.etag,
+                    "salt": self.salt.hex(),
+                    "fingerprints": self.fingerprints,
+                },
+                fout,
+            )
+
+    def apply(self, delta: dict):
+        """
+        Returns the manifest after a delta from load_delta(), only the profiles in the
+        delta are fingerprinted. Raises ValueError if this manifest isn't the base of
+        the delta or the result doesn't match its ETag, e.g. a delta was missed.\n
+        """
+        if self.salt.hex() != delta["salt"]:
+            raise ValueError("delta was made against a manifest with a different salt.")
+        if self.etag != delta["base"]:
+            raise ValueError("manifest doesn't match the base of the delta.")
+        fingerprints = dict(self.fingerprints)
+        value = int(self.etag, 16)
+        for ssid in delta["removed"]:
+            if ssid in fingerprints:
+                value ^= _entry(ssid, fingerprints.pop(ssid))
+        for op in ("added", "changed"):
+            for ssid, network in delta[op].items():
+                if ssid in fingerprints:
+                    value ^= _entry(ssid, fingerprints[ssid])
+                fingerprints[ssid] = fingerprint(network, self.salt)
+                value ^= _entry(ssid, fingerprints[ssid])
+
+        manifest = Manifest.__new__(Manifest)
+        manifest.fingerprints = fingerprints
+        manifest.etag = format(value, "032x")
+        manifest.salt = self.salt
+        if manifest.etag != delta["etag"]:
+            raise ValueError("result doesn't match the ETag of the delta.")
+        return manifest
+
+
+def as_manifest(value, salt: bytes = None) -> Manifest:
+    """
+    Returns the Manifest of a Manifest, Snapshot, dictionary or iterable of
+    (ssid, network) pairs.\n
+    Raises ValueError if value is a Manifest with a salt other than salt.\n
+    """
+    if isinstance(value, Manifest):
+        if salt is not None and value.salt != salt:
+            raise ValueError("manifests with different salts can't be compared.")
+        return value
+    if hasattr(value, "manifest"):
+        return value.manifest(salt)
+    return Manifest.from_data(value, salt)
+
+
+class SnapshotDiff:
+    """
+    SSIDs added, removed and changed between a base and a newer set of profiles.\n
+    base is the ETag of the older set, manifest that of the newer one, save it
+    as the base of the next delta.\n
+    """
+
+    __slots__ = ("added", "removed", "changed", "base", "manifest")
+
+    def __init__(
+        self, added: list, removed: list, changed: list, base: str, manifest: Manifest
+    ) -> None:
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.base = base
+        self.manifest = manifest
+
+    @property
+    def etag(self) -> str:
+        return self.manifest.etag
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self) -> str:
+        return (
+            f"<SnapshotDiff added={len(self.added)} removed={len(self.removed)} "
+            f"changed={len(self.changed)}>"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "base": self.base,
+            "etag": self.etag,
+            "added": list(self.added),
+            "removed": list(self.removed),
+            "changed": list(self.changed),
+        }
+
+
+def diff(old, new) -> SnapshotDiff:
+    """
+    Compares two sets of profiles, each a Manifest, Snapshot, dictionary or
+    iterable of (ssid, network) pairs.\n
+    added and changed keep the order of new, removed that of old.\n
+    new is fingerprinted with the salt of old, so a chain of deltas keeps one salt.\n
+    """
+    old = as_manifest(old)
+    new = as_manifest(new, old.salt)
+    added = []
+    changed = []
+    for ssid, new_fingerprint in new.fingerprints.items():
+        old_fingerprint = old.fingerprints.get(ssid)
+        if old_fingerprint is None:
+            added.append(ssid)
+        elif old_fingerprint != new_fingerprint:
+            changed.append(ssid)
+    removed = [ssid for ssid in old.fingerprints if ssid not in new.fingerprints]
+    return SnapshotDiff(added, removed, changed, old.etag, new)
+
+
+def _header(difference: SnapshotDiff) -> dict:
+    # the receiver needs the salt to fingerprint the profiles it has
+    return {
+        "base": difference.base,
+        "etag": difference.etag,
+        "salt": difference.manifest.salt.hex(),
+    }
+
+
+def write_json_delta(fout, data: dict, difference: SnapshotDiff) -> int:
+    """
+    Writes a delta as one JSON object {"base": ..., "etag": ..., "salt": ...,
+    "added": {ssid: network}, "changed": {...}, "removed": [...]}.\n
+    Returns the number of profiles written.\n
+    """
+    from .export import write_json
+
+    fout.write(json.dumps(_header(difference))[:-1])
+    fout.write(', "added": ')
+    count = write_json(fout, ((ssid, data[ssid]) for ssid in difference.added))
+    fout.write(', "changed": ')
+    count += write_json(fout, ((ssid, data[ssid]) for ssid in difference.changed))
+    fout.write(', "removed": ')
+    fout.write(json.dumps(difference.removed))
+    fout.write("}")
+    return count
+
+
+def write_ndjson_delta(fout, data: dict, difference: SnapshotDiff) -> int:
+    """
+    Writes a delta as JSON Lines, a {"op": "delta", "base": ..., "etag": ..., "salt": ...}
+    header then one {"op": "added" / "changed" / "removed", "ssid": ..., **network} object
+    per line.\n
+    Returns the number of profiles written.\n
+    """
+    header = {"op": "delta"}
+    header.update(_header(difference))
+    fout.write(json.dumps(header))
+    fout.write("\n")
+    count = 0
+    for op in ("added", "changed"):
+        for ssid in getattr(difference, op):
+            record = {"op": op, "ssid": ssid}
+            record.update(data[ssid])
+            fout.write(json.dumps(record, default=json_default))
+            fout.write("\n")
+            count += 1
+    for ssid in difference.removed:
+        fout.write(json.dumps({"op": "removed", "ssid": ssid}))
+        fout.write("\n")
+    return count
+
+
+def load_delta(path: str) -> dict:
+    """
+    Reads a delta written by save_json(since=...) in either format,
+    returns it in the JSON object form.\n
+    """
+    with open(path, "r", encoding="utf-8") as fin:
+        first = fin.readline()
+        header = json.loads(first)
+        if header.get("op") != "delta":
+            # a JSON object delta is written on a single line
+            return header
+        delta = {
+            "base": header["base"],
+            "etag": header["etag"],
+            "salt": header["salt"],
+            "added": {},
+            "changed": {},
+            "removed": [],
+        }
+        for line in fin:
+            record = json.loads(line)
+            op = record.pop("op")
+            ssid = record.pop("ssid")
+            if op == "removed":
+                delta["removed"].append(ssid)
+            else:
+                delta[op][ssid] = record
+        return delta
+
+
+def apply_delta(data: dict, delta: dict, verify: bool = True) -> dict:
+    """
+    Returns a new {ssid: network} with a delta from load_delta() applied to data.\n
+    Arguments:\n
+    - data: the profiles the delta was made against.\n
+    - delta: dictionary with base, etag, added, changed and removed.\n
+    - verify: raise ValueError if data isn't the delta's base or the result doesn't
+      match its ETag. This fingerprints all of data, a store keeping the Manifest of data
+      can instead check with Manifest.apply(delta) and pass verify=False.\n
+    """
+    if verify:
+        Manifest.from_data(data, bytes.fromhex(delta["salt"])).apply(delta)
+    result = dict(data)
+    for ssid in delta["removed"]:
+        result.pop(ssid, None)
+    result.update(delta["added"])
+    result.update(delta["changed"])
+    return result
@@ -0,0 +1,636 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import json
+from contextlib import contextmanager
+
+from . import __version__
+from .records import json_default
+
+
+@contextmanager
+def atomic_write(
+    path: str, fsync: bool = True, newline: str = None, buffering: int = -1, mode: int = None
+):
+    """
+    Context manager yielding a text file that replaces path only once fully written.\n
+    Writes go to a temporary file in the same directory which is renamed over path,
+    so readers never see a partly written file. On error path is left untouched.\n
+    New files are created readable by the owner only, an existing file keeps its mode.\n
+    Arguments:\n
+    - fsync: flush the file (and directory on posix) to disk before returning.\n
+    - newline: passed to open, controls line ending translation.\n
+    - buffering: passed to open, the size of the write buffer.\n
+    - mode: permissions to set on the file, overriding both of the above.\n
+    """
+    import tempfile
+
+    path = os.path.abspath(path)
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with open(fd, "w", buffering=buffering, encoding="utf-8", newline=newline) as fout:
+            yield fout
+            fout.flush()
+            if fsync:
+                os.fsync(fout.fileno())
+        try:
+            os.chmod(temp_path, mode if mode is not None else os.stat(path).st_mode & 0o7777)
+        except OSError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        # make the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+# each profile is formatted into one string and written with one call, the file buffer
+# collects them into large writes
+BUFFER_SIZE = 1048576
+
+# default function for json.dumps, shared rather than building an encoder per profile
+_ENCODER = json.JSONEncoder(default=json_default)
+
+
+def _items(data):
+    # accepts a dictionary or an iterable of (ssid, network) pairs such as iter_passwords()
+    return data.items() if hasattr(data, "items") else data
+
+
+def _is_wpa_personal(network) -> bool:
+    return network["auth"] == "WPA2-Personal" or network["auth"].lower() == "wpa-psk"
+
+
+def _is_open(network) -> bool:
+    return network["auth"] == "" or network["auth"] == "Open"
+
+
+class Writer:
+    """
+    Base class of the export formats registered in WRITERS.\n
+    save() calls begin(), write(ssid, network) for each profile in a single pass over the
+    data, then end(). Single file formats are given the open text file, formats with a file
+    per profile (directory = True) the path of the directory and the fsync option.\n
+    """
+
+    # the target is a directory with a file per profile
+    directory = False
+    # newline passed to open() for single file formats
+    newline = None
+
+    def __init__(self, target) -> None:
+        self.target = target
+        self.count = 0
+
+    def begin(self) -> None:
+        pass
+
+    def write(self, ssid: str, network) -> None:
+        raise NotImplementedError
+
+    def end(self) -> int:
+        """
+        Finishes the output, returns the number of profiles written.\n
+        """
+        return self.count
+
+
+class JsonWriter(Writer):
+    """
+    One JSON object of {ssid: network}, the same as json.dump(data, fout).\n
+    """
+
+    def begin(self) -> None:
+        self.target.write("{")
+
+    def write(self, ssid: str, network) -> None:
+        separator = ", " if self.count else ""
+        self.target.write(f"{separator}{_ENCODER.encode(ssid)}: {_ENCODER.encode(network)}")
+        self.count += 1
+
+    def end(self) -> int:
+        self.target.write("}")
+        return self.count
+
+
+class NdjsonWriter(Writer):
+    """
+    JSON Lines, one {"ssid": ..., **network} object per line.\n
+    """
+
+    newline = "\n"
+
+    def write(self, ssid: str, network) -> None:
+        record = {"ssid": ssid}
+        record.update(network)
+        self.target.write(_ENCODER.encode(record) + "\n")
+        self.count += 1
+
+
+class CsvWriter(Writer):
+    """
+    CSV with a header row of ssid, auth, psk, metered and macrandom.\n
+    """
+
+    newline = ""
+    fields = ("ssid", "auth", "psk", "metered", "macrandom")
+
+    def __init__(self, target) -> None:
+        import csv
+
+        super().__init__(target)
+        self._writer = csv.writer(target)
+
+    def begin(self) -> None:
+        self._writer.writerow(self.fields)
+
+    def write(self, ssid: str, network) -> None:
+        self._writer.writerow([ssid] + [network.get(field, "") for field in self.fields[1:]])
+        self.count += 1
+
+
+class WpaSupplicantWriter(Writer):
+    """
+    wpa_supplicant.conf, WPA personal networks then open networks.\n
+    Open networks are held as formatted blocks until the end so the data is read once.\n
+    Arguments:\n
+    - include_open: also write open networks.\n
+    - locale: ISO country code for the country= line.\n
+    - psks: dictionary of ssid: 64 hex digit psk, written unquoted in place of the passphrase.\n
+    - difference: SnapshotDiff the data is the delta of, its ETags and removed SSIDs are
+      written as comments.\n
+    """
+
+    newline = "\n"
+
+    def __init__(
+        self,
+        target,
+        include_open: bool = True,
+        locale: str = "GB",
+        psks: dict = None,
+        difference=None,
+    ) -> None:
+        super().__init__(target)
+        self.include_open = include_open
+        self.locale = locale
+        self.psks = {} if psks is None else psks
+        self.difference = difference
+        self._open_blocks = []
+
+    def begin(self) -> None:
+        from datetime import datetime
+        from platform import uname
+
+        system = uname()
+        lines = [
+            f"# Generated by wifipasswords {__version__}",
+            f"# Created: {datetime.today()}",
+            f"# Device: {system.system} {system.version} - {system.node}",
+            f"# Detected country code: {self.locale}",
+        ]
+        if self.difference is not None:
+            lines.append(f"# Base ETag: {self.difference.base}")
+            lines.append(f"# ETag: {self.difference.etag}")
+            lines.extend(f"# Removed: {json.dumps(ssid)}" for ssid in self.difference.removed)
+        lines += [
+            "",
+            "ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev",
+            "update_config=1",
+            f"country={self.locale}",
+            "",
+            "# ######## WPA ########",
+            "",
+        ]
+        self.target.write("\n".join(lines))
+
+    def write(self, ssid: str, network) -> None:
+        if _is_wpa_personal(network):
+            psk = network["psk"]
+            if ssid in self.psks:
+                psk = self.psks[ssid]
+            # 64 hex digits is already the derived key, which wpa_supplicant reads unquoted
+            elif not (len(psk) == 64 and all(c in "0123456789abcdefABCDEF" for c in psk)):
+                psk = '"{}"'.format(psk)
+            self.target.write(
+                f'network={{\n\tssid="{ssid}"\n\tpsk={psk}\n'
+                f'\tkey_mgmt=WPA-PSK\n\tid_str="{ssid}"\n}}\n'
+            )
+            self.count += 1
+        elif self.include_open and _is_open(network):
+            self._open_blocks.append(
+                f'network={{\n\tssid="{ssid}"\n\tkey_mgmt=NONE\n'
+                f'\tid_str="{ssid}"\n\tpriority=-999\n}}\n'
+            )
+            self.count += 1
+
+    def end(self) -> int:
+        self.target.write("\n")
+        if self.include_open:
+            self.target.write("# ######## OPEN ########\n" + "".join(self._open_blocks))
+        return self.count
+
+
+def _safe_file_name(name: str) -> str:
+    # characters that aren't allowed in file names on linux or Windows
+    name = "".join("_" if c in '<>:"/\\|?*' or ord(c) < 32 else c for c in name)
+    return "_" + name if name in ("", ".", "..") else name
+
+
+class _DirectoryWriter(Writer):
+    directory = True
+    newline = "\n"
+
+    def __init__(self, target: str, fsync: bool = True) -> None:
+        super().__init__(target)
+        self.fsync = fsync
+
+    def begin(self) -> None:
+        os.makedirs(self.target, mode=0o700, exist_ok=True)
+
+    def format(self, ssid: str, network):
+        raise NotImplementedError
+
+    def file_name(self, ssid: str) -> str:
+        raise NotImplementedError
+
+    def write(self, ssid: str, network) -> None:
+        text = self.format(ssid, network)
+        if text is None:
+            return
+        path = os.path.join(self.target, self.file_name(ssid))
+        with atomic_write(path, self.fsync, self.newline) as fout:
+            fout.write(text)
+        self.count += 1
+
+
+# auth values of every platform (lower case) as NetworkManager key-mgmt, None is open
+_KEY_MGMT = {
+    "": None,
+    "open": None,
+    "wpa-personal": "wpa-psk",
+    "wpa2-personal": "wpa-psk",
+    "wpa-psk": "wpa-psk",
+    "wpa3-personal": "sae",
+    "sae": "sae",
+}
+
+# Windows MAC randomization as NetworkManager cloned-mac-address
+_CLONED_MAC_ADDRESS = {"Disabled": "", "Enabled": "stable", "Daily": "random"}
+
+
+def _keyfile_escape(value: str) -> str:
+    # GKeyFile escaping, reversed by WifiPasswordsLinux._keyfile_unescape
+    value = (
+        value.replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace("\t", "\\t")
+        .replace("\r", "\\r")
+    )
+    return "\\s" + value[1:] if value.startswith(" ") else value
+
+
+class KeyfileWriter(_DirectoryWriter):
+    """
+    A NetworkManager keyfile (<ssid>.nmconnection) per profile, owner only, as found in
+    /etc/NetworkManager/system-connections.\n
+    Connection UUIDs are derived from the SSID so exporting again replaces the same
+    connections. Enterprise and WEP profiles have no exportable key and are skipped.\n
+    Arguments:\n
+    - fsync: flush each file to disk before it is renamed into place.\n
+    """
+
+    def file_name(self, ssid: str) -> str:
+        return _safe_file_name(ssid) + ".nmconnection"
+
+    def format(self, ssid: str, network):
+        import uuid
+
+        auth = network["auth"].lower()
+        if auth not in _KEY_MGMT:
+            return None
+        name = _keyfile_escape(ssid)
+        lines = [
+            "[connection]",
+            f"id={name}",
+            f"uuid={uuid.uuid5(uuid.NAMESPACE_URL, 'wifipasswords:' + ssid)}",
+            "type=wifi",
+        ]
+        if network.get("metered"):
+            # NMMetered, 1 is yes
+            lines.append("metered=1")
+        lines += ["", "[wifi]", "mode=infrastructure", f"ssid={name}"]
+        macrandom = network.get("macrandom", "Disabled")
+        cloned_mac_address = _CLONED_MAC_ADDRESS.get(macrandom, macrandom)
+        if cloned_mac_address:
+            lines.append(f"cloned-mac-address={cloned_mac_address}")
+        if _KEY_MGMT[auth] is not None:
+            lines += [
+                "",
+                "[wifi-security]",
+                f"key-mgmt={_KEY_MGMT[auth]}",
+                f"psk={_keyfile_escape(network['psk'])}",
+            ]
+        lines += ["", "[ipv4]", "method=auto", "", "[ipv6]", "method=auto", ""]
+        return "\n".join(lines)
+
+
+class WlanProfileWriter(_DirectoryWriter):
+    """
+    A Windows WLANProfile XML file (Wi-Fi-<ssid>.xml) per profile, as written by
+    netsh wlan export profile key=clear and read by netsh wlan add profile.\n
+    Enterprise and WEP profiles have no exportable key and are skipped.\n
+    Arguments:\n
+    - fsync: flush each file to disk before it is renamed into place.\n
+    """
+
+    def file_name(self, ssid: str) -> str:
+        return f"Wi-Fi-{_safe_file_name(ssid)}.xml"
+
+    def format(self, ssid: str, network):
+        from .wlanprofile import build_wlan_profile
+
+        return build_wlan_profile(ssid, network)
+
+
+# export formats by name, see register_writer
+WRITERS = {
+    "json": JsonWriter,
+    "ndjson": NdjsonWriter,
+    "csv": CsvWriter,
+    "wpa_supplicant": WpaSupplicantWriter,
+    "keyfile": KeyfileWriter,
+    "wlanprofile": WlanProfileWriter,
+}
+
+
+def register_writer(name: str, writer_class) -> None:
+    """
+    Adds an export format usable with save(), replacing any format of the same name.\n
+    writer_class is a Writer subclass.\n
+    """
+    WRITERS[name] = writer_class
+
+
+def _write(writer: Writer, data) -> int:
+    writer.begin()
+    for ssid, network in _items(data):
+        writer.write(ssid, network)
+    return writer.end()
+
+
+def save(data, targets, fsync: bool = True) -> dict:
+    """
+    Writes networks in any number of formats from a single pass over data.\n
+    Single file formats are written atomically as save_json() does, if any writer fails
+    none of them replace their file. Directory formats write a file per profile.\n
+    Returns {path: number of profiles written}.\n
+    Arguments:\n
+    - data: dictionary or iterable of (ssid, network) pairs, consumed once.\n
+    - targets: (format, path) or (format, path, options) tuples. format is a name in WRITERS
+      (json, ndjson, csv, wpa_supplicant, keyfile, wlanprofile), options a dictionary of
+      keyword arguments for its writer.\n
+    - fsync: flush each file to disk before it is renamed into place.\n
+    """
+    from contextlib import ExitStack
+
+    with ExitStack() as stack:
+        writers = []
+        for target in targets:
+            name, path = target[0], target[1]
+            options = dict(target[2]) if len(target) > 2 else {}
+            writer_class = WRITERS.get(name)
+            if writer_class is None:
+                raise ValueError(
+                    f"unknown export format {name!r}, one of {', '.join(WRITERS)}"
+                )
+            if writer_class.directory:
+                options.setdefault("fsync", fsync)
+                writer = writer_class(path, **options)
+            else:
+                fout = stack.enter_context(
+                    atomic_write(path, fsync, writer_class.newline, BUFFER_SIZE)
+                )
+                writer = writer_class(fout, **options)
+            writer.begin()
+            writers.append((path, writer))
+
+        for ssid, network in _items(data):
+            if len(writers) > 1 and hasattr(network, "to_dict"):
+                # converted once rather than by each writer
+                network = network.to_dict()
+            for _, writer in writers:
+                writer.write(ssid, network)
+        return {path: writer.end() for path, writer in writers}
+
+
+def write_json(fout, data) -> int:
+    """
+    Writes networks as a JSON object one profile at a time, returns the number written.\n
+    Output is the same as json.dump(data, fout).\n
+    """
+    return _write(JsonWriter(fout), data)
+
+
+def write_ndjson(fout, data) -> int:
+    """
+    Writes networks as JSON Lines, one {"ssid": ..., **network} object per line.\n
+    Returns the number of lines written.\n
+    """
+    return _write(NdjsonWriter(fout), data)
+
+
+def _delta(data, since) -> tuple:
+    from .delta import diff
+
+    if not hasattr(data, "items"):
+        data = dict(data)
+    return data, diff(since, data)
+
+
+def save_json(path: str, data, ndjson: bool = False, fsync: bool = True, since=None):
+    """
+    Atomically saves networks as JSON, or JSON Lines if ndjson.\n
+    Returns the number of networks written, or the SnapshotDiff if since is given.\n
+    Arguments:\n
+    - data: dictionary or iterable of (ssid, network) pairs, consumed once.\n
+    - ndjson: write one JSON object per line instead of a single object.\n
+    - fsync: flush to disk before the file is renamed into place.\n
+    - since: Manifest, Snapshot or data of a previous export, only the profiles added,
+      changed and removed since are written along with both ETags, see delta.load_delta.\n
+    """
+    if since is not None:
+        from .delta import write_json_delta, write_ndjson_delta
+
+        data, difference = _delta(data, since)
+        with atomic_write(path, fsync, newline="\n" if ndjson else None) as fout:
+            if ndjson:
+                write_ndjson_delta(fout, data, difference)
+            else:
+                write_json_delta(fout, data, difference)
+        return difference
+
+    return save(data, [("ndjson" if ndjson else "json", path)], fsync)[path]
+
+
+def write_wpa_supplicant(
+    fout,
+    data,
+    include_open: bool = True,
+    locale: str = "GB",
+    psks: dict = None,
+    difference=None,
+) -> int:
+    """
+    Writes networks in wpa_supplicant.conf format, returns the number written.\n
+    Arguments as WpaSupplicantWriter.\n
+    """
+    return _write(WpaSupplicantWriter(fout, include_open, locale, psks, difference), data)
+
+
+def save_wpa_supplicant(
+    path: str,
+    data,
+    include_open: bool = True,
+    locale: str = "GB",
+    precompute_psk: bool = False,
+    psk_cache: bool = True,
+    since=None,
+):
+    """
+    Atomically saves networks as a wpa_supplicant.conf file.\n
+    Returns the SnapshotDiff if since is given.\n
+    Arguments:\n
+    - data: dictionary or iterable of (ssid, network) pairs.\n
+    - include_open: also write open networks.\n
+    - locale: ISO country code for the country= line.\n
+    - precompute_psk: write 64 hex digit psks as wpa_passphrase does, so devices
+      don't run PBKDF2 for every network. Derivation runs in a process pool.\n
+    - psk_cache: keep precomputed psks in the persistent cache, see psk.PskCache.\n
+    - since: Manifest, Snapshot or data of a previous export, only networks added or
+      changed since are written, removed SSIDs and both ETags are listed in comments.\n
+    """
+    if not hasattr(data, "items"):
+        data = dict(data)
+
+    difference = None
+    if since is not None:
+        data, difference = _delta(data, since)
+        data = {ssid: data[ssid] for ssid in difference.added + difference.changed}
+
+    psks = None
+    if precompute_psk:
+        from .psk import PskCache, precompute_psks
+
+        psks = precompute_psks(
+            ((ssid, n["psk"]) for ssid, n in data.items() if _is_wpa_personal(n)),
+            cache=PskCache() if psk_cache else None,
+        )
+
+    options = {
+        "include_open": include_open,
+        "locale": locale,
+        "psks": psks,
+        "difference": difference,
+    }
+    save(data, [("wpa_supplicant", path, options)])
+    return difference
+
+
+class RotatingNdjsonWriter:
+    """
+    Appends JSON Lines to path, rotating it to path.1 ... path.<backup_count>
+    once a line would take it past max_bytes, as logging.handlers.RotatingFileHandler does.\n
+    Each line is flushed as written so readers can follow the file.\n
+    Arguments:\n
+    - max_bytes: size at which the file is rotated, 0 never rotates.\n
+    - backup_count: number of rotated files kept, the oldest is deleted.\n
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10485760, backup_count: int = 5) -> None:
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = None
+        self._size = 0
+
+    def _open(self) -> None:
+        self._file = open(self.path, "a", encoding="utf-8", newline="\n")
+        self._size = self._file.tell()
+
+    def rotate(self) -> None:
+        """
+        Closes the current file and shifts it and the backups up by one.\n
+        """
+        self.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.1")
+        elif os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def write(self, record: dict) -> None:
+        """
+        Appends record as one line.\n
+        """
+        self.write_many((record,))
+
+    def write_many(self, records) -> int:
+        """
+        Appends each record as a line, flushing once at the end. Returns the number written.\n
+        """
+        if self._file is None:
+            self._open()
+        count = 0
+        for record in records:
+            line = json.dumps(record, default=json_default) + "\n"
+            size = len(line.encode("utf-8"))
+            if self.max_bytes and self._size and self._size + size > self.max_bytes:
+                self._file.flush()
+                self.rotate()
+                self._open()
+            self._file.write(line)
+            self._size += size
+            count += 1
+        self._file.flush()
+        return count
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,319 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+from multiprocessing import Pool
+
+from .export import atomic_write
+from .records import NetworkProfile, json_default
+
+SNAPSHOT_NAME = "networks_data.json"
+
+
+def host_from_path(path: str) -> str:
+    """
+    Returns the host name for a snapshot file.\n
+    networks_data.json files are named after their directory, e.g. host1/networks_data.json,
+    any other file is named after the file, e.g. host1.json.\n
+    """
+    name = os.path.basename(path)
+    if name == SNAPSHOT_NAME:
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return os.path.splitext(name)[0]
+
+
+def find_snapshots(paths: list):
+    """
+    Generator yielding snapshot files from a list of files and directories.\n
+    directories are searched recursively for *.json files.\n
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(".json"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+# keys of a delta written by save_json(since=...), see delta.write_json_delta
+_DELTA_KEYS = {"base", "etag", "added", "changed", "removed"}
+
+
+def _parse_ndjson(text: str) -> dict:
+    # JSON Lines written by save_json(ndjson=True), one {"ssid": ..., **network} per line
+    data = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if isinstance(record, dict) and "op" in record:
+            raise ValueError("file is a delta export, aggregate needs full exports")
+        if not isinstance(record, dict) or not isinstance(record.get("ssid"), str):
+            raise ValueError("JSON Lines record has no ssid")
+        data[record.pop("ssid")] = record
+    return data
+
+
+def load_snapshot(path: str) -> dict:
+    """
+    Reads a snapshot saved by save_json() as a JSON object or JSON Lines,
+    returns {ssid: network dictionary}.\n
+    Raises ValueError for delta exports, save_json(since=...), and anything else that isn't
+    a full snapshot.\n
+    """
+    with open(path, "r", encoding="utf-8") as fin:
+        text = fin.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = _parse_ndjson(text)
+    else:
+        if isinstance(data, dict) and isinstance(data.get("ssid"), str):
+            # JSON Lines with a single profile is also a valid JSON object
+            data = _parse_ndjson(text)
+    if not isinstance(data, dict):
+        raise ValueError("snapshot is not a JSON object")
+    if _DELTA_KEYS <= set(data) and isinstance(data["base"], str):
+        raise ValueError("file is a delta export, aggregate needs full exports")
+    for ssid, network in data.items():
+        if not isinstance(network, dict):
+            raise ValueError(f"network {ssid!r} is not a JSON object")
+    return data
+
+
+def _parse_snapshot(path: str) -> tuple:
+    # runs in a worker process, returns plain tuples as they are cheap to pickle back
+    try:
+        rows = [
+            (
+                str(ssid),
+                str(network.get("auth", "")),
+                str(network.get("psk", "")),
+                bool(network.get("metered", False)),
+                str(network.get("macrandom", "Disabled")),
+            )
+            for ssid, network in load_snapshot(path).items()
+        ]
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+    return path, rows, None
+
+
+class FleetAggregator:
+    """
+    Merges networks_data.json snapshots from many hosts.\n
+    Files are parsed one at a time in a process pool and folded in as they arrive,
+    so memory grows with the number of unique profiles rather than the number of files.\n
+    Identical profiles on different hosts are stored once with the set of hosts that have them.\n
+    Arguments:\n
+    - processes: number of parsing processes, defaults to the cpu count.\n
+    - host_function: function returning the host name for a snapshot path.\n
+    """
+
+    def __init__(self, processes: int = None, host_function=host_from_path) -> None:
+        self.processes = processes
+        self.host_function = host_function
+        self.hosts = []
+        self.errors = []
+        self._host_ids = {}
+        # (ssid, auth, psk, metered, macrandom) -> index into _profiles / _profile_hosts
+        self._profile_ids = {}
+        self._profiles = []
+        self._profile_hosts = []
+        # ssid -> list of profile indexes
+        self._ssid_index = {}
+        self._strings = {}
+
+    def _intern(self, value: str) -> str:
+        # SSIDs and auth types repeat across hosts, keep a single copy of each
+        return self._strings.setdefault(value, value)
+
+    def _host_id(self, host: str) -> int:
+        host_id = self._host_ids.get(host)
+        if host_id is None:
+            host_id = len(self.hosts)
+            self.hosts.append(self._intern(host))
+            self._host_ids[host] = host_id
+        return host_id
+
+    def add_rows(self, host: str, rows) -> None:
+        """
+        Adds the parsed profiles of one host.\n
+        Arguments:\n
+        - rows: iterable of (ssid, auth, psk, metered, macrandom) tuples.\n
+        """
+        host_id = self._host_id(host)
+        for ssid, auth, psk, metered, macrandom in rows:
+            ssid = self._intern(ssid)
+            key = (ssid, self._intern(auth), psk, metered, self._intern(macrandom))
+            profile_id = self._profile_ids.get(key)
+            if profile_id is None:
+                profile_id = len(self._profiles)
+                self._profile_ids[key] = profile_id
+                self._profiles.append(NetworkProfile(*key[1:]))
+                self._profile_hosts.append({host_id})
+                self._ssid_index.setdefault(ssid, []).append(profile_id)
+            else:
+                self._profile_hosts[profile_id].add(host_id)
+
+    def add_file(self, path: str) -> None:
+        """
+        Parses and adds a single snapshot file in this process.\n
+        """
+        self._add_parsed(*_parse_snapshot(path))
+
+    def add_files(self, paths, chunksize: int = 16) -> None:
+        """
+        Parses and adds snapshot files using a process pool.\n
+        Arguments:\n
+        - paths: iterable of snapshot file paths.\n
+        - chunksize: number of files sent to a worker at a time.\n
+        """
+        if getattr(sys, "frozen", False):
+            # as in psk.precompute_psks, pool processes of a frozen executable need
+            # freeze_support() which can't be checked from here
+            for path in paths:
+                self.add_file(path)
+            return
+        with Pool(self.processes) as pool:
+            for parsed in pool.imap_unordered(_parse_snapshot, paths, chunksize):
+                self._add_parsed(*parsed)
+
+    def _add_parsed(self, path: str, rows, error) -> None:
+        if rows is None:
+            self.errors.append((path, error))
+        else:
+            self.add_rows(self.host_function(path), rows)
+
+    @property
+    def number_of_profiles(self) -> int:
+        """
+        Returns the number of unique profiles. \n
+        """
+        return len(self._profiles)
+
+    @property
+    def number_of_ssids(self) -> int:
+        """
+        Returns the number of unique SSIDs. \n
+        """
+        return len(self._ssid_index)
+
+    def ssids(self) -> list:
+        """
+        Returns all SSIDs seen across the fleet.\n
+        """
+        return list(self._ssid_index)
+
+    def hosts_for(self, ssid: str) -> list:
+        """
+        Returns the sorted hosts that have a profile for the SSID.\n
+        """
+        host_ids = set()
+        for profile_id in self._ssid_index.get(ssid, ()):
+            host_ids.update(self._profile_hosts[profile_id])
+        return sorted(self.hosts[host_id] for host_id in host_ids)
+
+    def profiles(self, ssid: str = None):
+        """
+        Generator yielding (ssid, NetworkProfile, hosts) for each unique profile.\n
+        Arguments:\n
+        - ssid: only yield profiles for this SSID.\n
+        """
+        ssids = self._ssid_index if ssid is None else [ssid]
+        for name in ssids:
+            for profile_id in self._ssid_index.get(name, ()):
+                hosts = sorted(self.hosts[i] for i in self._profile_hosts[profile_id])
+                yield name, self._profiles[profile_id], hosts
+
+    def to_dict(self) -> dict:
+        """
+        Returns {ssid: [profile dictionary with an added hosts list, ...]}.\n
+        """
+        results = {}
+        for ssid, profile, hosts in self.profiles():
+            entry = profile.to_dict()
+            entry["hosts"] = hosts
+            results.setdefault(ssid, []).append(entry)
+        return results
+
+    def save_json(self, path: str) -> None:
+        """
+        Atomically saves the aggregated profiles as JSON, see to_dict.\n
+        """
+        with atomic_write(path) as fout:
+            fout.write("{")
+            # written one ssid at a time to avoid building the whole document
+            for n, ssid in enumerate(self._ssid_index):
+                entries = []
+                for _, profile, hosts in self.profiles(ssid):
+                    entry = profile.to_dict()
+                    entry["hosts"] = hosts
+                    entries.append(entry)
+                fout.write(", " if n else "")
+                fout.write(f"{json.dumps(ssid)}: {json.dumps(entries, default=json_default)}")
+            fout.write("}")
+
+
+def main(argv: list = None) -> int:
+    """
+    Command line entry point for wifipasswords aggregate.\n
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        prog="wifipasswords aggregate",
+        description="Merge networks_data.json snapshots from many hosts.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="snapshot files or directories to search"
+    )
+    parser.add_argument(
+        "-o", "--output", help="save the aggregated profiles as JSON", metavar="FILE"
+    )
+    parser.add_argument(
+        "-p", "--processes", type=int, default=None, help="number of parsing processes"
+    )
+    parser.add_argument(
+        "-s", "--ssid", help="list the hosts that have a profile for this SSID", metavar="SSID"
+    )
+    args = parser.parse_args(argv)
+
+    aggregator = FleetAggregator(processes=args.processes)
+    aggregator.add_files(find_snapshots(args.paths))
+
+    print(
+        f"{len(aggregator.hosts)} hosts, {aggregator.number_of_ssids} SSIDs, "
+        f"{aggregator.number_of_profiles} unique profiles"
+    )
+    for path, error in aggregator.errors:
+        print(f"skipped {path}: {error}", file=sys.stderr)
+    if args.ssid is not None:
+        for host in aggregator.hosts_for(args.ssid):
+            print(host)
+    if args.output is not None:
+        aggregator.save_json(args.output)
+        print(f"JSON saved >> {args.output}")
+    return 1 if aggregator.errors and not aggregator.hosts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
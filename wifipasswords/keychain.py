@@ -0,0 +1,94 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import re
+
+# description of the keychain items holding wifi passwords
+AIRPORT_DESCRIPTION = "AirPort network password"
+
+# "acct"<blob>="home" or 0x00000007 <blob>="home" rows in the attributes section
+_ATTRIBUTE = re.compile(r'^\s+(?:"([^"]{4})"|0x[0-9A-Fa-f]+ ?)<(\w+)>=(.*)$')
+
+# parser states
+_HEADER, _ATTRIBUTES, _DATA = range(3)
+
+
+def decode_value(value: str):
+    """
+    Decodes a value printed by security dump-keychain.\n
+    "text" is returned unquoted, 0x<hex>  "text" is decoded from the hex as utf-8
+    since it is used when the value has unprintable bytes, <NULL> returns None.\n
+    """
+    value = value.strip()
+    if value.startswith("0x"):
+        try:
+            return bytes.fromhex(value[2:].split(" ", 1)[0]).decode("utf-8", errors="replace")
+        except ValueError:
+            return None
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    return None
+
+
+def iter_keychain_items(lines):
+    """
+    Generator parsing security dump-keychain [-d] output one line at a time.\n
+    Yields a dictionary per keychain item with the keychain, class,
+    attributes by name (e.g. "acct", "desc", "svce") and data, None if not dumped.\n
+    Arguments:\n
+    - lines: iterable of lines, e.g. a subprocess stdout.\n
+    """
+    item = None
+    state = _HEADER
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith("keychain: "):
+            if item is not None:
+                yield item
+            item = {"keychain": decode_value(line[10:]), "attributes": {}, "data": None}
+            state = _HEADER
+        elif item is None:
+            continue
+        elif line.startswith("class: "):
+            item["class"] = decode_value(line[7:]) or line[7:].strip()
+        elif line == "attributes:":
+            state = _ATTRIBUTES
+        elif line == "data:":
+            state = _DATA
+        elif state == _ATTRIBUTES:
+            match = _ATTRIBUTE.match(line)
+            if match is not None and match.group(1) is not None:
+                item["attributes"][match.group(1)] = decode_value(match.group(3))
+        elif state == _DATA:
+            # the secret is a single line, anything after it belongs to no section
+            item["data"] = decode_value(line)
+            state = _HEADER
+    if item is not None:
+        yield item
+
+
+def iter_airport_passwords(lines):
+    """
+    Generator yielding (ssid, password) for each wifi item in security dump-keychain output.\n
+    password is None if the dump has no data for the item, e.g. without -d or if access was denied.\n
+    """
+    for item in iter_keychain_items(lines):
+        attributes = item["attributes"]
+        if (
+            attributes.get("desc") == AIRPORT_DESCRIPTION
+            and attributes.get("acct") is not None
+        ):
+            yield attributes["acct"], item["data"]
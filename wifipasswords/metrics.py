@@ -0,0 +1,259 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import re
+import subprocess
+import threading
+import time
+
+from .concurrency import controller
+
+# upper bounds in seconds of the latency and wait histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# number of sub command words naming a command family, the rest are ssids and options
+FAMILY_DEPTH = {"nmcli": 2, "netsh": 3, "security": 1, "sudo": 1}
+
+_WORD = re.compile(r"^[a-z][a-z-]*$")
+
+
+def command_family(shell_commands: list) -> str:
+    """
+    Returns the command family used to group metrics, e.g. "nmcli c s".\n
+    Options, option values and arguments such as ssids are left out
+    so the number of families stays small.\n
+    """
+    if not shell_commands:
+        return ""
+    program = os.path.basename(shell_commands[0])
+    words = [program]
+    depth = FAMILY_DEPTH.get(program, 0)
+    for arg in shell_commands[1:]:
+        if len(words) > depth:
+            break
+        if _WORD.match(arg):
+            words.append(arg)
+    return " ".join(words)
+
+
+class _Family:
+    __slots__ = (
+        "calls",
+        "failures",
+        "seconds",
+        "max_seconds",
+        "output_bytes",
+        "wait_seconds",
+        "latency_buckets",
+        "wait_buckets",
+    )
+
+    def __init__(self, size: int) -> None:
+        self.calls = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.output_bytes = 0
+        self.wait_seconds = 0.0
+        # per bucket counts with a final +Inf bucket, made cumulative on output
+        self.latency_buckets = [0] * (size + 1)
+        self.wait_buckets = [0] * (size + 1)
+
+
+def _bucket_index(buckets: tuple, value: float) -> int:
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            return index
+    return len(buckets)
+
+
+def _cumulative(buckets: tuple, counts: list) -> dict:
+    results = {}
+    total = 0
+    for bound, count in zip(buckets + (float("inf"),), counts):
+        total += count
+        results["+Inf" if bound == float("inf") else repr(bound)] = total
+    return results
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CommandMetrics:
+    """
+    Thread safe per command family counters for subprocess calls.\n
+    Records call counts, failures, latency and slot wait histograms and bytes of output.\n
+    Arguments:\n
+    - buckets: histogram bucket upper bounds in seconds.\n
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        shell_commands: list,
+        seconds: float,
+        output_bytes: int = 0,
+        failed: bool = False,
+        wait: float = 0.0,
+    ) -> None:
+        """
+        Records one subprocess call.\n
+        Arguments:\n
+        - shell_commands: the command that was run.\n
+        - seconds: time the subprocess took.\n
+        - output_bytes: size of stdout.\n
+        - failed: the command could not be run or exited with a non zero status.\n
+        - wait: time spent waiting for a concurrency controller slot before it started.\n
+        """
+        family = command_family(shell_commands)
+        with self._lock:
+            entry = self._families.get(family)
+            if entry is None:
+                entry = self._families[family] = _Family(len(self.buckets))
+            entry.calls += 1
+            entry.failures += failed
+            entry.seconds += seconds
+            entry.max_seconds = max(entry.max_seconds, seconds)
+            entry.output_bytes += output_bytes
+            entry.wait_seconds += wait
+            entry.latency_buckets[_bucket_index(self.buckets, seconds)] += 1
+            entry.wait_buckets[_bucket_index(self.buckets, wait)] += 1
+
+    def reset(self) -> None:
+        """
+        Clears all recorded calls.\n
+        """
+        with self._lock:
+            self._families = {}
+
+    def stats(self) -> dict:
+        """
+        Returns {command family: counters} for every family called so far.\n
+        Bucket dictionaries are cumulative, keyed by upper bound as in prometheus.\n
+        """
+        results = {}
+        with self._lock:
+            for family, entry in self._families.items():
+                results[family] = {
+                    "calls": entry.calls,
+                    "failures": entry.failures,
+                    "seconds": entry.seconds,
+                    "max_seconds": entry.max_seconds,
+                    "output_bytes": entry.output_bytes,
+                    "wait_seconds": entry.wait_seconds,
+                    "latency_buckets": _cumulative(self.buckets, entry.latency_buckets),
+                    "wait_buckets": _cumulative(self.buckets, entry.wait_buckets),
+                }
+        return results
+
+    def prometheus(self) -> str:
+        """
+        Returns the metrics in the prometheus text exposition format.\n
+        """
+        stats = self.stats()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, key: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for family, values in stats.items():
+                lines.append(f'{name}{{command="{_label(family)}"}} {values[key]}')
+
+        def histogram(name: str, help_text: str, buckets: str, total: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for family, values in stats.items():
+                label = _label(family)
+                for bound, count in values[buckets].items():
+                    lines.append(f'{name}_bucket{{command="{label}",le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{command="{label}"}} {values[total]}')
+                lines.append(f'{name}_count{{command="{label}"}} {values["calls"]}')
+
+        metric("wifipasswords_command_calls_total", "counter", "Subprocess calls.", "calls")
+        metric(
+            "wifipasswords_command_failures_total",
+            "counter",
+            "Subprocess calls that failed to start or exited non zero.",
+            "failures",
+        )
+        metric(
+            "wifipasswords_command_output_bytes_total",
+            "counter",
+            "Bytes of subprocess stdout.",
+            "output_bytes",
+        )
+        histogram(
+            "wifipasswords_command_duration_seconds",
+            "Subprocess run time.",
+            "latency_buckets",
+            "seconds",
+        )
+        histogram(
+            "wifipasswords_command_wait_seconds",
+            "Time waiting for a concurrency slot before the subprocess started.",
+            "wait_buckets",
+            "wait_seconds",
+        )
+        lines.append(
+            "# HELP wifipasswords_concurrency_limit Current subprocess concurrency limit."
+        )
+        lines.append("# TYPE wifipasswords_concurrency_limit gauge")
+        lines.append(f"wifipasswords_concurrency_limit {controller.limit}")
+        return "\n".join(lines) + "\n"
+
+    def save_prometheus(self, path: str) -> None:
+        """
+        Atomically writes the prometheus text format to path.\n
+        Point the node exporter textfile collector at a directory of *.prom files to scrape it.\n
+        """
+        from .export import atomic_write
+
+        with atomic_write(path, fsync=False, newline="\n") as fout:
+            fout.write(self.prometheus())
+
+
+def run_command(shell_commands: list, **kwargs) -> subprocess.CompletedProcess:
+    """
+    subprocess.run with stdout piped, holding a concurrency controller slot and recording metrics.\n
+    Keyword arguments are passed to subprocess.run.\n
+    """
+    start = time.perf_counter()
+    controller.acquire()
+    started = time.perf_counter()
+    completed = None
+    try:
+        completed = subprocess.run(shell_commands, stdout=subprocess.PIPE, **kwargs)
+        return completed
+    finally:
+        finished = time.perf_counter()
+        controller.release(finished - started)
+        metrics.record(
+            shell_commands,
+            finished - started,
+            len(completed.stdout) if completed is not None else 0,
+            completed is None or completed.returncode != 0,
+            started - start,
+        )
+
+
+# shared by every WifiPasswords instance in the process
+metrics = CommandMetrics()
@@ -0,0 +1,182 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import sys
+import hmac
+import json
+import string
+import hashlib
+import threading
+from multiprocessing import Pool
+
+from .export import atomic_write
+
+# below this many derivations a process pool costs more to start than it saves
+POOL_THRESHOLD = 8
+# cache files written with an unsalted key are discarded
+CACHE_VERSION = 2
+
+
+def default_cache_path() -> str:
+    """
+    Returns the path of the persistent psk cache.\n
+    $XDG_CACHE_HOME/wifipasswords/psk_cache.json, %LOCALAPPDATA% is used on windows.\n
+    """
+    from .cache import cache_directory
+
+    return os.path.join(cache_directory(), "psk_cache.json")
+
+
+def is_passphrase(psk: str) -> bool:
+    """
+    Returns True if psk is a WPA passphrase, 8 to 63 printable ASCII characters.\n
+    """
+    return 8 <= len(psk) <= 63 and all(32 <= ord(char) <= 126 for char in psk)
+
+
+def derive_psk(ssid: str, passphrase: str) -> str:
+    """
+    Returns the 64 hex digit precomputed psk for the network, as output by wpa_passphrase.\n
+    PBKDF2-HMAC-SHA1 with the ssid as salt, 4096 iterations and a 32 byte key.\n
+    """
+    return hashlib.pbkdf2_hmac(
+        "sha1", passphrase.encode("utf-8"), ssid.encode("utf-8"), 4096, 32
+    ).hex()
+
+
+def _derive_pair(pair: tuple) -> str:
+    return derive_psk(*pair)
+
+
+class PskCache:
+    """
+    Persistent cache of precomputed psks keyed on (ssid, passphrase).\n
+    Entries are keyed by an HMAC-SHA256 of the pair with a random salt kept in the file, so
+    passphrases are not stored and keys can't be matched against precomputed tables.
+    The derived psks grant network access so the file is always written readable by the
+    owner only.\n
+    Arguments:\n
+    - path: cache file, defaults to default_cache_path().\n
+    """
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path if path is not None else default_cache_path()
+        self._entries = None
+        self._salt = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _key(self, ssid: str, passphrase: str) -> str:
+        # must be called after _load, which sets the salt
+        message = ssid.encode("utf-8") + b"\x00" + passphrase.encode("utf-8")
+        return hmac.new(self._salt, message, hashlib.sha256).hexdigest()
+
+    def _load(self) -> dict:
+        # must be called with the lock held
+        if self._entries is None:
+            try:
+                with open(self.path, "r") as fin:
+                    saved = json.load(fin)
+                if saved["version"] != CACHE_VERSION:
+                    raise ValueError("old cache version")
+                self._salt = bytes.fromhex(saved["salt"])
+                self._entries = dict(saved["psks"])
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                self._salt = os.urandom(16)
+                self._entries = {}
+        return self._entries
+
+    def get(self, ssid: str, passphrase: str):
+        """
+        Returns the cached psk or None.\n
+        """
+        with self._lock:
+            entries = self._load()
+            return entries.get(self._key(ssid, passphrase))
+
+    def put(self, ssid: str, passphrase: str, psk: str) -> None:
+        """
+        Stores a psk, call save() to write the cache file.\n
+        """
+        with self._lock:
+            entries = self._load()
+            entries[self._key(ssid, passphrase)] = psk
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Writes the cache file if it has changed.\n
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+            with atomic_write(self.path, fsync=False, mode=0o600) as fout:
+                json.dump(
+                    {
+                        "version": CACHE_VERSION,
+                        "salt": self._salt.hex(),
+                        "psks": self._entries,
+                    },
+                    fout,
+                )
+            self._dirty = False
+
+
+def precompute_psks(networks, processes: int = None, cache: PskCache = None) -> dict:
+    """
+    Derives precomputed psks for many networks, returns {ssid: 64 hex digit psk}.\n
+    psks that are already 64 hex digits are passed through, other invalid passphrases left out.
+    Uncached derivations run in a process pool so they are spread over all cores,
+    in process when running from a frozen executable.\n
+    Arguments:\n
+    - networks: iterable of (ssid, passphrase) pairs.\n
+    - processes: number of processes, defaults to the cpu count.\n
+    - cache: PskCache to read from and update, None to always derive.\n
+    """
+    results = {}
+    missing = []
+    for ssid, passphrase in networks:
+        if len(passphrase) == 64 and all(char in string.hexdigits for char in passphrase):
+            # already a precomputed psk, e.g. read from wpa_supplicant.conf
+            results[ssid] = passphrase.lower()
+            continue
+        if not is_passphrase(passphrase):
+            continue
+        psk = cache.get(ssid, passphrase) if cache is not None else None
+        if psk is None:
+            missing.append((ssid, passphrase))
+        else:
+            results[ssid] = psk
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    # pool processes of a frozen executable only work if it called freeze_support(), which
+    # can't be checked from here, so frozen executables derive in process
+    if len(missing) >= POOL_THRESHOLD and processes > 1 and not getattr(sys, "frozen", False):
+        with Pool(processes) as pool:
+            derived = pool.map(_derive_pair, missing, chunksize=4)
+    else:
+        derived = [_derive_pair(pair) for pair in missing]
+
+    for (ssid, passphrase), psk in zip(missing, derived):
+        results[ssid] = psk
+        if cache is not None:
+            cache.put(ssid, passphrase, psk)
+    if cache is not None and missing:
+        cache.save()
+    return results
@@ -0,0 +1,150 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+from collections.abc import MutableMapping
+
+# marks a field that was never set, unset fields are left out of the dictionary view
+_UNSET = object()
+
+
+class _Record(MutableMapping):
+    """
+    Fixed field record stored in __slots__ with a dictionary compatible view.\n
+    Keys are limited to _fields, records compare equal to dictionaries with the same items.\n
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _defaults = ()
+
+    def __init__(self, *args, **kwargs) -> None:
+        for field, default in zip(self._fields, self._defaults):
+            object.__setattr__(self, field, default)
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key) -> None:
+        if key not in self._fields or getattr(self, key) is _UNSET:
+            raise KeyError(key)
+        setattr(self, key, _UNSET)
+
+    def __iter__(self):
+        for field in self._fields:
+            if getattr(self, field) is not _UNSET:
+                yield field
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # pickle the set fields only, unset fields are restored by __init__
+        return (type(self), (), self.to_dict())
+
+    def __setstate__(self, state: dict) -> None:
+        for field, value in state.items():
+            setattr(self, field, value)
+
+    def copy(self):
+        return type(self)(self)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the record as a plain dictionary.\n
+        """
+        return {field: self[field] for field in self}
+
+
+class NetworkProfile(_Record):
+    """
+    A saved network profile.\n
+    Behaves as a dictionary with the keys auth, psk, metered and macrandom.\n
+    """
+
+    __slots__ = ("auth", "psk", "metered", "macrandom")
+    _fields = __slots__
+    _defaults = ("", "", False, "Disabled")
+
+    def __init__(
+        self, auth: str = "", psk: str = "", metered: bool = False, macrandom: str = "Disabled"
+    ) -> None:
+        # set directly rather than through MutableMapping.update, this is built per profile
+        self.auth = auth
+        self.psk = psk
+        self.metered = metered
+        self.macrandom = macrandom
+
+    def __len__(self) -> int:
+        # every field always has a value
+        return 4
+
+    def copy(self):
+        return NetworkProfile(self.auth, self.psk, self.metered, self.macrandom)
+
+
+class VisibleNetwork(_Record):
+    """
+    A network seen in a scan.\n
+    Fields reported vary by platform, only the fields that were set appear as keys.\n
+    """
+
+    __slots__ = (
+        "type",
+        "auth",
+        "encryption",
+        "bssids",
+        "signal",
+        "radios",
+        "channel",
+        "rates",
+    )
+    _fields = __slots__
+    _defaults = (_UNSET,) * len(__slots__)
+
+
+def as_dicts(networks) -> dict:
+    """
+    Returns a dictionary or iterable of (ssid, record) pairs as {ssid: plain dictionary}.\n
+    Records are kept internally, the public API returns plain dictionaries.\n
+    """
+    items = networks.items() if hasattr(networks, "items") else networks
+    return {
+        ssid: network.to_dict() if isinstance(network, _Record) else network
+        for ssid, network in items
+    }
+
+
+def json_default(obj):
+    """
+    default function for json.dump that converts records to dictionaries.\n
+    """
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,366 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import sys
+import threading
+import time
+from array import array
+from math import isnan
+
+
+class RingBuffer:
+    """
+    Fixed size buffer of floats stored in an array, the oldest value is overwritten when full.\n
+    nan marks a missing value and is left out of min, max and mean.\n
+    """
+
+    __slots__ = ("capacity", "_values", "_next", "_count", "_sum", "_valid")
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._values = array("d", bytes(8 * capacity))
+        self._next = 0
+        self._count = 0
+        # running sum and count of the values that aren't nan, so mean() doesn't scan
+        self._sum = 0.0
+        self._valid = 0
+
+    def append(self, value: float) -> None:
+        if self._count == self.capacity:
+            old = self._values[self._next]
+            if not isnan(old):
+                self._sum -= old
+                self._valid -= 1
+        else:
+            self._count += 1
+        self._values[self._next] = value
+        if not isnan(value):
+            self._sum += value
+            self._valid += 1
+        self._next = (self._next + 1) % self.capacity
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        # oldest first
+        start = self._next if self._count == self.capacity else 0
+        for index in range(self._count):
+            yield self._values[(start + index) % self.capacity]
+
+    def last(self) -> float:
+        if not self._count:
+            return float("nan")
+        return self._values[self._next - 1]
+
+    def min(self) -> float:
+        return min((value for value in self if not isnan(value)), default=float("nan"))
+
+    def max(self) -> float:
+        return max((value for value in self if not isnan(value)), default=float("nan"))
+
+    def mean(self) -> float:
+        if not self._valid:
+            return float("nan")
+        return self._sum / self._valid
+
+
+class BssidHistory:
+    """
+    Signal, channel and rate samples of one access point, each in a RingBuffer.\n
+    """
+
+    __slots__ = (
+        "bssid",
+        "ssid",
+        "first_seen",
+        "last_seen",
+        "times",
+        "signal",
+        "channel",
+        "rate",
+    )
+
+    def __init__(self, bssid: str, ssid: str, capacity: int) -> None:
+        self.bssid = bssid
+        self.ssid = ssid
+        self.first_seen = None
+        self.last_seen = None
+        self.times = RingBuffer(capacity)
+        self.signal = RingBuffer(capacity)
+        self.channel = RingBuffer(capacity)
+        self.rate = RingBuffer(capacity)
+
+    def add(
+        self, timestamp: float, ssid: str, signal: float, channel: int, rate: float
+    ) -> None:
+        if self.first_seen is None:
+            self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.ssid = ssid
+        self.times.append(timestamp)
+        self.signal.append(signal)
+        self.channel.append(channel)
+        self.rate.append(rate)
+
+    def samples(self) -> list:
+        """
+        Returns the stored samples oldest first as {time, signal, channel, rate} dictionaries,
+        rate is None if it wasn't reported.\n
+        """
+        return [
+            {
+                "time": timestamp,
+                "signal": signal,
+                "channel": int(channel),
+                "rate": None if isnan(rate) else rate,
+            }
+            for timestamp, signal, channel, rate in zip(
+                self.times, self.signal, self.channel, self.rate
+            )
+        ]
+
+    def aggregate(self) -> dict:
+        """
+        Returns min, max and mean signal and rate over the stored samples and when the
+        access point was first and last seen. Missing values are None.\n
+        """
+        result = {
+            "bssid": self.bssid,
+            "ssid": self.ssid,
+            "samples": len(self.times),
+            "channel": int(self.channel.last()),
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+        for name in ("signal", "rate"):
+            buffer = getattr(self, name)
+            for statistic in ("min", "max", "mean", "last"):
+                value = getattr(buffer, statistic)()
+                result[f"{name}_{statistic}"] = None if isnan(value) else value
+        return result
+
+
+class VisibleNetworkSampler:
+    """
+    Scans for visible networks every interval seconds on a background thread and keeps the
+    last capacity samples of every BSSID.\n
+    Signal units are those of the platform: percent on linux and Windows, RSSI dBm on Macos.\n
+    Samples are also appended to a rotating JSON Lines file if path is given.\n
+    Arguments:\n
+    - platform_object: WifiPasswordsLinux, WifiPasswordsWindows or WifiPasswordsMacos.\n
+    - interval: seconds between the start of each scan.\n
+    - capacity: samples kept per BSSID.\n
+    - path: JSON Lines file, one {time, bssid, ssid, signal, channel, rate} object per line.\n
+    - max_bytes, backup_count: rotation of path, see export.RotatingNdjsonWriter.\n
+    """
+
+    def __init__(
+        self,
+        platform_object,
+        interval: float = 5.0,
+        capacity: int = 720,
+        path: str = None,
+        max_bytes: int = 10485760,
+        backup_count: int = 5,
+    ) -> None:
+        self._platform_object = platform_object
+        self.interval = interval
+        self.capacity = capacity
+        self.scans = 0
+        self.errors = 0
+        self.last_error = None
+        self._histories = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+        if path is not None:
+            from .export import RotatingNdjsonWriter
+
+            self._writer = RotatingNdjsonWriter(path, max_bytes, backup_count)
+
+    def _record(self, timestamp: float, bssids: list) -> None:
+        with self._lock:
+            for bssid, ssid, signal, channel, rate in bssids:
+                history = self._histories.get(bssid)
+                if history is None:
+                    history = self._histories[bssid] = BssidHistory(bssid, ssid, self.capacity)
+                history.add(timestamp, ssid, signal, channel, rate)
+            self.scans += 1
+
+        if self._writer is not None:
+            self._writer.write_many(
+                {
+                    "time": timestamp,
+                    "bssid": bssid,
+                    "ssid": ssid,
+                    "signal": signal,
+                    "channel": channel,
+                    "rate": None if isnan(rate) else rate,
+                }
+                for bssid, ssid, signal, channel, rate in bssids
+            )
+
+    def sample(self) -> int:
+        """
+        Runs one scan and records it, returns the number of BSSIDs seen.\n
+        """
+        timestamp = time.time()
+        bssids = self._platform_object.get_visible_bssids()
+        self._record(timestamp, bssids)
+        return len(bssids)
+
+    def _run(self) -> None:
+        next_scan = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                # a failed scan (adapter down, command missing) doesn't end the survey
+                self.errors += 1
+                self.last_error = e
+            next_scan += self.interval
+            self._stop.wait(max(0.0, next_scan - time.monotonic()))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Starts sampling on a daemon thread, returns self.\n
+        """
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="wifipasswords-sampler", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stops sampling after the current scan and closes the JSON Lines file.\n
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def bssids(self) -> list:
+        """
+        Returns every BSSID seen so far.\n
+        """
+        with self._lock:
+            return list(self._histories)
+
+    def history(self, bssid: str) -> list:
+        """
+        Returns the stored samples of bssid oldest first, raises ValueError if never seen.\n
+        """
+        with self._lock:
+            return self._history(bssid).samples()
+
+    def aggregate(self, bssid: str) -> dict:
+        """
+        Returns min / max / mean / last signal and rate, channel, first_seen and last_seen
+        of bssid, raises ValueError if never seen.\n
+        """
+        with self._lock:
+            return self._history(bssid).aggregate()
+
+    def aggregates(self) -> dict:
+        """
+        Returns {bssid: aggregate} for every BSSID seen.\n
+        """
+        with self._lock:
+            return {bssid: history.aggregate() for bssid, history in self._histories.items()}
+
+    def _history(self, bssid: str) -> BssidHistory:
+        history = self._histories.get(bssid.lower())
+        if history is None:
+            raise ValueError("BSSID not seen.")
+        return history
+
+
+def _format_value(value, digits: int = 1) -> str:
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def main(argv: list = None) -> int:
+    """
+    Command line entry point for wifipasswords survey.\n
+    """
+    from argparse import ArgumentParser
+    from . import WifiPasswords
+
+    parser = ArgumentParser(
+        prog="wifipasswords survey",
+        description="Sample visible networks per BSSID until interrupted.",
+    )
+    parser.add_argument(
+        "-i", "--interval", type=float, default=5.0, help="seconds between scans"
+    )
+    parser.add_argument(
+        "-n", "--count", type=int, default=None, help="stop after this many scans"
+    )
+    parser.add_argument(
+        "-c", "--capacity", type=int, default=720, help="samples kept per BSSID"
+    )
+    parser.add_argument("-o", "--output", help="append samples as JSON Lines", metavar="FILE")
+    parser.add_argument(
+        "--max-bytes", type=int, default=10485760, help="rotate FILE at this size"
+    )
+    parser.add_argument("--backups", type=int, default=5, help="rotated files kept")
+    args = parser.parse_args(argv)
+
+    sampler = WifiPasswords().sampler(
+        args.interval, args.capacity, args.output, args.max_bytes, args.backups
+    )
+    sampler.start()
+    try:
+        while sampler.running and (args.count is None or sampler.scans < args.count):
+            time.sleep(min(args.interval, 0.5))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop()
+
+    print(f"{sampler.scans} scans, {len(sampler.bssids())} BSSIDs")
+    print(f"{'BSSID':<18} {'CH':>3} {'MIN':>6} {'MEAN':>6} {'MAX':>6} {'N':>5}  SSID")
+    for summary in sorted(sampler.aggregates().values(), key=lambda a: a["ssid"]):
+        print(
+            f"{summary['bssid']:<18} {summary['channel']:>3} "
+            f"{_format_value(summary['signal_min']):>6} "
+            f"{_format_value(summary['signal_mean']):>6} "
+            f"{_format_value(summary['signal_max']):>6} {summary['samples']:>5}  {summary['ssid']}"
+        )
+    if sampler.errors:
+        print(f"{sampler.errors} scans failed: {sampler.last_error}", file=sys.stderr)
+    if args.output is not None:
+        print(f"samples saved >> {args.output}")
+    return 1 if sampler.errors and not sampler.bssids() else 0
@@ -0,0 +1,376 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import copy
+import threading
+import time
+from types import MappingProxyType
+
+from .records import as_dicts
+
+
+class Snapshot:
+    """
+    Immutable result of a single fetch of profiles, connected SSIDs, visible networks and DNS.\n
+    Query methods mirror WifiPasswords but never run a subprocess,
+    returned dictionaries are copies so the snapshot itself can't be changed.\n
+    Visible networks and DNS raise ValueError if they weren't collected.\n
+    """
+
+    __slots__ = (
+        "platform",
+        "created",
+        "_profiles",
+        "_connected_ssids",
+        "_visible_networks",
+        "_visible_networks_text",
+        "_number_visible_networks",
+        "_dns_config",
+        "_dns_config_text",
+        "_number_of_interfaces",
+        "_manifest",
+    )
+
+    def __init__(
+        self,
+        platform: str,
+        profiles: dict,
+        connected_ssids: list,
+        visible_networks: dict = None,
+        visible_networks_text: str = None,
+        number_visible_networks: int = None,
+        dns_config: dict = None,
+        dns_config_text: str = None,
+        number_of_interfaces: int = None,
+        created: float = None,
+    ) -> None:
+        values = {
+            "platform": platform,
+            "created": time.time() if created is None else created,
+            "_profiles": MappingProxyType(
+                {ssid: network.copy() for ssid, network in profiles.items()}
+            ),
+            "_connected_ssids": tuple(connected_ssids),
+            "_visible_networks": (
+                None if visible_networks is None else MappingProxyType(dict(visible_networks))
+            ),
+            "_visible_networks_text": visible_networks_text,
+            "_number_visible_networks": number_visible_networks,
+            "_dns_config": None if dns_config is None else MappingProxyType(dict(dns_config)),
+            "_dns_config_text": dns_config_text,
+            "_number_of_interfaces": number_of_interfaces,
+            "_manifest": None,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError("Snapshot is immutable")
+
+    def __delattr__(self, name) -> None:
+        raise AttributeError("Snapshot is immutable")
+
+    def __repr__(self) -> str:
+        return (
+            f"<Snapshot {self.platform} profiles={len(self._profiles)} "
+            f"connected={list(self._connected_ssids)}>"
+        )
+
+    @property
+    def data(self) -> dict:
+        """
+        Returns a copy of the profiles as a dictionary. \n
+        """
+        return self.get_passwords()
+
+    @property
+    def number_of_profiles(self) -> int:
+        """
+        Returns the number of saved profiles. \n
+        """
+        return len(self._profiles)
+
+    @property
+    def number_of_visible_networks(self) -> int:
+        """
+        Returns the number of visible networks. \n
+        """
+        self._require(self._visible_networks, "visible networks")
+        return self._number_visible_networks
+
+    @property
+    def number_of_interfaces(self) -> int:
+        """
+        Returns the number of interfaces. \n
+        """
+        self._require(self._dns_config, "DNS config")
+        return self._number_of_interfaces
+
+    @staticmethod
+    def _require(value, name: str) -> None:
+        if value is None:
+            raise ValueError(f"{name} not collected in this snapshot.")
+
+    def get_passwords(self) -> dict:
+        """
+        Returns a copy of {ssid: network dictionary} for all saved profiles.\n
+        """
+        return as_dicts(self._profiles)
+
+    def get_visible_networks(self, as_dictionary=False):
+        """
+        Returns the visible networks as the platform string, or a dictionary if as_dictionary.\n
+        """
+        self._require(self._visible_networks, "visible networks")
+        if as_dictionary:
+            return copy.deepcopy(as_dicts(self._visible_networks))
+        return self._visible_networks_text
+
+    def get_dns_config(self, as_dictionary=False):
+        """
+        Returns the DNS config as the platform string, or a dictionary if as_dictionary.\n
+        """
+        self._require(self._dns_config, "DNS config")
+        if as_dictionary:
+            return copy.deepcopy(dict(self._dns_config))
+        return self._dns_config_text
+
+    def get_number_visible_networks(self) -> int:
+        return self.number_of_visible_networks
+
+    def get_number_interfaces(self) -> int:
+        return self.number_of_interfaces
+
+    def get_number_profiles(self) -> int:
+        return self.number_of_profiles
+
+    def get_currently_connected_ssids(self) -> list:
+        """
+        Returns the SSIDs that were connected when the snapshot was taken.\n
+        """
+        return list(self._connected_ssids)
+
+    def get_currently_connected_passwords(self) -> list:
+        """
+        Returns a tuple of (ssid, psk) for each connected network, psk is "" if unknown.\n
+        """
+        return [
+            (ssid, self._profiles[ssid]["psk"] if ssid in self._profiles else "")
+            for ssid in self._connected_ssids
+        ]
+
+    def get_known_ssids(self) -> list:
+        """
+        Returns a list of known SSIDs.\n
+        """
+        return list(self._profiles)
+
+    def get_single_password(self, ssid) -> str:
+        """
+        Returns the psk for the SSID, raises ValueError if the SSID is not known.\n
+        """
+        network = self._profiles.get(ssid)
+        if network is None:
+            raise ValueError("SSID not known.")
+        return network["psk"]
+
+    def manifest(self, salt: bytes = None):
+        """
+        Returns the delta.Manifest of the profiles, computed once for the default salt.\n
+        """
+        from .delta import Manifest
+
+        if salt is not None and (self._manifest is None or self._manifest.salt != salt):
+            return Manifest.from_data(self._profiles, salt)
+        if self._manifest is None:
+            object.__setattr__(self, "_manifest", Manifest.from_data(self._profiles))
+        return self._manifest
+
+    @property
+    def etag(self) -> str:
+        """
+        ETag of the profiles, equal for snapshots with the same profiles in this process.\n
+        """
+        return self.manifest().etag
+
+    def fingerprints(self) -> dict:
+        """
+        Returns {ssid: fingerprint} of the profiles.\n
+        """
+        return dict(self.manifest().fingerprints)
+
+    def diff(self, previous):
+        """
+        Returns the delta.SnapshotDiff of SSIDs added, removed and changed since previous,
+        a Snapshot, Manifest or dictionary of profiles.\n
+        """
+        from .delta import diff
+
+        return diff(previous, self)
+
+
+class _SharedRunner:
+    """
+    Wraps a _command_runner so each distinct command runs once per snapshot.\n
+    Concurrent calls for a command already running wait for its output.\n
+    """
+
+    def __init__(self, command_runner) -> None:
+        self._command_runner = command_runner
+        self._lock = threading.Lock()
+        # command tuple -> [event, output, exception]
+        self._results = {}
+
+    def __call__(self, shell_commands: list) -> str:
+        key = tuple(shell_commands)
+        with self._lock:
+            result = self._results.get(key)
+            owner = result is None
+            if owner:
+                result = self._results[key] = [threading.Event(), None, None]
+        if owner:
+            try:
+                result[1] = self._command_runner(shell_commands)
+            except Exception as e:
+                result[2] = e
+                raise
+            finally:
+                result[0].set()
+        else:
+            result[0].wait()
+            if result[2] is not None:
+                raise result[2]
+        return result[1]
+
+
+def _fetch_visible(platform_object) -> tuple:
+    # the second call reuses the output of the first through the shared runner
+    visible_networks = platform_object.get_visible_networks(True)
+    visible_networks_text = platform_object.get_visible_networks(False)
+    return visible_networks, visible_networks_text, platform_object.number_visible_networks
+
+
+def _fetch_dns(platform_object) -> tuple:
+    dns_config = platform_object.get_dns_config(True)
+    dns_config_text = platform_object.get_dns_config(False)
+    return dns_config, dns_config_text, platform_object.number_of_interfaces
+
+
+def take_snapshot(
+    platform_object, platform: str, visible: bool = True, dns: bool = True, on_profile=None
+) -> Snapshot:
+    """
+    Collects a Snapshot from a platform class.\n
+    Connected SSIDs, visible networks and DNS are fetched on worker threads while
+    profiles are read on the calling thread. Every distinct command is run once.\n
+    Safe to call while the platform object is used from other threads.\n
+    Arguments:\n
+    - platform_object: WifiPasswordsLinux, WifiPasswordsWindows or WifiPasswordsMacos.\n
+    - visible: collect visible networks.\n
+    - dns: collect the DNS config.\n
+    - on_profile: called with (ssid, network, connected_ssids) as each profile is fetched.\n
+    """
+    from multiprocessing.dummy import Pool as ThreadPool
+
+    # the platform classes call self._command_runner, shadow it on a shallow copy as the
+    # instance itself may be in use on other threads, e.g. by the serve daemon.
+    # caches are shared with the instance, they are thread safe
+    worker = copy.copy(platform_object)
+    worker._command_runner = _SharedRunner(platform_object._command_runner)
+    pool = ThreadPool(1 + visible + dns)
+    try:
+        connected = pool.apply_async(worker.get_currently_connected_ssids)
+        visible_result = pool.apply_async(_fetch_visible, (worker,)) if visible else None
+        dns_result = pool.apply_async(_fetch_dns, (worker,)) if dns else None
+
+        profiles = {}
+        for ssid, network in worker.iter_passwords():
+            profiles[ssid] = network
+            if on_profile is not None:
+                on_profile(ssid, network, connected.get())
+        connected_ssids = connected.get()
+        visible_networks, visible_networks_text, number_visible_networks = (
+            visible_result.get() if visible else (None, None, None)
+        )
+        dns_config, dns_config_text, number_of_interfaces = (
+            dns_result.get() if dns else (None, None, None)
+        )
+    finally:
+        pool.close()
+        pool.join()
+
+    # the same state the fetch methods set when called on the instance
+    for name in ("data", "number_of_profiles"):
+        if hasattr(worker, name):
+            setattr(platform_object, name, getattr(worker, name))
+    if visible:
+        platform_object.number_visible_networks = number_visible_networks
+    if dns:
+        platform_object.number_of_interfaces = number_of_interfaces
+
+    return Snapshot(
+        platform,
+        profiles,
+        connected_ssids,
+        visible_networks,
+        visible_networks_text,
+        number_visible_networks,
+        dns_config,
+        dns_config_text,
+        number_of_interfaces,
+    )
+
+
+async def take_snapshot_async(
+    platform_object, platform: str, command_runner, visible: bool = True, dns: bool = True
+) -> Snapshot:
+    """
+    asyncio version of take_snapshot using the *_async platform methods.\n
+    """
+    import asyncio
+
+    tasks = {}
+
+    async def shared_runner(shell_commands: list, include_stderr: bool = False):
+        key = (tuple(shell_commands), include_stderr)
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(command_runner(shell_commands, include_stderr))
+        return await tasks[key]
+
+    async def fetch_visible() -> tuple:
+        visible_networks = await platform_object.get_visible_networks_async(
+            shared_runner, True
+        )
+        visible_networks_text = await platform_object.get_visible_networks_async(
+            shared_runner, False
+        )
+        return visible_networks, visible_networks_text, platform_object.number_visible_networks
+
+    async def fetch_dns() -> tuple:
+        dns_config = await platform_object.get_dns_config_async(shared_runner, True)
+        dns_config_text = await platform_object.get_dns_config_async(shared_runner, False)
+        return dns_config, dns_config_text, platform_object.number_of_interfaces
+
+    async def skipped() -> tuple:
+        return None, None, None
+
+    profiles, connected_ssids, visible_fields, dns_fields = await asyncio.gather(
+        platform_object.get_passwords_async(shared_runner),
+        platform_object.get_currently_connected_ssids_async(shared_runner),
+        fetch_visible() if visible else skipped(),
+        fetch_dns() if dns else skipped(),
+    )
+    return Snapshot(platform, profiles, connected_ssids, *visible_fields, *dns_fields)
@@ -0,0 +1,139 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import threading
+import time
+
+
+class TaskGraph:
+    """
+    Runs functions on a thread pool as soon as the tasks they depend on have finished.\n
+    Each task is called with the results of its dependencies, in the order they were given.
+    A task that raises fails every task depending on it with the same exception.\n
+    Tasks may also block on result() of a task they don't depend on, the pool has a
+    thread per task so this can't deadlock.\n
+    """
+
+    def __init__(self) -> None:
+        self._tasks = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self._pool = None
+        # name -> seconds taken, for tasks that ran
+        self.timings = {}
+
+    def add(self, name: str, function, *dependencies) -> str:
+        """
+        Adds a task, dependencies are the names of tasks already added.\n
+        Returns the name.\n
+        """
+        if self._pool is not None:
+            raise RuntimeError("tasks can't be added once the graph is started")
+        if name in self._tasks:
+            raise ValueError(f"task {name!r} already added")
+        for dependency in dependencies:
+            if dependency not in self._tasks:
+                raise ValueError(f"unknown dependency {dependency!r} of {name!r}")
+        # [function, dependencies, event, result, exception]
+        self._tasks[name] = [function, dependencies, threading.Event(), None, None]
+        self._order.append(name)
+        return name
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tasks
+
+    def _ready(self, name: str) -> bool:
+        return all(self._tasks[dependency][2].is_set() for dependency in self._tasks[name][1])
+
+    def _submit(self, name: str) -> None:
+        self._pool.apply_async(self._run, (name,))
+
+    def _run(self, name: str) -> None:
+        task = self._tasks[name]
+        function, dependencies = task[0], task[1]
+        try:
+            failed = next(
+                (self._tasks[d][4] for d in dependencies if self._tasks[d][4] is not None),
+                None,
+            )
+            if failed is not None:
+                task[4] = failed
+            else:
+                started = time.perf_counter()
+                try:
+                    task[3] = function(*[self._tasks[d][3] for d in dependencies])
+                except BaseException as e:
+                    task[4] = e
+                self.timings[name] = time.perf_counter() - started
+        finally:
+            with self._lock:
+                task[2].set()
+                # start every task whose last dependency was this one
+                ready = [
+                    other
+                    for other in self._order
+                    if name in self._tasks[other][1]
+                    and not self._tasks[other][2].is_set()
+                    and self._ready(other)
+                ]
+            for other in ready:
+                self._submit(other)
+
+    def start(self):
+        """
+        Starts every task without dependencies, returns self.\n
+        """
+        from multiprocessing.dummy import Pool as ThreadPool
+
+        if self._pool is None:
+            self._pool = ThreadPool(max(1, len(self._tasks)))
+            for name in self._order:
+                if not self._tasks[name][1]:
+                    self._submit(name)
+        return self
+
+    def result(self, name: str, timeout: float = None):
+        """
+        Waits for the task and returns its result, or raises the exception it failed with.\n
+        """
+        task = self._tasks[name]
+        if not task[2].wait(timeout):
+            raise TimeoutError(f"task {name!r} not finished")
+        if task[4] is not None:
+            raise task[4]
+        return task[3]
+
+    def wait(self) -> dict:
+        """
+        Waits for every task, returns {name: result} and raises the first failure.\n
+        """
+        return {name: self.result(name) for name in self._order}
+
+    def close(self) -> None:
+        """
+        Waits for running tasks and stops the pool.\n
+        """
+        if self._pool is not None:
+            for name in self._order:
+                self._tasks[name][2].wait()
+            self._pool.close()
+            self._pool.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
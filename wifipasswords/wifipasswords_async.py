@@ -0,0 +1,311 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import asyncio
+import subprocess
+import time
+
+from . import WifiPasswords
+from .metrics import controller, metrics
+from .records import as_dicts
+
+
+class AsyncWifiPasswords:
+    """
+    asyncio version of WifiPasswords.\n
+    Methods mirror WifiPasswords but are coroutines.\n
+    Subprocesses run with asyncio.create_subprocess_exec so no executor threads are used.\n
+    Arguments:\n
+    - max_concurrency: maximum number of subprocesses running at once.\n
+    - use_export, use_dump: as for WifiPasswords.\n
+    """
+
+    def __init__(
+        self, max_concurrency: int = 6, use_export: bool = False, use_dump: bool = False
+    ) -> None:
+        self._wifipasswords = WifiPasswords(use_export=use_export, use_dump=use_dump)
+        self._WifiPasswordsSubclass = self._wifipasswords._WifiPasswordsSubclass
+        self.platform = self._wifipasswords.platform
+        self.max_concurrency = max_concurrency
+        # created on first use so it binds to the running event loop
+        self._semaphore = None
+
+    async def _command_runner(self, shell_commands: list, include_stderr: bool = False):
+        """
+        asyncio equivalent of the platform _command_runner.\n
+        Takes the command to execute as a subprocess in the form of a list.\n
+        Returns the utf-8 decoded stdout, or a tuple of (stdout, stderr) if include_stderr.\n
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        kwargs = {}
+        if self.platform == "Windows":
+            # need to use pipes for all STDIO on windows if running without interactive console.
+            si = subprocess.STARTUPINFO()
+            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            kwargs["startupinfo"] = si
+
+        queued = time.perf_counter()
+        async with self._semaphore:
+            # also respect the process wide cap shared with the blocking classes,
+            # waiting for a slot on an executor thread so the event loop isn't blocked
+            if not controller.acquire(blocking=False):
+                acquired = asyncio.get_running_loop().run_in_executor(None, controller.acquire)
+                try:
+                    await asyncio.shield(acquired)
+                except asyncio.CancelledError:
+                    # the thread still takes the slot, give it back once it has
+                    acquired.add_done_callback(lambda _: controller.release())
+                    raise
+            start = time.perf_counter()
+            process = None
+            stdout = b""
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *shell_commands,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    stdin=asyncio.subprocess.PIPE,
+                    **kwargs,
+                )
+                stdout, stderr = await process.communicate()
+            finally:
+                finished = time.perf_counter()
+                controller.release(finished - start)
+                metrics.record(
+                    shell_commands,
+                    finished - start,
+                    len(stdout),
+                    process is None or process.returncode != 0,
+                    start - queued,
+                )
+
+        if include_stderr:
+            return stdout.decode("utf-8"), stderr.decode("utf-8")
+        return stdout.decode("utf-8")
+
+    @property
+    def data(self) -> dict:
+        """
+        Returns the stored data value as a dictionary. \n
+        """
+        return self._wifipasswords.data
+
+    @property
+    def number_of_profiles(self) -> int:
+        """
+        Returns the number of saved profiles as an int. \n
+        """
+        return self._wifipasswords.number_of_profiles
+
+    @property
+    def number_of_visible_networks(self) -> int:
+        """
+        Returns the number of visible networks from the last scan. \n
+        """
+        return self._wifipasswords.number_of_visible_networks
+
+    @property
+    def number_of_interfaces(self) -> int:
+        """
+        Returns the number of network interfaces. \n
+        """
+        return self._wifipasswords.number_of_interfaces
+
+    async def get_passwords(self) -> dict:
+        """
+        Returns a nested dictionary of saved network profiles.\n
+        Profile queries run concurrently, limited by max_concurrency.\n
+        """
+        return as_dicts(
+            await self._WifiPasswordsSubclass.get_passwords_async(self._command_runner)
+        )
+
+    async def get_passwords_dummy(self, delay: float = 0.5, quantity: int = 10) -> dict:
+        """
+        Returns a dictionary of dummy networks for testing.\n
+        Arguments:\n
+        - delay: seconds of delay before returning. emulating netsh.\n
+        - quantity: how many networks, half open, half wpa\n
+        """
+        await asyncio.sleep(delay)
+        return self._wifipasswords.get_passwords_dummy(0, quantity)
+
+    async def get_passwords_data(self) -> dict:
+        """
+        returns stored data as dictionary.\n
+        needs to be run after get_passwords or will return empty dict.
+        """
+        return self._wifipasswords.get_passwords_data()
+
+    async def get_visible_networks(self, as_dictionary=False, max_age: float = None) -> str:
+        """
+        returns currently visible WiFi networks.\n
+        returns a formatted string or dictionary.\n
+        max_age as for WifiPasswords.get_visible_networks.\n
+        """
+        if max_age is not None and self.platform == "Linux":
+            result = await self._WifiPasswordsSubclass.get_visible_networks_async(
+                self._command_runner, as_dictionary, max_age
+            )
+        else:
+            result = await self._WifiPasswordsSubclass.get_visible_networks_async(
+                self._command_runner, as_dictionary
+            )
+        return as_dicts(result) if as_dictionary else result
+
+    async def get_visible_bssids(self) -> list:
+        """
+        returns a (bssid, ssid, signal, channel, rate) tuple for every access point seen.\n
+        """
+        return await self._WifiPasswordsSubclass.get_visible_bssids_async(self._command_runner)
+
+    async def get_dns_config(self, as_dictionary=False) -> str:
+        """
+        returns current dns config.\n
+        returns as formatted string or nested dictionary if as_dictionary.\n
+        """
+        return await self._WifiPasswordsSubclass.get_dns_config_async(
+            self._command_runner, as_dictionary
+        )
+
+    async def save_wpa_supplicant(
+        self,
+        path: str,
+        data: dict = None,
+        include_open: bool = True,
+        locale: str = "GB",
+        precompute_psk: bool = False,
+        psk_cache: bool = True,
+        since=None,
+    ):
+        """
+        Saves formatted wpa_supplicant.conf file, see WifiPasswords.save_wpa_supplicant.\n
+        The file is written on an executor thread so the event loop isn't blocked.\n
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None,
+            self._wifipasswords.save_wpa_supplicant,
+            path,
+            data,
+            include_open,
+            locale,
+            precompute_psk,
+            psk_cache,
+            since,
+        )
+
+    async def save_json(
+        self,
+        path: str,
+        data: dict = None,
+        ndjson: bool = False,
+        fsync: bool = True,
+        since=None,
+    ):
+        """
+        Saves network data as JSON on an executor thread, see WifiPasswords.save_json.\n
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._wifipasswords.save_json, path, data, ndjson, fsync, since
+        )
+
+    async def export(self, targets: list, data: dict = None, fsync: bool = True) -> dict:
+        """
+        Saves network data in several formats on an executor thread, see WifiPasswords.export.\n
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._wifipasswords.export, targets, data, fsync
+        )
+
+    async def get_number_visible_networks(self, max_age: float = None) -> int:
+        """
+        number of networks visible currently.\n
+        also calls get_visible_networks.\n
+        """
+        await self.get_visible_networks(max_age=max_age)
+        return self.number_of_visible_networks
+
+    async def get_number_interfaces(self) -> int:
+        """
+        returns number of interfaces, calculated from number of DNS configs.\n
+        """
+        await self.get_dns_config()
+        return self._WifiPasswordsSubclass.number_of_interfaces
+
+    async def get_number_profiles(self) -> int:
+        """
+        returns number of saved profiles.\n
+        calls get_passwords if number of profiles is 0.\n
+        """
+        if self.number_of_profiles == 0:
+            await self.get_passwords()
+        return self.number_of_profiles
+
+    async def get_currently_connected_ssids(self) -> list:
+        """
+        Returns all currently connected SSIDs as a list. \n
+        """
+        return await self._WifiPasswordsSubclass.get_currently_connected_ssids_async(
+            self._command_runner
+        )
+
+    async def get_currently_connected_passwords(self) -> list:
+        """
+        Returns a tuple of (ssid, psk) for each currently connected network as a list.
+        """
+        return await self._WifiPasswordsSubclass.get_currently_connected_passwords_async(
+            self._command_runner
+        )
+
+    async def get_known_ssids(self) -> list:
+        """
+        Returns a list of known SSIDs without password information.
+        """
+        return await self._WifiPasswordsSubclass.get_known_ssids_async(self._command_runner)
+
+    async def get_single_password(self, ssid) -> str:
+        """
+        Returns the psk for the specified SSID.\n
+        if the SSID is not found raises a ValueError \n
+        """
+        return await self._WifiPasswordsSubclass.get_single_password_async(
+            self._command_runner, ssid
+        )
+
+    async def snapshot(self, visible: bool = True, dns: bool = True):
+        """
+        Fetches profiles, connected SSIDs, visible networks and DNS once, concurrently.\n
+        Returns an immutable Snapshot, see WifiPasswords.snapshot.\n
+        """
+        from .snapshot import take_snapshot_async
+
+        return await take_snapshot_async(
+            self._WifiPasswordsSubclass, self.platform, self._command_runner, visible, dns
+        )
+
+    def stats(self) -> dict:
+        """
+        Returns subprocess metrics for the whole process, see WifiPasswords.stats.\n
+        """
+        return self._wifipasswords.stats()
+
+    def save_metrics(self, path: str) -> None:
+        """
+        Saves subprocess metrics in the prometheus text format, see WifiPasswords.save_metrics.\n
+        """
+        self._wifipasswords.save_metrics(path)
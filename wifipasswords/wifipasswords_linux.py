@@ -16,22 +16,117 @@ __copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
 
 import subprocess
 import os
-import json
 import re
-from multiprocessing.dummy import Pool as ThreadPool
+import configparser
+import time
 
-from . import __version__
+from .cache import ProfileCache, ScanCache
+from .concurrency import controller
+from .metrics import run_command
+from . import export
+from .records import NetworkProfile, VisibleNetwork
+
+
+class _Inotify:
+    """
+    Minimal ctypes wrapper around the linux inotify api.\n
+    Only used to wake up when something changes in the watched directories.\n
+    Raises OSError if inotify is unavailable or none of the paths can be watched.\n
+    """
+
+    # IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    # | IN_DELETE_SELF | IN_MOVE_SELF
+    MASK = 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800
+
+    def __init__(self, paths: list) -> None:
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            raise OSError("inotify not available") from e
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        watched = [
+            path
+            for path in paths
+            if libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK) >= 0
+        ]
+        if len(watched) == 0:
+            self.close()
+            raise OSError("no paths could be watched")
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits up to timeout seconds for changes, returns True if there were any.\n
+        """
+        import select
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # let a burst of writes settle so it is handled as one change
+        time.sleep(0.05)
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
 
 
 class WifiPasswordsLinux:
-    def __init__(self) -> None:
-        self.nm_path = "/etc/NetworkManager/system-connections"
-        self.wpa_supplicant_file_path = "/etc/wpa_supplicant/wpa_supplicant.conf"
+    NMCLI_PROFILES = ["nmcli", "-t", "-f", "NAME,TYPE", "c"]
+    NMCLI_VISIBLE_NETWORKS = [
+        "nmcli",
+        "-t",
+        "-f",
+        "SSID,CHAN,RATE,SIGNAL,SECURITY",
+        "dev",
+        "wifi",
+    ]
+    # nmcli dev wifi rescans by itself when its scan list is older than this (--rescan auto)
+    NMCLI_AUTO_RESCAN_AGE = 30.0
+    NMCLI_VISIBLE_BSSIDS = ["nmcli", "-t", "-f", "BSSID,SSID,CHAN,RATE,SIGNAL", "dev", "wifi"]
+    NMCLI_DEVICE_DNS = [
+        "nmcli",
+        "-t",
+        "-f",
+        "GENERAL.DEVICE,GENERAL.CONNECTION,IP4.DNS,IP4.DOMAIN",
+        "device",
+        "show",
+    ]
+
+    def __init__(
+        self,
+        nm_path: str = "/etc/NetworkManager/system-connections",
+        wpa_supplicant_file_path: str = "/etc/wpa_supplicant/wpa_supplicant.conf",
+        use_keyfiles: bool = True,
+        batch_size: int = 16,
+    ) -> None:
+        self.nm_path = nm_path
+        self.wpa_supplicant_file_path = wpa_supplicant_file_path
+        # read NetworkManager keyfiles directly rather than forking nmcli per profile
+        self.use_keyfiles = use_keyfiles
+        # number of profiles requested per nmcli call when keyfiles can't be read
+        self.batch_size = max(1, batch_size)
         self.data = {}
         self.number_of_profiles = 0
         self.number_visible_networks = 0
         self.number_of_interfaces = 0
-        self.net_template = {"auth": "", "psk": "", "metered": False, "macrandom": "Disabled"}
+        self.net_template = NetworkProfile()
+        # profiles are cached until the keyfiles or wpa_supplicant.conf change
+        self.cache = ProfileCache(version=self._profiles_version)
+        # (file signature, {ssid: NetworkProfile}) for wpa_supplicant.conf
+        self._wpa_index = (None, {})
+        # last nmcli dev wifi output, served to callers passing max_age
+        self.visible_cache = ScanCache()
 
     @staticmethod
     def _command_runner(shell_commands: list) -> str:
@@ -40,101 +135,406 @@ class WifiPasswordsLinux:
         Takes the command to execute as a subprocess in the form of a list.\n
         Returns the string output as a utf-8 decoded output.\n
         """
-        return_data = subprocess.run(
-            shell_commands,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE,
+        return run_command(
+            shell_commands, stderr=subprocess.PIPE, stdin=subprocess.PIPE
         ).stdout.decode("utf-8")
-        return return_data
-
-    def _get_password_subthread(self, network):
-        # network is a tuple from the networks dictionary
-        # values are (ssid, value dictionary)
-        profile_info = self._command_runner(
-            [
-                "nmcli",
-                "-t",
-                "-f",
-                "802-11-wireless-security.key-mgmt,802-11-wireless-security.psk,connection.metered,802-11-wireless.cloned-mac-address",
-                "c",
-                "s",
-                network[0],
-                "--show-secrets",
-            ]
-        ).split("\n")
-
-        network[1]["auth"] = "Open"
-        network[1]["psk"] = ""
-        network[1]["metered"] = False
-        network[1]["macrandom"] = "Disabled"
-
-        for row in profile_info:
-            if "802-11-wireless-security.key-mgmt" in row:
-                network[1]["auth"] = row.split(":")[1]
-            if "802-11-wireless-security.psk" in row:
-                network[1]["psk"] = row.split(":")[1]
-            if "connection.metered" in row:
-                if "yes" in row.split(":")[1]:
-                    network[1]["metered"] = True
-            if "802-11-wireless.cloned-mac-address" in row:
-                if row.split(":")[1] != "":
-                    network[1]["macrandom"] = row.split(":")[1]
-        return network
 
-    def get_passwords(self) -> dict:
+    @staticmethod
+    def _split_terse(row: str) -> list:
+        """
+        Splits a row of nmcli terse (-t) output into its fields.\n
+        Handles the escaped \\: and \\\\ that nmcli uses in names and values.\n
+        """
+        fields = []
+        current = []
+        escaped = False
+        for char in row:
+            if escaped:
+                current.append(char)
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == ":":
+                fields.append("".join(current))
+                current = []
+            else:
+                current.append(char)
+        fields.append("".join(current))
+        return fields
+
+    def _parse_profile_batch(self, profile_info: str) -> dict:
+        """
+        Parses the combined terse output of nmcli c s for one or more connections.\n
+        Each record starts at its connection.id row.\n
+        Returns a dictionary of connection id: network dictionary.\n
+        """
+        results = {}
+        network = None
+        for row in profile_info.split("\n"):
+            if row == "":
+                continue
+            field = self._split_terse(row)
+            if len(field) < 2:
+                continue
+            key, value = field[0], ":".join(field[1:])
+            if key == "connection.id":
+                network = self.net_template.copy()
+                network["auth"] = "Open"
+                results[value] = network
+            elif network is None:
+                continue
+            elif key == "802-11-wireless-security.key-mgmt":
+                network["auth"] = value
+            elif key == "802-11-wireless-security.psk":
+                network["psk"] = value
+            elif key == "connection.metered":
+                if "yes" in value:
+                    network["metered"] = True
+            elif key == "802-11-wireless.cloned-mac-address":
+                if value != "":
+                    network["macrandom"] = value
+        return results
+
+    def _profile_batch_command(self, names: list) -> list:
+        # nmcli accepts repeated id arguments so a whole batch of profiles
+        # is fetched with a single subprocess
+        shell_commands = [
+            "nmcli",
+            "-t",
+            "-f",
+            "connection.id,802-11-wireless-security.key-mgmt,802-11-wireless-security.psk,connection.metered,802-11-wireless.cloned-mac-address",
+            "c",
+            "s",
+        ]
+        for name in names:
+            shell_commands.extend(["id", name])
+        shell_commands.append("--show-secrets")
+        return shell_commands
+
+    def _get_password_batch(self, names: list) -> list:
+        # names is a list of connection ids
+        results = self._parse_profile_batch(
+            self._command_runner(self._profile_batch_command(names))
+        )
+
+        # nmcli fails the whole call if any id is unknown, retry those one at a time
+        missing = [name for name in names if name not in results]
+        if len(names) > 1:
+            for name in missing:
+                results.update(self._get_password_batch([name]))
+        else:
+            for name in missing:
+                network = self.net_template.copy()
+                network["auth"] = "Open"
+                results[name] = network
+        return [(name, results[name]) for name in names]
+
+    async def _get_password_batch_async(self, names: list, command_runner) -> list:
+        import asyncio
+
+        results = self._parse_profile_batch(
+            await command_runner(self._profile_batch_command(names))
+        )
+
+        missing = [name for name in names if name not in results]
+        if len(names) > 1:
+            retries = await asyncio.gather(
+                *[self._get_password_batch_async([name], command_runner) for name in missing]
+            )
+            for batch in retries:
+                results.update(batch)
+        else:
+            for name in missing:
+                network = self.net_template.copy()
+                network["auth"] = "Open"
+                results[name] = network
+        return [(name, results[name]) for name in names]
+
+    def _parse_profile_names(self, profiles_list: str) -> list:
+        """
+        Returns the wifi connection ids from nmcli NAME,TYPE terse output.\n
+        """
+        return [
+            self._split_terse(row)[0]
+            for row in profiles_list.split("\n")
+            if "802-11-wireless" in row
+        ]
+
+    def _batches(self, names: list) -> list:
+        return [names[i : i + self.batch_size] for i in range(0, len(names), self.batch_size)]
+
+    def _profiles_version(self) -> tuple:
+        """
+        Returns the mtimes of the profile files, used to validate the profile cache.\n
+        Only stat calls are made so this is much cheaper than forking nmcli.\n
+        """
+        version = []
+        for path in (self.nm_path, self.wpa_supplicant_file_path):
+            try:
+                version.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                version.append((path, None))
+        # keyfiles are normally replaced by rename which updates the directory mtime,
+        # also check the files themselves in case they were edited in place
+        try:
+            with os.scandir(self.nm_path) as entries:
+                version.extend(
+                    (entry.name, entry.stat().st_mtime_ns)
+                    for entry in entries
+                    if entry.is_file()
+                )
+        except OSError:
+            pass
+        return tuple(sorted(version, key=str))
+
+    @staticmethod
+    def _keyfile_unescape(value: str) -> str:
+        """
+        Reverses the GKeyFile escaping used by NetworkManager keyfiles.\n
+        """
+        escapes = {"s": " ", "n": "\n", "t": "\t", "r": "\r", "\\": "\\"}
+        return re.sub(r"\\(.)", lambda m: escapes.get(m.group(1), m.group(0)), value)
+
+    def _parse_nm_keyfile(self, file_path: str):
+        """
+        Parses a single NetworkManager keyfile (.nmconnection).\n
+        Returns a tuple of (connection id, network dictionary) or None if not a wifi profile.\n
+        Raises OSError if the file can't be read.\n
+        """
+        keyfile = configparser.ConfigParser(interpolation=None, strict=False)
+        with open(file_path, "r", encoding="utf-8", errors="replace") as fin:
+            keyfile.read_file(fin)
+
+        if keyfile.get("connection", "type", fallback="") not in ("wifi", "802-11-wireless"):
+            return None
+
+        name = self._keyfile_unescape(
+            keyfile.get("connection", "id", fallback=os.path.basename(file_path))
+        )
+        if name.endswith(".nmconnection"):
+            name = name[: -len(".nmconnection")]
+
+        network = self.net_template.copy()
+        network["auth"] = "Open"
+        if keyfile.has_section("wifi-security"):
+            network["auth"] = keyfile.get("wifi-security", "key-mgmt", fallback="Open")
+            network["psk"] = self._keyfile_unescape(
+                keyfile.get("wifi-security", "psk", fallback="")
+            )
+        # keyfiles store metered as the NMMetered enum value, 1 is yes
+        if keyfile.get("connection", "metered", fallback="").lower() in ("1", "yes", "true"):
+            network["metered"] = True
+        mac_address = keyfile.get("wifi", "cloned-mac-address", fallback="")
+        if mac_address != "":
+            network["macrandom"] = mac_address
+        return name, network
+
+    def _read_keyfiles(self) -> dict:
+        """
+        Reads the wifi profiles from the keyfiles under nm_path without calling nmcli.\n
+        Returns a dictionary of connection id: network, unreadable files are skipped.\n
+        """
+        results = {}
+        try:
+            entries = sorted(os.scandir(self.nm_path), key=lambda entry: entry.name)
+        except OSError:
+            return results
+
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            try:
+                network = self._parse_nm_keyfile(entry.path)
+            except (OSError, configparser.Error):
+                continue
+            if network is not None:
+                results[network[0]] = network[1]
+        return results
+
+    def _missing_profile_names(self, profiles_list: str, results: dict) -> list:
+        """
+        Returns the wifi connection ids listed by nmcli that weren't read from a keyfile.\n
+        NetworkManager also loads profiles from ifcfg-rh, /run and /usr/lib, and keyfiles
+        can be unreadable, so the nmcli list is always checked for the remainder.\n
+        """
+        return [name for name in self._parse_profile_names(profiles_list) if name not in results]
+
+    @staticmethod
+    def _printf_unescape(value: str) -> str:
+        """
+        Decodes the escapes in a wpa_supplicant P"..." string.\n
+        """
+        escapes = {"n": b"\n", "r": b"\r", "t": b"\t", "e": b"\x1b", "\\": b"\\", '"': b'"'}
+        decoded = bytearray()
+        i = 0
+        while i < len(value):
+            char = value[i]
+            if char == "\\" and i + 1 < len(value):
+                i += 1
+                char = value[i]
+                if char == "x" and i + 2 < len(value):
+                    try:
+                        decoded.append(int(value[i + 1 : i + 3], 16))
+                        i += 3
+                        continue
+                    except ValueError:
+                        pass
+                decoded += escapes.get(char, char.encode("utf-8"))
+            else:
+                decoded += char.encode("utf-8")
+            i += 1
+        return decoded.decode("utf-8", "replace")
+
+    @classmethod
+    def _wpa_ssid(cls, value: str):
+        """
+        Decodes a wpa_supplicant ssid value, returns None if it isn't valid.\n
+        ssids are "quoted text", P"printf escaped text" or unquoted hex bytes.\n
+        """
+        if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+            return value[1:-1]
+        if len(value) >= 3 and value[:2] == 'P"' and value[-1] == '"':
+            return cls._printf_unescape(value[2:-1])
+        try:
+            return bytes.fromhex(value).decode("utf-8", "replace")
+        except ValueError:
+            return None
+
+    @classmethod
+    def _parse_wpa_supplicant(cls, file_string: str) -> dict:
+        """
+        Parses the networks in a wpa_supplicant.conf file in a single pass.\n
+        Returns a dictionary of ssid: NetworkProfile, the last block wins for repeated ssids.\n
+        """
+        results = {}
+        block = None
+        for line in file_string.splitlines():
+            line = line.strip()
+            if block is None:
+                if line.startswith("network") and line.replace(" ", "") == "network={":
+                    block = {}
+                continue
+            if line == "}":
+                ssid = cls._wpa_ssid(block["ssid"]) if "ssid" in block else None
+                if ssid is not None:
+                    # wpa_supplicant defaults to WPA-PSK when key_mgmt isn't given
+                    auth = block.get("key_mgmt", "WPA-PSK")
+                    if auth.upper() == "NONE":
+                        auth = "Open"
+                    psk = block.get("psk", "")
+                    # unquoted psks are the 64 hex digit derived key, kept as is
+                    if len(psk) >= 2 and psk[0] == '"' and psk[-1] == '"':
+                        psk = psk[1:-1]
+                    results[ssid] = NetworkProfile(auth=auth, psk=psk)
+                block = None
+                continue
+            # match whole keys only, so bssid= and scan_ssid= aren't taken for ssid=
+            key, sep, value = line.partition("=")
+            if sep and key in ("ssid", "psk", "key_mgmt"):
+                block[key] = value
+        return results
+
+    def _wpa_supplicant_index(self) -> dict:
+        """
+        Returns the parsed wpa_supplicant.conf networks keyed by ssid.\n
+        The file is only read and parsed again when its mtime, size or inode change.\n
+        """
+        signature = self._file_signature(self.wpa_supplicant_file_path)
+        if signature is None or signature != self._wpa_index[0]:
+            index = self._parse_wpa_supplicant(
+                self._command_runner(["sudo", "cat", self.wpa_supplicant_file_path])
+            )
+            self._wpa_index = (signature, index)
+        return self._wpa_index[1]
+
+    async def _wpa_supplicant_index_async(self, command_runner) -> dict:
+        signature = self._file_signature(self.wpa_supplicant_file_path)
+        if signature is None or signature != self._wpa_index[0]:
+            index = self._parse_wpa_supplicant(
+                await command_runner(["sudo", "cat", self.wpa_supplicant_file_path])
+            )
+            self._wpa_index = (signature, index)
+        return self._wpa_index[1]
+
+    def _iter_passwords(self, ordered: bool = True):
         ## check network manager first, if configured dont check wpa_supplicant file
         # if the path doesn't exist then NetworkManager prob isn't installed/configured.
         if os.path.exists(self.nm_path):
-            profiles_list = self._command_runner(
-                ["nmcli", "-t", "-f", "NAME,TYPE", "c"]
-            ).split("\n")
-            networks = {
-                re.split(r"(?<!\\):", network)[0]: self.net_template.copy()
-                for network in profiles_list
-                if "802-11-wireless" in network
-            }
-            pool = ThreadPool(6)
-            results = dict(pool.imap(self._get_password_subthread, networks.items()))
-            pool.close()
-            pool.join()
+            results = self._read_keyfiles() if self.use_keyfiles else {}
+            yield from results.items()
+
+            # only fetch the profiles that couldn't be read from file through nmcli
+            batches = self._batches(
+                self._missing_profile_names(self._command_runner(self.NMCLI_PROFILES), results)
+            )
+            if batches:
+                from multiprocessing.dummy import Pool as ThreadPool
+
+                # threads wait on the shared concurrency controller, which picks the
+                # number of nmcli calls actually running from the measured latency
+                pool = ThreadPool(controller.pool_size(len(batches)))
+                pool_map = pool.imap if ordered else pool.imap_unordered
+                try:
+                    for batch in pool_map(self._get_password_batch, batches):
+                        yield from batch
+                finally:
+                    pool.close()
+                    pool.join()
 
         ## check wpa_supplicant file, but only if the file exists and no networks were found from networkmanager
         # if network manager is being used there shouldn't be an active wpa_supplicant file
         elif os.path.isfile(self.wpa_supplicant_file_path):
-            results = {}
-            file_string = self._command_runner(["sudo", "cat", self.wpa_supplicant_file_path])
-            network_blocks = re.findall("(?<=network={)[^}]*(?=})", file_string)
-            for network_block in network_blocks:
-                block_stripped = network_block.strip().replace("\t", "").split("\n")
-                ssid = " "
-                auth = " "
-                psk = " "
-                for item in block_stripped:
-                    if "ssid" in item:
-                        ssid = item.split("ssid=")[1][1:-1]
-                    if "key_mgmt" in item:
-                        auth_temp = item.split("key_mgmt=")[1]
-                        if auth_temp.upper() == "NONE":
-                            auth = "Open"
-                        else:
-                            auth = auth_temp
-                    if "psk" in item:
-                        psk = item.split("psk=")[1][1:-1]
-
-                metered = False
-                mac_random = "Disabled"
-                results[ssid] = {
-                    "auth": auth,
-                    "psk": psk,
-                    "metered": metered,
-                    "macrandom": mac_random,
-                }
-        else:
-            results = {}
+            yield from self._wpa_supplicant_index().items()
 
+    def _store_passwords(self, results: dict) -> None:
         self.number_of_profiles = len(results)
         self.data = results
+        self.cache.put_all(results)
+
+    def get_passwords(self) -> dict:
+        results = dict(self._iter_passwords())
+        self._store_passwords(results)
+        return results
+
+    def iter_passwords(self):
+        """
+        Generator yielding (ssid, network dictionary) as each profile fetch completes.\n
+        data is updated once all profiles have been yielded.\n
+        """
+        results = {}
+        for ssid, network in self._iter_passwords(ordered=False):
+            results[ssid] = network
+            yield ssid, network
+        self._store_passwords(results)
+
+    async def get_passwords_async(self, command_runner) -> dict:
+        """
+        asyncio version of get_passwords.\n
+        command_runner is a coroutine function taking the command list and returning stdout.\n
+        """
+        import asyncio
+
+        if os.path.exists(self.nm_path):
+            results = self._read_keyfiles() if self.use_keyfiles else {}
+
+            names = self._missing_profile_names(
+                await command_runner(self.NMCLI_PROFILES), results
+            )
+            batches = await asyncio.gather(
+                *[
+                    self._get_password_batch_async(batch, command_runner)
+                    for batch in self._batches(names)
+                ]
+            )
+            for batch in batches:
+                results.update(batch)
+
+        elif os.path.isfile(self.wpa_supplicant_file_path):
+            results = dict(await self._wpa_supplicant_index_async(command_runner))
+        else:
+            results = {}
+
+        self._store_passwords(results)
         return results
 
     def get_passwords_dummy(self, delay: float = 0.5, quantity: int = 10) -> dict:
@@ -144,21 +544,21 @@ class WifiPasswordsLinux:
 
         sleep(delay)
         data_wpa = {
-            f"network {n}": {
-                "auth": "WPA2-Personal",
-                "psk": f"{token_urlsafe(randint(8,16))}",
-                "metered": choice([True, False]),
-                "macrandom": choice(["Disabled", "Enabled", "Daily"]),
-            }
+            f"network {n}": NetworkProfile(
+                auth="WPA2-Personal",
+                psk=f"{token_urlsafe(randint(8,16))}",
+                metered=choice([True, False]),
+                macrandom=choice(["Disabled", "Enabled", "Daily"]),
+            )
             for n in range(1, int(quantity / 2), 1)
         }
         data_open = {
-            f"open network {n}": {
-                "auth": "Open",
-                "psk": "",
-                "metered": choice([True, False]),
-                "macrandom": choice(["Disabled", "Enabled", "Daily"]),
-            }
+            f"open network {n}": NetworkProfile(
+                auth="Open",
+                psk="",
+                metered=choice([True, False]),
+                macrandom=choice(["Disabled", "Enabled", "Daily"]),
+            )
             for n in range(1, int(quantity / 2), 1)
         }
         data = {**data_wpa, **data_open}
@@ -169,115 +569,330 @@ class WifiPasswordsLinux:
     def get_passwords_data(self) -> dict:
         return self.data
 
-    def get_visible_networks(self, as_dictionary=False) -> str:
+    def _parse_visible_networks(self, visible_list: str, as_dictionary=False):
+        network_dict = {}
+        network_list = []
+
+        for row in visible_list.split("\n"):
+            try:
+                row_split = row.split(":")
+                if row_split[0] == "":
+                    row_split[0] = "Hidden"
+                if as_dictionary:
+                    network_dict[row_split[0]] = VisibleNetwork(
+                        auth=row_split[4],
+                        channel=row_split[1],
+                        signal=row_split[3],
+                        rates=row_split[2],
+                    )
+                else:
+                    network_list.append(
+                        f"{row_split[0]} \n Channel: {row_split[1]} \n Rate: {row_split[2]} \n Signal: {row_split[3]}% \n Security: {row_split[4]} \n"
+                    )
+            except Exception:
+                pass
+        if as_dictionary:
+            self.number_visible_networks = len(network_dict)
+            return network_dict
+        else:
+            self.number_visible_networks = len(network_list)
+            visible_networks = (
+                f"There are {len(network_list)} networks visible."
+                + "\n ----- \n"
+                + "\n".join(network_list)
+            )
+            return visible_networks
+
+    @classmethod
+    def _rescan_mode(cls, max_age):
+        # nmcli --rescan value that can't return a list older than max_age
+        if max_age is None:
+            return None
+        if max_age == float("inf"):
+            return "no"
+        if max_age < cls.NMCLI_AUTO_RESCAN_AGE:
+            return "yes"
+        return "auto"
+
+    def _visible_networks_command(self, rescan: str = None) -> list:
+        if rescan is None:
+            return self.NMCLI_VISIBLE_NETWORKS
+        return self.NMCLI_VISIBLE_NETWORKS + ["list", "--rescan", rescan]
+
+    def _visible_max_age(self, max_age):
+        # while the refresher runs its latest scan is served to callers without a max_age
+        if max_age is None and self.visible_cache.refreshing:
+            return float("inf")
+        return max_age
+
+    def _scan_visible_networks(self, max_age: float = None) -> str:
+        max_age = self._visible_max_age(max_age)
+        command = self._visible_networks_command(self._rescan_mode(max_age))
+        if max_age is None:
+            started = time.monotonic()
+            output = self._command_runner(command)
+            self.visible_cache.put(output, started)
+            return output
+        return self.visible_cache.fetch(max_age, lambda: self._command_runner(command))
+
+    def get_visible_networks(self, as_dictionary=False, max_age: float = None) -> str:
+        """
+        Returns the visible networks as a string, or a dictionary if as_dictionary.\n
+        Arguments:\n
+        - max_age: seconds old a scan may be. A cached scan that is fresh enough is
+          returned without running nmcli, otherwise nmcli is run with --rescan yes if
+          max_age is under NMCLI_AUTO_RESCAN_AGE, auto if not and no if max_age is inf.
+          None always runs nmcli with its default rescan behaviour.\n
+        """
         ## check nmcli first, if doesn't exist return not implemented string
         ##
         if os.path.exists(self.nm_path):
-            network_dict = {}
-            network_list = []
-
-            visible_list = self._command_runner(
-                ["nmcli", "-t", "-f", "SSID,CHAN,RATE,SIGNAL,SECURITY", "dev", "wifi"]
-            ).split("\n")
-            for row in visible_list:
-                try:
-                    row_split = row.split(":")
-                    if row_split[0] == "":
-                        row_split[0] = "Hidden"
-                    if as_dictionary:
-                        network_dict[row_split[0]] = {
-                            "auth": row_split[4],
-                            "channel": row_split[1],
-                            "signal": row_split[3],
-                            "rates": row_split[2],
-                        }
-                    else:
-                        network_list.append(
-                            f"{row_split[0]} \n Channel: {row_split[1]} \n Rate: {row_split[2]} \n Signal: {row_split[3]}% \n Security: {row_split[4]} \n"
-                        )
-                except Exception:
-                    pass
+            return self._parse_visible_networks(
+                self._scan_visible_networks(max_age), as_dictionary
+            )
+        else:
             if as_dictionary:
-                self.number_visible_networks = len(network_dict)
-                return network_dict
+                return {}
             else:
-                self.number_visible_networks = len(network_list)
-                visible_networks = (
-                    f"There are {len(network_list)} networks visible."
-                    + "\n ----- \n"
-                    + "\n".join(network_list)
+                return "Requires NetworkManager."
+
+    async def get_visible_networks_async(
+        self, command_runner, as_dictionary=False, max_age: float = None
+    ) -> str:
+        if os.path.exists(self.nm_path):
+            max_age = self._visible_max_age(max_age)
+            output = None if max_age is None else self.visible_cache.get(max_age)
+            if output is None:
+                started = time.monotonic()
+                output = await command_runner(
+                    self._visible_networks_command(self._rescan_mode(max_age))
                 )
-                return visible_networks
+                self.visible_cache.put(output, started)
+            return self._parse_visible_networks(output, as_dictionary)
         else:
             if as_dictionary:
                 return {}
             else:
                 return "Requires NetworkManager."
 
-    def get_dns_config(self, as_dictionary=False) -> str:
+    def start_scan_refresher(self, interval: float = 10.0, rescan: str = "auto") -> None:
+        """
+        Refreshes the cached scan every interval seconds on a background thread.\n
+        While it runs get_visible_networks() and get_number_visible_networks() answer
+        from the cache unless a max_age older than the cached scan is passed.\n
+        Arguments:\n
+        - rescan: nmcli --rescan value for the refresh, auto leaves rescanning to
+          NetworkManager, yes forces a scan each time.\n
+        """
+        self.visible_cache.start_refresh(
+            interval, lambda: self._command_runner(self._visible_networks_command(rescan))
+        )
+
+    def stop_scan_refresher(self) -> None:
+        """
+        Stops the background refresh started by start_scan_refresher.\n
+        """
+        self.visible_cache.stop_refresh()
+
+    def _parse_visible_bssids(self, visible_list: str) -> list:
+        bssids = []
+        for row in visible_list.split("\n"):
+            fields = self._split_terse(row)
+            if len(fields) < 5 or not fields[0]:
+                continue
+            rate = fields[3].split(" ", 1)[0]
+            try:
+                bssids.append(
+                    (
+                        fields[0].lower(),
+                        fields[1] or "Hidden",
+                        float(fields[4]),
+                        int(fields[2]),
+                        float(rate) if rate else float("nan"),
+                    )
+                )
+            except ValueError:
+                pass
+        return bssids
+
+    def get_visible_bssids(self) -> list:
+        """
+        Returns a (bssid, ssid, signal, channel, rate) tuple for every access point seen.\n
+        signal is the nmcli signal strength in percent, rate in Mbit/s.\n
+        """
+        if os.path.exists(self.nm_path):
+            return self._parse_visible_bssids(self._command_runner(self.NMCLI_VISIBLE_BSSIDS))
+        return []
+
+    async def get_visible_bssids_async(self, command_runner) -> list:
+        if os.path.exists(self.nm_path):
+            return self._parse_visible_bssids(await command_runner(self.NMCLI_VISIBLE_BSSIDS))
+        return []
+
+    def _parse_terse_records(self, output: str, first_key: str) -> list:
+        """
+        Parses multi record nmcli terse output such as device show or c s for many ids.\n
+        Each record starts at its first_key row, indexed keys like IP4.DNS[2] are collected
+        into a list under IP4.DNS.\n
+        """
+        records = []
+        record = None
+        for row in output.split("\n"):
+            field = self._split_terse(row)
+            if len(field) < 2:
+                continue
+            key, value = field[0], ":".join(field[1:])
+            if key == first_key:
+                record = {}
+                records.append(record)
+            elif record is None:
+                continue
+            if key.endswith("]") and "[" in key:
+                record.setdefault(key[: key.index("[")], []).append(value)
+            else:
+                record[key] = value
+        return records
+
+    def _parse_device_dns(self, device_data: str) -> list:
+        """
+        Returns a list of (device, connection, DNS list, suffix) from NMCLI_DEVICE_DNS output.\n
+        """
+        return [
+            (
+                record["GENERAL.DEVICE"],
+                record.get("GENERAL.CONNECTION", ""),
+                [dns for servers in record.get("IP4.DNS", []) for dns in servers.split(",")],
+                record.get("IP4.DOMAIN", [""])[-1],
+            )
+            for record in self._parse_terse_records(device_data, "GENERAL.DEVICE")
+        ]
+
+    @staticmethod
+    def _dns_profile_command(names: list) -> list:
+        shell_commands = ["nmcli", "-t", "-f", "connection.id,ipv4.ignore-auto-dns", "c", "s"]
+        for name in names:
+            shell_commands.extend(["id", name])
+        return shell_commands
+
+    def _get_dns_profile_batch(self, names: list) -> dict:
+        """
+        Returns a dictionary of connection id: ipv4.ignore-auto-dns for a batch of profiles.\n
+        """
+        results = {
+            record["connection.id"]: record.get("ipv4.ignore-auto-dns", "")
+            for record in self._parse_terse_records(
+                self._command_runner(self._dns_profile_command(names)), "connection.id"
+            )
+        }
+        # nmcli fails the whole call if any id is unknown, retry those one at a time
+        if len(names) > 1:
+            for name in names:
+                if name not in results:
+                    results.update(self._get_dns_profile_batch([name]))
+        return results
+
+    async def _get_dns_profile_batch_async(self, names: list, command_runner) -> dict:
+        import asyncio
+
+        results = {
+            record["connection.id"]: record.get("ipv4.ignore-auto-dns", "")
+            for record in self._parse_terse_records(
+                await command_runner(self._dns_profile_command(names)), "connection.id"
+            )
+        }
+        if len(names) > 1:
+            retries = await asyncio.gather(
+                *[
+                    self._get_dns_profile_batch_async([name], command_runner)
+                    for name in names
+                    if name not in results
+                ]
+            )
+            for batch in retries:
+                results.update(batch)
+        return results
+
+    @staticmethod
+    def _dns_connections(devices: list) -> list:
+        # unique connection ids of the devices, disconnected devices have none
+        return list(
+            dict.fromkeys(
+                connection for _, connection, _, _ in devices if connection not in ("", "--")
+            )
+        )
+
+    def _join_dns(self, devices: list, ignore_auto_dns: dict) -> dict:
         dns_dict = {}
+        for device, connection, DNS, suffix in devices:
+            type = "None"
+            if ignore_auto_dns.get(connection) == "yes":
+                type = "Static"
+            elif ignore_auto_dns.get(connection) == "no" and len(DNS) != 0:
+                type = "DHCP"
+            dns_dict[device] = {"type": type, "DNS": DNS, "suffix": suffix}
+        self.number_of_interfaces = len(dns_dict)
+        return dns_dict
+
+    @staticmethod
+    def _format_dns_config(dns_dict: dict, as_dictionary=False):
+        if as_dictionary:
+            return dns_dict
+        else:
+            dns_string = ""
+            for k, v in dns_dict.items():
+                dns_string = (
+                    dns_string
+                    + f"Interface: {k} \n type: {v['type']} \n DNS: {v['DNS']} \n domain: {v['suffix']}"
+                    + "\n"
+                    + "\n"
+                )
+            return dns_string
+
+    def get_dns_config(self, as_dictionary=False) -> str:
         ## uses nmcli - if doesn't exist return error message
         if os.path.exists(self.nm_path):
-            interfaces = self._command_runner(
-                ["nmcli", "-t", "-f", "DEVICE,CONNECTION", "dev"]
-            ).split("\n")
-            for interface in interfaces:
-                # try:
-                if len(interface.split(":")) == 2:
-                    suffix = ""
-                    type = "None"
-                    DNS = []
-                    interface_data = self._command_runner(
-                        [
-                            "nmcli",
-                            "-t",
-                            "-f",
-                            "IP4.DNS,IP4.DOMAIN",
-                            "device",
-                            "show",
-                            interface.split(":")[0],
-                        ]
-                    ).split("\n")
-                    profile_data = self._command_runner(
-                        [
-                            "nmcli",
-                            "-t",
-                            "-f",
-                            "ipv4.dns,ipv4.ignore-auto-dns",
-                            "c",
-                            "s",
-                            interface.split(":")[1],
-                        ]
-                    ).split("\n")
-                    for row in interface_data:
-                        if "IP4.DOMAIN" in row:
-                            suffix = row.split(":")[1]
-                        if "IP4.DNS" in row:
-                            DNS = row.split(":")[1].split(",")
-                    for row in profile_data:
-                        if "ipv4.ignore-auto-dns" in row:
-                            if row.split(":")[1] == "yes":
-                                type = "Static"
-                            elif row.split(":")[1] == "no" and len(DNS) != 0:
-                                type = "DHCP"
-                    dns_dict[interface.split(":")[0]] = {
-                        "type": type,
-                        "DNS": DNS,
-                        "suffix": suffix,
-                    }
+            # one nmcli call for every device, then the profiles in batches
+            devices = self._parse_device_dns(self._command_runner(self.NMCLI_DEVICE_DNS))
+            batches = self._batches(self._dns_connections(devices))
+            ignore_auto_dns = {}
+            if len(batches) > 1:
+                from multiprocessing.dummy import Pool as ThreadPool
 
+                pool = ThreadPool(controller.pool_size(len(batches)))
+                try:
+                    for batch in pool.imap_unordered(self._get_dns_profile_batch, batches):
+                        ignore_auto_dns.update(batch)
+                finally:
+                    pool.close()
+                    pool.join()
+            elif batches:
+                ignore_auto_dns = self._get_dns_profile_batch(batches[0])
+            return self._format_dns_config(
+                self._join_dns(devices, ignore_auto_dns), as_dictionary
+            )
+
+        else:
             if as_dictionary:
-                return dns_dict
+                return {}
             else:
-                dns_string = ""
-                for k, v in dns_dict.items():
-                    dns_string = (
-                        dns_string
-                        + f"Interface: {k} \n type: {v['type']} \n DNS: {v['DNS']} \n domain: {v['suffix']}"
-                        + "\n"
-                        + "\n"
-                    )
-                return dns_string
+                return "Requires NetworkManager"
+
+    async def get_dns_config_async(self, command_runner, as_dictionary=False) -> str:
+        import asyncio
+
+        if os.path.exists(self.nm_path):
+            devices = self._parse_device_dns(await command_runner(self.NMCLI_DEVICE_DNS))
+            ignore_auto_dns = {}
+            for batch in await asyncio.gather(
+                *[
+                    self._get_dns_profile_batch_async(names, command_runner)
+                    for names in self._batches(self._dns_connections(devices))
+                ]
+            ):
+                ignore_auto_dns.update(batch)
+            return self._format_dns_config(
+                self._join_dns(devices, ignore_auto_dns), as_dictionary
+            )
 
         else:
             if as_dictionary:
@@ -286,54 +901,37 @@ class WifiPasswordsLinux:
                 return "Requires NetworkManager"
 
     def save_wpa_supplicant(
-        self, path: str, data: dict = None, include_open: bool = True, locale: str = "GB"
-    ) -> None:
-        from datetime import datetime
-        from platform import uname
-
+        self,
+        path: str,
+        data: dict = None,
+        include_open: bool = True,
+        locale: str = "GB",
+        precompute_psk: bool = False,
+        psk_cache: bool = True,
+        since=None,
+    ):
         if data is None:
             data = self.data
 
-        with open(os.path.join(path), "w", newline="\n") as fout:
-            fout.write(f"# Generated by wifipasswords {__version__}\n")
-            fout.write(f"# Created: {datetime.today()}\n")
-            fout.write(f"# Device: {uname().system} {uname().version} - {uname().node}\n")
-            fout.write(f"# Detected country code: {locale}\n")
-            fout.write("\n")
-            fout.write("ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev\n")
-            fout.write("update_config=1\n")
-            fout.write(f"country={locale}\n")
-            fout.write("\n")
-            fout.write("# ######## WPA ########\n")
-            for key, n in data.items():
-                if n["auth"] == "WPA2-Personal" or n["auth"].lower() == "wpa-psk":
-                    fout.write("network={\n")
-                    fout.write('\tssid="{}"\n'.format(key))
-                    fout.write('\tpsk="{}"\n'.format(n["psk"]))
-                    fout.write("\tkey_mgmt=WPA-PSK\n")
-                    fout.write('\tid_str="{}"\n'.format(key))
-                    fout.write("}\n")
-            fout.write("\n")
-            if include_open:
-                fout.write("# ######## OPEN ########\n")
-                for key, n in data.items():
-                    if n["auth"] == "" or n["auth"] == "Open":
-                        fout.write("network={\n")
-                        fout.write('\tssid="{}"\n'.format(key))
-                        fout.write("\tkey_mgmt=NONE\n")
-                        fout.write('\tid_str="{}"\n'.format(key))
-                        fout.write("\tpriority=-999\n")
-                        fout.write("}\n")
-
-    def save_json(self, path: str, data: dict = None) -> None:
+        return export.save_wpa_supplicant(
+            path, data, include_open, locale, precompute_psk, psk_cache, since
+        )
+
+    def save_json(
+        self,
+        path: str,
+        data: dict = None,
+        ndjson: bool = False,
+        fsync: bool = True,
+        since=None,
+    ):
         if data is None:
             data = self.data
 
-        with open(os.path.join(path), "w") as fout:
-            json.dump(data, fout)
+        return export.save_json(path, data, ndjson, fsync, since)
 
-    def get_number_visible_networks(self) -> int:
-        self.get_visible_networks()
+    def get_number_visible_networks(self, max_age: float = None) -> int:
+        self.get_visible_networks(max_age=max_age)
         return self.number_visible_networks
 
     def get_number_interfaces(self) -> int:
@@ -341,34 +939,70 @@ class WifiPasswordsLinux:
         return self.number_of_interfaces
 
     def get_number_profiles(self) -> int:
-        if self.number_of_profiles == 0:
+        # the cache holds every profile after get_passwords until the files change
+        cached = self.cache.get_all()
+        if cached is not None:
+            self.number_of_profiles = len(cached)
+        elif self.number_of_profiles == 0:
             self.get_passwords()
         return self.number_of_profiles
 
-    def get_currently_connected_ssids(self) -> list:
+    @staticmethod
+    def _parse_connected_ssids(connected_data: str, nmcli: bool = True) -> list:
+        """
+        Parses nmcli -t d output, or iwgetid -r output if nmcli is False.\n
+        """
         connected_ssids = []
+        for row in connected_data.split("\n"):
+            try:
+                if nmcli:
+                    if row.split(":")[1] == "wifi" and row.split(":")[2] == "connected":
+                        connected_ssids.append(row.split(":")[3])
+                elif row != "":
+                    connected_ssids.append(row)
+            except Exception:
+                pass
+        return connected_ssids
 
+    def get_currently_connected_ssids(self) -> list:
         # check if network manager is installed by checking config path, else use iwgetid
         if os.path.exists(self.nm_path):
-            connected_data = self._command_runner(["nmcli", "-t", "d"]).split("\n")
-            for row in connected_data:
-                try:
-                    if row.split(":")[1] == "wifi" and row.split(":")[2] == "connected":
-                        connected_ssids.append(row.split(":")[3])
-                except Exception:
-                    pass
+            return self._parse_connected_ssids(self._command_runner(["nmcli", "-t", "d"]))
 
         # if there is no nmcli, use iwgetid -r
         else:
-            connected_data = self._command_runner(["iwgetid", "-r"]).split("\n")
-            for row in connected_data:
-                try:
-                    if row != "":
-                        connected_ssids.append(row)
-                except Exception:
-                    pass
+            return self._parse_connected_ssids(self._command_runner(["iwgetid", "-r"]), False)
 
-        return connected_ssids
+    async def get_currently_connected_ssids_async(self, command_runner) -> list:
+        if os.path.exists(self.nm_path):
+            return self._parse_connected_ssids(await command_runner(["nmcli", "-t", "d"]))
+        else:
+            return self._parse_connected_ssids(await command_runner(["iwgetid", "-r"]), False)
+
+    @staticmethod
+    def _psk_command(ssid: str) -> list:
+        return [
+            "nmcli",
+            "-t",
+            "-f",
+            "802-11-wireless-security.psk,connection.id",
+            "c",
+            "s",
+            ssid,
+            "--show-secrets",
+        ]
+
+    @staticmethod
+    def _parse_psk(key_content: str) -> str:
+        psk = ""
+        for row in key_content.split("\n"):
+            if "802-11-wireless-security.psk" in row:
+                psk = row.split(":")[1]
+        return psk
+
+    @staticmethod
+    def _wpa_connected(index: dict, connected_ssids: list) -> list:
+        return [(ssid, index[ssid]["psk"]) for ssid in connected_ssids if ssid in index]
 
     def get_currently_connected_passwords(self) -> list:
         """
@@ -379,75 +1013,64 @@ class WifiPasswordsLinux:
 
         if os.path.exists(self.nm_path):
             for ssid in connected_ssids:
-                psk = ""
-                key_content = self._command_runner(
-                    [
-                        "nmcli",
-                        "-t",
-                        "-f",
-                        "802-11-wireless-security.psk",
-                        "c",
-                        "s",
-                        ssid,
-                        "--show-secrets",
-                    ]
-                )
-                if key_content != "":
-                    for row in key_content.split("\n"):
-                        if "802-11-wireless-security.psk" in row:
-                            psk = row.split(":")[1]
-                    connected_passwords.append((ssid, psk))
+                try:
+                    connected_passwords.append((ssid, self.get_single_password(ssid)))
+                except ValueError:
+                    pass
 
         elif os.path.isfile(self.wpa_supplicant_file_path):
-            file_string = self._command_runner(["sudo", "cat", self.wpa_supplicant_file_path])
-            network_blocks = re.findall("(?<=network=)[^}]*(?=})", file_string)
+            connected_passwords = self._wpa_connected(
+                self._wpa_supplicant_index(), connected_ssids
+            )
 
-            # if matching a connected ssid
-            matched_blocks = [
-                net for net in network_blocks if any(xs in net for xs in connected_ssids)
-            ]
+        return connected_passwords
 
-            for network_block in matched_blocks:
-                block_stripped = (
-                    network_block.strip().replace("\t", "").replace("\n", " ").split(" ")
-                )
-                ssid = ""
-                psk = ""
-                for row in block_stripped:
-                    if "ssid" in row:
-                        ssid = row.split("ssid=")[1][1:-1]
-                    if "psk" in row:
-                        psk = row.split("psk=")[1][1:-1]
-                connected_passwords.append((ssid, psk))
+    async def get_currently_connected_passwords_async(self, command_runner) -> list:
+        import asyncio
+
+        connected_passwords = []
+        connected_ssids = await self.get_currently_connected_ssids_async(command_runner)
+
+        if os.path.exists(self.nm_path):
+            psks = await asyncio.gather(
+                *[
+                    self.get_single_password_async(command_runner, ssid)
+                    for ssid in connected_ssids
+                ],
+                return_exceptions=True,
+            )
+            for ssid, psk in zip(connected_ssids, psks):
+                if not isinstance(psk, ValueError):
+                    connected_passwords.append((ssid, psk))
+
+        elif os.path.isfile(self.wpa_supplicant_file_path):
+            connected_passwords = self._wpa_connected(
+                await self._wpa_supplicant_index_async(command_runner), connected_ssids
+            )
 
         return connected_passwords
 
     def get_known_ssids(self) -> list:
-        ssids = []
         ## check network manager first, if configured dont check wpa_supplicant file
         # if the path doesn't exist then NetworkManager prob isn't installed/configured.
         if os.path.exists(self.nm_path):
-            profiles_list = self._command_runner(
-                ["nmcli", "-t", "-f", "NAME,TYPE", "c"]
-            ).split("\n")
-            ssids = [
-                re.split(r"(?<!\\):", ssid)[0]
-                for ssid in profiles_list
-                if "802-11-wireless" in ssid
-            ]
+            ssids = self._parse_profile_names(self._command_runner(self.NMCLI_PROFILES))
 
         ## check wpa_supplicant file, but only if the file exists and no networks were found from networkmanager
         # if network manager is being used there shouldn't be an active wpa_supplicant file
         elif os.path.isfile(self.wpa_supplicant_file_path):
-            file_string = self._command_runner(["sudo", "cat", self.wpa_supplicant_file_path])
-            network_blocks = re.findall("(?<=network={)[^}]*(?=})", file_string)
-            for network_block in network_blocks:
-                block_stripped = network_block.strip().replace("\t", "").split("\n")
-                ssid = " "
-                for item in block_stripped:
-                    if "ssid" in item:
-                        ssid = item.split("ssid=")[1][1:-1]
-                ssids.append(ssid)
+            ssids = list(self._wpa_supplicant_index())
+        else:
+            ssids = []
+
+        self.number_of_profiles = len(ssids)
+        return ssids
+
+    async def get_known_ssids_async(self, command_runner) -> list:
+        if os.path.exists(self.nm_path):
+            ssids = self._parse_profile_names(await command_runner(self.NMCLI_PROFILES))
+        elif os.path.isfile(self.wpa_supplicant_file_path):
+            ssids = list(await self._wpa_supplicant_index_async(command_runner))
         else:
             ssids = []
 
@@ -455,44 +1078,193 @@ class WifiPasswordsLinux:
         return ssids
 
     def get_single_password(self, ssid) -> str:
+        psk = self.cache.get_psk(ssid)
+        if psk is not None:
+            return psk
+
         psk = ""
         found = False
         if os.path.exists(self.nm_path):
-            key_content = self._command_runner(
-                [
-                    "nmcli",
-                    "-t",
-                    "-f",
-                    "802-11-wireless-security.psk,connection.id",
-                    "c",
-                    "s",
-                    ssid,
-                    "--show-secrets",
-                ]
-            )
+            key_content = self._command_runner(self._psk_command(ssid))
             if key_content == "":
+                self.cache.put_missing(ssid)
                 raise ValueError("SSID not known.")
-            else:
+            found = True
+            psk = self._parse_psk(key_content)
+
+        elif os.path.isfile(self.wpa_supplicant_file_path):
+            network = self._wpa_supplicant_index().get(ssid)
+            if network is not None:
                 found = True
+                psk = network["psk"]
 
-            for row in key_content.split("\n"):
-                if "802-11-wireless-security.psk" in row:
-                    psk = row.split(":")[1]
+        if found:
+            self.cache.put(ssid, {"psk": psk})
+            return psk
+        else:
+            self.cache.put_missing(ssid)
+            raise ValueError("SSID not known.")
+
+    async def get_single_password_async(self, command_runner, ssid) -> str:
+        psk = self.cache.get_psk(ssid)
+        if psk is not None:
+            return psk
+
+        psk = ""
+        found = False
+        if os.path.exists(self.nm_path):
+            key_content = await command_runner(self._psk_command(ssid))
+            if key_content == "":
+                self.cache.put_missing(ssid)
+                raise ValueError("SSID not known.")
+            found = True
+            psk = self._parse_psk(key_content)
 
         elif os.path.isfile(self.wpa_supplicant_file_path):
-            file_string = self._command_runner(["sudo", "cat", self.wpa_supplicant_file_path])
-            network_blocks = re.findall("(?<=network=)[^}]*(?=})", file_string)
-
-            for network_block in network_blocks:
-                if ssid in network_block:
-                    found = True
-                    stripped_block = (
-                        network_block.strip().replace("\t", "").replace("\n", " ").split(" ")
-                    )
-                    for row in stripped_block:
-                        if "psk" in row:
-                            psk = row.split("psk=")[1][1:-1]
+            network = (await self._wpa_supplicant_index_async(command_runner)).get(ssid)
+            if network is not None:
+                found = True
+                psk = network["psk"]
+
         if found:
+            self.cache.put(ssid, {"psk": psk})
             return psk
         else:
+            self.cache.put_missing(ssid)
             raise ValueError("SSID not known.")
+
+    @staticmethod
+    def _file_signature(path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _scan_keyfiles(self):
+        """
+        Returns a dictionary of keyfile name: signature, or None if nm_path can't be listed.\n
+        """
+        try:
+            with os.scandir(self.nm_path) as entries:
+                return {
+                    entry.name: self._file_signature(entry.path)
+                    for entry in entries
+                    if entry.is_file()
+                }
+        except OSError:
+            return None
+
+    def _read_watched_keyfile(self, file_name: str):
+        try:
+            return self._parse_nm_keyfile(os.path.join(self.nm_path, file_name))
+        except (OSError, configparser.Error):
+            return None
+
+    def _read_watched_wpa_supplicant(self) -> dict:
+        if not os.path.isfile(self.wpa_supplicant_file_path):
+            return {}
+        return self._wpa_supplicant_index()
+
+    @staticmethod
+    def _diff_networks(old: dict, new: dict) -> list:
+        events = []
+        for name, record in new.items():
+            if name not in old:
+                events.append(("added", name, record))
+            elif old[name] != record:
+                events.append(("modified", name, record))
+        for name in old:
+            if name not in new:
+                events.append(("deleted", name, None))
+        return events
+
+    def watch(
+        self, timeout: float = None, poll_interval: float = 1.0, use_inotify: bool = True
+    ):
+        """
+        Generator yielding saved profile changes as (event, name, record) tuples.\n
+        event is "added", "modified" or "deleted", record is None for deleted.\n
+        Watches the keyfiles under nm_path and the wpa_supplicant file using inotify
+        and only re-parses the files that changed. Polls every poll_interval seconds
+        where inotify is unavailable.\n
+        Arguments:\n
+        - timeout: seconds to watch for, None to watch until the generator is closed.\n
+        - poll_interval: seconds between checks when polling.\n
+        - use_inotify: set False to always poll.\n
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # keyfile name: (signature, (connection id, record) or None)
+        keyfiles = {}
+        signatures = self._scan_keyfiles()
+        for file_name, signature in (signatures or {}).items():
+            keyfiles[file_name] = (signature, self._read_watched_keyfile(file_name))
+        # if the keyfiles can't be read fall back to nmcli whenever the directory changes
+        nm_signature = self._file_signature(self.nm_path)
+        nm_networks = self.get_passwords() if signatures is None and nm_signature else {}
+        wpa_signature = self._file_signature(self.wpa_supplicant_file_path)
+        wpa_networks = self._read_watched_wpa_supplicant()
+
+        inotify = None
+        if use_inotify:
+            try:
+                inotify = _Inotify(
+                    [self.nm_path, os.path.dirname(self.wpa_supplicant_file_path)]
+                )
+            except OSError:
+                inotify = None
+
+        try:
+            while True:
+                wait = poll_interval
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return
+                if inotify is not None:
+                    # the poll interval still applies in case a watch was missed
+                    inotify.wait(wait)
+                else:
+                    time.sleep(wait)
+
+                new_signatures = self._scan_keyfiles()
+                if new_signatures is not None:
+                    old = {}
+                    new = {}
+                    for file_name in set(keyfiles) | set(new_signatures):
+                        previous = keyfiles.get(file_name, (None, None))
+                        signature = new_signatures.get(file_name)
+                        if signature == previous[0]:
+                            continue
+                        network = None
+                        if signature is not None:
+                            network = self._read_watched_keyfile(file_name)
+                            keyfiles[file_name] = (signature, network)
+                        else:
+                            del keyfiles[file_name]
+                        if previous[1] is not None:
+                            old[previous[1][0]] = previous[1][1]
+                        if network is not None:
+                            new[network[0]] = network[1]
+                    for event in self._diff_networks(old, new):
+                        yield event
+                else:
+                    signature = self._file_signature(self.nm_path)
+                    if signature != nm_signature:
+                        nm_signature = signature
+                        networks = self.get_passwords() if signature else {}
+                        for event in self._diff_networks(nm_networks, networks):
+                            yield event
+                        nm_networks = networks
+
+                signature = self._file_signature(self.wpa_supplicant_file_path)
+                if signature != wpa_signature:
+                    wpa_signature = signature
+                    networks = self._read_watched_wpa_supplicant()
+                    for event in self._diff_networks(wpa_networks, networks):
+                        yield event
+                    wpa_networks = networks
+        finally:
+            if inotify is not None:
+                inotify.close()
@@ -15,21 +15,28 @@ __copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
 # along with this program.  If not, see < https: // www.gnu.org/licenses/>.
 
 import subprocess
-import os
-import json
 import re
 
-from . import __version__
+from .cache import ProfileCache
+from .concurrency import controller
+from .keychain import iter_airport_passwords
+from .metrics import run_command
+from . import export
+from .records import NetworkProfile, VisibleNetwork
 
 
 class WifiPasswordsMacos:
-    def __init__(self) -> None:
+    def __init__(self, use_dump: bool = False) -> None:
         self.airport = "/System/Library/PrivateFrameworks/Apple80211.framework/Versions/Current/Resources/airport"
         self.data = {}
         self.number_of_profiles = 0
         self.number_visible_networks = 0
         self.number_of_interfaces = 0
-        self.net_template = {"auth": "", "psk": "", "metered": False, "macrandom": "Disabled"}
+        self.net_template = NetworkProfile()
+        # keychain reads prompt for authentication so cached profiles save prompts too
+        self.cache = ProfileCache(ttl=60.0)
+        # read secrets from a single security dump-keychain -d instead of one call per SSID
+        self.use_dump = use_dump
 
     @staticmethod
     def _command_runner(shell_commands: list) -> str:
@@ -38,48 +45,90 @@ class WifiPasswordsMacos:
         Takes the command to execute as a subprocess in the form of a list.\n
         Returns the string output as a utf-8 decoded output.\n
         """
-        return_data = subprocess.run(shell_commands, stdout=subprocess.PIPE).stdout.decode(
-            "utf-8"
+        return run_command(shell_commands).stdout.decode("utf-8")
+
+    @staticmethod
+    def _parse_keychain_ssids(keychain_dump: str) -> list:
+        # keychain items with "desc"<blob>="AirPort network password", ssid is the "acct"
+        return [ssid for ssid, _ in iter_airport_passwords(keychain_dump.splitlines())]
+
+    @staticmethod
+    def _password_command(ssid: str) -> list:
+        return ["security", "find-generic-password", "-a", ssid, "-w"]
+
+    def _dump_command(self) -> list:
+        return (
+            ["security", "dump-keychain", "-d"]
+            if self.use_dump
+            else ["security", "dump-keychain"]
         )
-        return return_data
+
+    def _get_password(self, ssid: str) -> tuple:
+        return ssid, NetworkProfile(
+            psk=self._command_runner(self._password_command(ssid)).strip()
+        )
+
+    def _iter_passwords(self):
+        # one keychain dump lists the wifi items, with their secrets if use_dump
+        keychain_items = list(
+            iter_airport_passwords(self._command_runner(self._dump_command()).splitlines())
+        )
+        missing = [ssid for ssid, psk in keychain_items if psk is None]
+        fetched = {}
+        if missing:
+            from multiprocessing.dummy import Pool as ThreadPool
+
+            # per SSID find-generic-password only for items the dump had no secret for,
+            # the shared concurrency controller bounds the calls actually running
+            pool = ThreadPool(controller.pool_size(len(missing)))
+            try:
+                fetched = dict(pool.map(self._get_password, missing))
+            finally:
+                pool.close()
+                pool.join()
+
+        # need to find way of getting metered and mac randomisation - is this defined per network on mac?
+        for ssid, psk in keychain_items:
+            yield ssid, fetched[ssid] if psk is None else NetworkProfile(psk=psk.strip())
 
     # DONE -> not fully tested
     # ?threading ?mac randomisation ?metered
     # prompts for escalation for every password
     def get_passwords(self) -> dict:
-        # dump the keychain (without secrets) to get lists of keychain entries, split as items by attributes
-        # then filter the keychain items to find those with "desc"<blob>="AirPort network password"
-        keychain_ssids = []
-        results = {}
-
-        keychain_dump = self._command_runner(["security", "dump-keychain"])
-        keychain_items = [
-            keychain_item.split("\n")
-            for keychain_item in keychain_dump.split("attributes:")
-            if "AirPort network password" in keychain_item
-        ]
+        results = dict(self._iter_passwords())
+        self.cache.put_all(results)
+        return results
 
-        for item in keychain_items:
-            for row in item:
-                if '"acct"<blob>=' in row:
-                    # blob = row.split('"acct"<blob>')[1:-1]
-                    blob = row.split('"acct"<blob>=')[1]
-                    if blob.startswith("0x"):
-                        # hex encoded due to unprintable chars - take as bytes and decode
-                        stripped_blob = blob.split("  ")[0]
-                        ssid = bytes.fromhex(stripped_blob[2:]).decode("utf-8")
-                    else:
-                        # string encoded, just remove 2 quotes.
-                        ssid = blob[1:-1]
-                    keychain_ssids.append(ssid)
+    def iter_passwords(self):
+        """
+        Generator yielding (ssid, network dictionary) as each profile fetch completes.\n
+        """
+        results = {}
+        for ssid, network in self._iter_passwords():
+            results[ssid] = network
+            yield ssid, network
+        self.cache.put_all(results)
 
-        # need to find way of getting metered and mac randomisation - is this defined per network on mac?
-        for ssid in keychain_ssids:
-            psk = self._command_runner(
-                ["security", "find-generic-password", "-a", ssid, "-w"]
-            ).strip()
-            results[ssid] = {"auth": "", "psk": psk, "metered": False, "macrandom": "Disabled"}
+    async def get_passwords_async(self, command_runner) -> dict:
+        """
+        asyncio version of get_passwords.\n
+        command_runner is a coroutine function taking the command list and returning stdout.\n
+        """
+        import asyncio
 
+        keychain_items = list(
+            iter_airport_passwords((await command_runner(self._dump_command())).splitlines())
+        )
+        missing = [ssid for ssid, psk in keychain_items if psk is None]
+        psks = await asyncio.gather(
+            *[command_runner(self._password_command(ssid)) for ssid in missing]
+        )
+        fetched = dict(zip(missing, psks))
+        results = {
+            ssid: NetworkProfile(psk=(fetched[ssid] if psk is None else psk).strip())
+            for ssid, psk in keychain_items
+        }
+        self.cache.put_all(results)
         return results
 
     def get_passwords_dummy(self, delay: float = 0.5, quantity: int = 10) -> dict:
@@ -89,21 +138,21 @@ class WifiPasswordsMacos:
 
         sleep(delay)
         data_wpa = {
-            f"network {n}": {
-                "auth": "WPA2-Personal",
-                "psk": f"{token_urlsafe(randint(8,16))}",
-                "metered": choice([True, False]),
-                "macrandom": choice(["Disabled", "Enabled", "Daily"]),
-            }
+            f"network {n}": NetworkProfile(
+                auth="WPA2-Personal",
+                psk=f"{token_urlsafe(randint(8,16))}",
+                metered=choice([True, False]),
+                macrandom=choice(["Disabled", "Enabled", "Daily"]),
+            )
             for n in range(1, int(quantity / 2), 1)
         }
         data_open = {
-            f"open network {n}": {
-                "auth": "Open",
-                "psk": "",
-                "metered": choice([True, False]),
-                "macrandom": choice(["Disabled", "Enabled", "Daily"]),
-            }
+            f"open network {n}": NetworkProfile(
+                auth="Open",
+                psk="",
+                metered=choice([True, False]),
+                macrandom=choice(["Disabled", "Enabled", "Daily"]),
+            )
             for n in range(1, int(quantity / 2), 1)
         }
         data = {**data_wpa, **data_open}
@@ -115,9 +164,19 @@ class WifiPasswordsMacos:
         return self.data
 
     def get_visible_networks(self, as_dictionary=False) -> str:
+        return self._parse_visible_networks(
+            self._command_runner(["airport", "-s"]), as_dictionary
+        )
+
+    async def get_visible_networks_async(self, command_runner, as_dictionary=False) -> str:
+        return self._parse_visible_networks(
+            await command_runner(["airport", "-s"]), as_dictionary
+        )
+
+    def _parse_visible_networks(self, airport_output: str, as_dictionary=False):
         network_dict = {}
         network_list = []
-        current_networks = self._command_runner(["airport", "-s"]).split("\n")
+        current_networks = airport_output.split("\n")
         # remove blank/whitespace entries
         current_networks[:] = [network for network in current_networks if network.strip()]
         # discard header row
@@ -129,12 +188,9 @@ class WifiPasswordsMacos:
             encryption = re.search(r"\S*$", network.strip())[0]
 
             if as_dictionary:
-                network_dict[ssid] = {
-                    "bssids": bssids,
-                    "channel": channel,
-                    "signal": rssi,
-                    "encryption": encryption,
-                }
+                network_dict[ssid] = VisibleNetwork(
+                    bssids=bssids, channel=channel, signal=rssi, encryption=encryption
+                )
             else:
                 network_list.append(
                     f"{ssid}\n BSSID: {bssids}\n Channel: {channel}\n Signal (RSSI): {rssi}\n Security: {encryption}\n"
@@ -151,9 +207,48 @@ class WifiPasswordsMacos:
                 + "\n".join(network_list)
             )
 
+    @staticmethod
+    def _parse_visible_bssids(airport_output: str) -> list:
+        bssids = []
+        for network in airport_output.split("\n"):
+            match = re.match(
+                r"\s*(.*?)\s+((?:[0-9a-f]{2}:){5}[0-9a-f]{2})\s+(-?\d+)\s+(\d+)", network
+            )
+            if match is not None:
+                ssid, bssid, rssi, channel = match.groups()
+                # airport -s doesn't report the rate
+                bssids.append(
+                    (bssid, ssid or "Hidden", float(rssi), int(channel), float("nan"))
+                )
+        return bssids
+
+    def get_visible_bssids(self) -> list:
+        """
+        Returns a (bssid, ssid, signal, channel, rate) tuple for every access point seen.\n
+        signal is the RSSI in dBm, rate is always nan.\n
+        """
+        return self._parse_visible_bssids(self._command_runner(["airport", "-s"]))
+
+    async def get_visible_bssids_async(self, command_runner) -> list:
+        return self._parse_visible_bssids(await command_runner(["airport", "-s"]))
+
     def get_dns_config(self, as_dictionary=False) -> str:
-        dns_settings = self._command_runner(["scutil", "--dns"])
-        interfaces_data = self._command_runner(["ifconfig"]).strip().split("\n")
+        return self._parse_dns_config(
+            self._command_runner(["scutil", "--dns"]),
+            self._command_runner(["ifconfig"]),
+            as_dictionary,
+        )
+
+    async def get_dns_config_async(self, command_runner, as_dictionary=False) -> str:
+        import asyncio
+
+        dns_settings, ifconfig = await asyncio.gather(
+            command_runner(["scutil", "--dns"]), command_runner(["ifconfig"])
+        )
+        return self._parse_dns_config(dns_settings, ifconfig, as_dictionary)
+
+    def _parse_dns_config(self, dns_settings: str, ifconfig: str, as_dictionary=False):
+        interfaces_data = ifconfig.strip().split("\n")
 
         dns_dict = {}
 
@@ -208,51 +303,34 @@ class WifiPasswordsMacos:
             return dns_string
 
     def save_wpa_supplicant(
-        self, path: str, data: dict = None, include_open: bool = True, locale: str = "GB"
-    ) -> None:
-        from datetime import datetime
-        from platform import uname
-
+        self,
+        path: str,
+        data: dict = None,
+        include_open: bool = True,
+        locale: str = "GB",
+        precompute_psk: bool = False,
+        psk_cache: bool = True,
+        since=None,
+    ):
         if data is None:
             data = self.data
 
-        with open(os.path.join(path), "w", newline="\n") as fout:
-            fout.write(f"# Generated by wifipasswords {__version__}\n")
-            fout.write(f"# Created: {datetime.today()}\n")
-            fout.write(f"# Device: {uname().system} {uname().version} - {uname().node}\n")
-            fout.write(f"# Detected country code: {locale}\n")
-            fout.write("\n")
-            fout.write("ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev\n")
-            fout.write("update_config=1\n")
-            fout.write(f"country={locale}\n")
-            fout.write("\n")
-            fout.write("# ######## WPA ########\n")
-            for key, n in data.items():
-                if n["auth"] == "WPA2-Personal":
-                    fout.write("network={\n")
-                    fout.write('\tssid="{}"\n'.format(key))
-                    fout.write('\tpsk="{}"\n'.format(n["psk"]))
-                    fout.write("\tkey_mgmt=WPA-PSK\n")
-                    fout.write('\tid_str="{}"\n'.format(key))
-                    fout.write("}\n")
-            fout.write("\n")
-            if include_open:
-                fout.write("# ######## OPEN ########\n")
-                for key, n in data.items():
-                    if n["auth"] == "" or n["auth"] == "Open":
-                        fout.write("network={\n")
-                        fout.write('\tssid="{}"\n'.format(key))
-                        fout.write("\tkey_mgmt=NONE\n")
-                        fout.write('\tid_str="{}"\n'.format(key))
-                        fout.write("\tpriority=-999\n")
-                        fout.write("}\n")
-
-    def save_json(self, path: str, data: dict = None) -> None:
+        return export.save_wpa_supplicant(
+            path, data, include_open, locale, precompute_psk, psk_cache, since
+        )
+
+    def save_json(
+        self,
+        path: str,
+        data: dict = None,
+        ndjson: bool = False,
+        fsync: bool = True,
+        since=None,
+    ):
         if data is None:
             data = self.data
 
-        with open(os.path.join(path), "w") as fout:
-            json.dump(data, fout)
+        return export.save_json(path, data, ndjson, fsync, since)
 
     def get_number_visible_networks(self) -> int:
         self.get_visible_networks()
@@ -263,64 +341,85 @@ class WifiPasswordsMacos:
         return self.number_of_interfaces
 
     def get_number_profiles(self) -> int:
-        if self.number_of_profiles == 0:
+        # the cache holds every profile after get_passwords until the ttl expires
+        cached = self.cache.get_all()
+        if cached is not None:
+            self.number_of_profiles = len(cached)
+        elif self.number_of_profiles == 0:
             self.get_passwords()
         return self.number_of_profiles
 
-    def get_currently_connected_ssids(self) -> list:
+    @staticmethod
+    def _parse_connected_ssids(airport_info: str) -> list:
         connected_ssids = []
-        current_interfaces = self._command_runner([self.airport, "-I"]).split("\n")
-
-        for line in current_interfaces:
+        for line in airport_info.split("\n"):
             if " SSID" in line:
                 connected_ssids.append(line.split(":")[1].strip())
 
         return connected_ssids
 
+    def get_currently_connected_ssids(self) -> list:
+        return self._parse_connected_ssids(self._command_runner([self.airport, "-I"]))
+
+    async def get_currently_connected_ssids_async(self, command_runner) -> list:
+        return self._parse_connected_ssids(await command_runner([self.airport, "-I"]))
+
     def get_currently_connected_passwords(self) -> list:
         connected_passwords = []
         connected_ssids = self.get_currently_connected_ssids()
 
         for ssid in connected_ssids:
-            psk = self._command_runner(
-                ["security", "find-generic-password", "-a", ssid, "-w"]
-            ).strip()
-            connected_passwords.append((ssid, psk))
+            try:
+                connected_passwords.append((ssid, self.get_single_password(ssid)))
+            except ValueError:
+                connected_passwords.append((ssid, ""))
 
         return connected_passwords
 
-    def get_known_ssids(self) -> list:
-        keychain_ssids = []
-        keychain_dump = self._command_runner(["security", "dump-keychain"])
-        keychain_items = [
-            keychain_item.split("\n")
-            for keychain_item in keychain_dump.split("attributes:")
-            if "AirPort network password" in keychain_item
+    async def get_currently_connected_passwords_async(self, command_runner) -> list:
+        import asyncio
+
+        connected_ssids = await self.get_currently_connected_ssids_async(command_runner)
+        psks = await asyncio.gather(
+            *[
+                self.get_single_password_async(command_runner, ssid)
+                for ssid in connected_ssids
+            ],
+            return_exceptions=True,
+        )
+        return [
+            (ssid, "" if isinstance(psk, ValueError) else psk)
+            for ssid, psk in zip(connected_ssids, psks)
         ]
 
-        for item in keychain_items:
-            for row in item:
-                if '"acct"<blob>=' in row:
-                    blob = row.split('"acct"<blob>=')[1]
-                    if blob.startswith("0x"):
-                        # hex encoded due to unprintable chars - take as bytes and decode
-                        stripped_blob = blob.split("  ")[0]
-                        ssid = bytes.fromhex(stripped_blob[2:]).decode("utf-8")
-                    else:
-                        # string encoded, just remove 2 quotes.
-                        ssid = blob[1:-1]
-                    keychain_ssids.append(ssid)
-        return keychain_ssids
+    def get_known_ssids(self) -> list:
+        return self._parse_keychain_ssids(self._command_runner(["security", "dump-keychain"]))
 
-    def get_single_password(self, ssid) -> str:
-        return_data = subprocess.run(
-            ["security", "find-generic-password", "-a", ssid, "-w"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        err = return_data.stderr.decode("utf-8").strip()
+    async def get_known_ssids_async(self, command_runner) -> list:
+        return self._parse_keychain_ssids(await command_runner(["security", "dump-keychain"]))
+
+    def _check_single_password(self, ssid: str, psk: str, err: str) -> str:
         if "The specified item could not be found in the keychain." in err:
+            self.cache.put_missing(ssid)
             raise ValueError("SSID not known.")
-        psk = return_data.stdout.decode("utf-8").strip()
-
+        psk = psk.strip()
+        self.cache.put(ssid, {"psk": psk})
         return psk
+
+    def get_single_password(self, ssid) -> str:
+        psk = self.cache.get_psk(ssid)
+        if psk is not None:
+            return psk
+
+        return_data = run_command(self._password_command(ssid), stderr=subprocess.PIPE)
+        return self._check_single_password(
+            ssid, return_data.stdout.decode("utf-8"), return_data.stderr.decode("utf-8")
+        )
+
+    async def get_single_password_async(self, command_runner, ssid) -> str:
+        psk = self.cache.get_psk(ssid)
+        if psk is not None:
+            return psk
+
+        psk, err = await command_runner(self._password_command(ssid), include_stderr=True)
+        return self._check_single_password(ssid, psk, err)
@@ -15,21 +15,28 @@ __copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
 # along with this program.  If not, see < https: // www.gnu.org/licenses/>.
 
 import subprocess
-import os
-import json
 import re
-from multiprocessing.dummy import Pool as ThreadPool
 
-from . import __version__
+from .cache import ProfileCache
+from .concurrency import controller
+from .metrics import run_command
+from . import export
+from .records import NetworkProfile, VisibleNetwork
+from . import wlanprofile
 
 
 class WifiPasswordsWindows:
-    def __init__(self) -> None:
+    def __init__(self, use_export: bool = False) -> None:
+        # read every profile from one netsh wlan export instead of one netsh call per profile,
+        # exported profiles have no cost so metered is not reported
+        self.use_export = use_export
         self.data = {}
         self.number_of_profiles = 0
         self.number_visible_networks = 0
         self.number_of_interfaces = 0
-        self.net_template = {"auth": "", "psk": "", "metered": False, "macrandom": "Disabled"}
+        self.net_template = NetworkProfile()
+        # netsh has no cheap change indicator so cached profiles expire after a ttl
+        self.cache = ProfileCache(ttl=60.0)
 
     @staticmethod
     def _command_runner(shell_commands: list) -> str:
@@ -42,23 +49,19 @@ class WifiPasswordsWindows:
         # STARTUPINFO is only present on windows, not linux
         si = subprocess.STARTUPINFO()
         si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        return_data = subprocess.run(
-            shell_commands,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE,
-            startupinfo=si,
+        return run_command(
+            shell_commands, stderr=subprocess.PIPE, stdin=subprocess.PIPE, startupinfo=si
         ).stdout.decode("utf-8")
-        return return_data
 
-    def _get_password_subthread(self, network):
+    @staticmethod
+    def _profile_command(ssid: str) -> list:
+        return ["netsh", "wlan", "show", "profile", ssid, "key=clear"]
+
+    @staticmethod
+    def _parse_profile(profile_info: str, network: tuple) -> tuple:
         # network is a tuple from the networks dictionary
         # values are (ssid, value dictionary)
-        profile_info = self._command_runner(
-            ["netsh", "wlan", "show", "profile", network[0], "key=clear"]
-        ).split("\r\n")
-
-        for row in profile_info:
+        for row in profile_info.split("\r\n"):
             if "Key Content" in row:
                 network[1]["psk"] = row.split(": ")[1].strip()
             if "Authentication" in row:
@@ -70,24 +73,110 @@ class WifiPasswordsWindows:
                 network[1]["macrandom"] = row.split(": ")[1].strip()
         return network
 
-    def get_passwords(self) -> dict:
+    def _get_password_subthread(self, network):
+        return self._parse_profile(
+            self._command_runner(self._profile_command(network[0])), network
+        )
+
+    @staticmethod
+    def _parse_profile_names(profiles_list: str) -> list:
+        return [
+            (row.split(": ")[1])
+            for row in profiles_list.split("\r\n")
+            if "Profile     :" in row
+        ]
+
+    @staticmethod
+    def _export_command(folder: str) -> list:
+        return ["netsh", "wlan", "export", "profile", f"folder={folder}", "key=clear"]
+
+    def _export_passwords(self) -> dict:
+        """
+        Exports every profile as WLANProfile XML into a private temporary folder and parses it.\n
+        The folder is removed afterwards as the files contain the keys in clear text.\n
+        """
+        import tempfile
+
+        with tempfile.TemporaryDirectory(prefix="wifipasswords-") as folder:
+            self._command_runner(self._export_command(folder))
+            return wlanprofile.parse_profile_directory(folder)
+
+    def _iter_passwords(self, ordered: bool = True):
+        if self.use_export:
+            yield from self._export_passwords().items()
+            return
+
         profiles_list = self._command_runner(
             ["netsh", "wlan", "show", "profiles"],
-        ).split("\r\n")
+        )
 
         networks = {
-            (row.split(": ")[1]): self.net_template.copy()
-            for row in profiles_list
-            if "Profile     :" in row
+            name: self.net_template.copy() for name in self._parse_profile_names(profiles_list)
         }
 
-        # from testing 6 seems the optimum thread number
-        pool = ThreadPool(6)
-        results = dict(pool.imap(self._get_password_subthread, networks.items()))
-        pool.close()
-        pool.join()
+        from multiprocessing.dummy import Pool as ThreadPool
+
+        # threads wait on the shared concurrency controller, which picks the
+        # number of netsh calls actually running from the measured latency
+        pool = ThreadPool(controller.pool_size(len(networks)))
+        pool_map = pool.imap if ordered else pool.imap_unordered
+        try:
+            yield from pool_map(self._get_password_subthread, networks.items())
+        finally:
+            pool.close()
+            pool.join()
+
+    def _store_passwords(self, results: dict) -> None:
         self.number_of_profiles = len(results)
         self.data = results
+        self.cache.put_all(results)
+
+    def get_passwords(self) -> dict:
+        results = dict(self._iter_passwords())
+        self._store_passwords(results)
+        return results
+
+    def iter_passwords(self):
+        """
+        Generator yielding (ssid, network dictionary) as each profile fetch completes.\n
+        data is updated once all profiles have been yielded.\n
+        """
+        results = {}
+        for ssid, network in self._iter_passwords(ordered=False):
+            results[ssid] = network
+            yield ssid, network
+        self._store_passwords(results)
+
+    async def get_passwords_async(self, command_runner) -> dict:
+        """
+        asyncio version of get_passwords.\n
+        command_runner is a coroutine function taking the command list and returning stdout.\n
+        """
+        import asyncio
+
+        if self.use_export:
+            import tempfile
+
+            with tempfile.TemporaryDirectory(prefix="wifipasswords-") as folder:
+                await command_runner(self._export_command(folder))
+                results = wlanprofile.parse_profile_directory(folder)
+            self._store_passwords(results)
+            return results
+
+        networks = {
+            name: self.net_template.copy()
+            for name in self._parse_profile_names(
+                await command_runner(["netsh", "wlan", "show", "profiles"])
+            )
+        }
+        profile_infos = await asyncio.gather(
+            *[command_runner(self._profile_command(ssid)) for ssid in networks]
+        )
+        results = dict(
+            self._parse_profile(profile_info, network)
+            for profile_info, network in zip(profile_infos, networks.items())
+        )
+        self._store_passwords(results)
         return results
 
     def get_passwords_dummy(self, delay: float = 0.5, quantity: int = 10) -> dict:
@@ -97,21 +186,21 @@ class WifiPasswordsWindows:
 
         sleep(delay)
         data_wpa = {
-            f"network {n}": {
-                "auth": "WPA2-Personal",
-                "psk": f"{token_urlsafe(randint(8,16))}",
-                "metered": choice([True, False]),
-                "macrandom": choice(["Disabled", "Enabled", "Daily"]),
-            }
+            f"network {n}": NetworkProfile(
+                auth="WPA2-Personal",
+                psk=f"{token_urlsafe(randint(8,16))}",
+                metered=choice([True, False]),
+                macrandom=choice(["Disabled", "Enabled", "Daily"]),
+            )
             for n in range(1, int(quantity / 2), 1)
         }
         data_open = {
-            f"open network {n}": {
-                "auth": "Open",
-                "psk": "",
-                "metered": choice([True, False]),
-                "macrandom": choice(["Disabled", "Enabled", "Daily"]),
-            }
+            f"open network {n}": NetworkProfile(
+                auth="Open",
+                psk="",
+                metered=choice([True, False]),
+                macrandom=choice(["Disabled", "Enabled", "Daily"]),
+            )
             for n in range(1, int(quantity / 2), 1)
         }
         data = {**data_wpa, **data_open}
@@ -123,16 +212,23 @@ class WifiPasswordsWindows:
         return self.data
 
     def get_visible_networks(self, as_dictionary=False) -> str:
-        current_networks = self._command_runner(
-            ["netsh", "wlan", "show", "networks", "mode=Bssid"]
+        return self._parse_visible_networks(
+            self._command_runner(["netsh", "wlan", "show", "networks", "mode=Bssid"]),
+            as_dictionary,
+        )
+
+    async def get_visible_networks_async(self, command_runner, as_dictionary=False) -> str:
+        return self._parse_visible_networks(
+            await command_runner(["netsh", "wlan", "show", "networks", "mode=Bssid"]),
+            as_dictionary,
         )
+
+    def _parse_visible_networks(self, current_networks: str, as_dictionary=False):
         if "powered down" in current_networks:
             self.number_visible_networks = 0
         else:
             number = int(
-                re.findall(r"\d{1,2}(?= network.* currently visible)", current_networks)[
-                    0
-                ].strip()
+                re.findall(r"\d+(?= network.* currently visible)", current_networks)[0]
             )
             self.number_visible_networks = number
 
@@ -170,25 +266,76 @@ class WifiPasswordsWindows:
                         if "Basic rates" in row or "Other rates" in row:
                             rates.append(str(row.split(":")[1]))
 
-                        visible_dict[ssid] = {
-                            "type": net_type,
-                            "auth": auth,
-                            "encryption": encryption,
-                            "bssids": bssid,
-                            "signal": signal,
-                            "radios": radio,
-                            "channel": channel,
-                            "rates": rates,
-                        }
+                        visible_dict[ssid] = VisibleNetwork(
+                            type=net_type,
+                            auth=auth,
+                            encryption=encryption,
+                            bssids=bssid,
+                            signal=signal,
+                            radios=radio,
+                            channel=channel,
+                            rates=rates,
+                        )
                 return visible_dict
             else:
                 return {}
         else:
             return current_networks
 
+    @staticmethod
+    def _parse_visible_bssids(current_networks: str) -> list:
+        bssids = []
+        ssid = ""
+        current = None
+        for row in current_networks.splitlines():
+            name, _, value = row.partition(":")
+            name = name.strip()
+            value = value.strip()
+            if name.startswith("SSID "):
+                ssid = value or "Hidden"
+            elif name.startswith("BSSID "):
+                # rate is the highest basic or other rate, nan if none are listed
+                current = [value.lower(), ssid, float("nan"), 0, float("nan")]
+                bssids.append(current)
+            elif current is None:
+                continue
+            elif name == "Signal":
+                current[2] = float(value.rstrip("%"))
+            elif name == "Channel" and value.isdigit():
+                current[3] = int(value)
+            elif "rates" in name:
+                rates = [
+                    float(rate) for rate in value.split() if rate.replace(".", "").isdigit()
+                ]
+                if rates and not current[4] >= max(rates):
+                    current[4] = max(rates)
+        return [tuple(bssid) for bssid in bssids]
+
+    def get_visible_bssids(self) -> list:
+        """
+        Returns a (bssid, ssid, signal, channel, rate) tuple for every access point seen.\n
+        signal is the netsh signal quality in percent, rate the highest rate in Mbps.\n
+        """
+        return self._parse_visible_bssids(
+            self._command_runner(["netsh", "wlan", "show", "networks", "mode=Bssid"])
+        )
+
+    async def get_visible_bssids_async(self, command_runner) -> list:
+        return self._parse_visible_bssids(
+            await command_runner(["netsh", "wlan", "show", "networks", "mode=Bssid"])
+        )
+
     def get_dns_config(self, as_dictionary=False) -> str:
-        dns_settings = self._command_runner(["netsh", "interface", "ip", "show", "dns"])
+        return self._parse_dns_config(
+            self._command_runner(["netsh", "interface", "ip", "show", "dns"]), as_dictionary
+        )
+
+    async def get_dns_config_async(self, command_runner, as_dictionary=False) -> str:
+        return self._parse_dns_config(
+            await command_runner(["netsh", "interface", "ip", "show", "dns"]), as_dictionary
+        )
 
+    def _parse_dns_config(self, dns_settings: str, as_dictionary=False):
         split_dns_config = dns_settings.strip().split("\r\n\r\n")
         self.number_of_interfaces = len(split_dns_config)
 
@@ -215,50 +362,29 @@ class WifiPasswordsWindows:
         data: dict = None,
         include_open: bool = True,
         locale: str = "GB",
-    ) -> None:
-        from datetime import datetime
-        from platform import uname
-
+        precompute_psk: bool = False,
+        psk_cache: bool = True,
+        since=None,
+    ):
         if data is None:
             data = self.data
 
-        with open(os.path.join(path), "w", newline="\n") as fout:
-            fout.write(f"# Generated by wifipasswords {__version__}\n")
-            fout.write(f"# Created: {datetime.today()}\n")
-            fout.write(f"# Device: {uname().system} {uname().version} - {uname().node}\n")
-            fout.write(f"# Detected country code: {locale}\n")
-            fout.write("\n")
-            fout.write("ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev\n")
-            fout.write("update_config=1\n")
-            fout.write(f"country={locale}\n")
-            fout.write("\n")
-            fout.write("# ######## WPA ########\n")
-            for key, n in data.items():
-                if n["auth"] == "WPA2-Personal":
-                    fout.write("network={\n")
-                    fout.write('\tssid="{}"\n'.format(key))
-                    fout.write('\tpsk="{}"\n'.format(n["psk"]))
-                    fout.write("\tkey_mgmt=WPA-PSK\n")
-                    fout.write('\tid_str="{}"\n'.format(key))
-                    fout.write("}\n")
-            fout.write("\n")
-            if include_open:
-                fout.write("# ######## OPEN ########\n")
-                for key, n in data.items():
-                    if n["auth"] == "" or n["auth"] == "Open":
-                        fout.write("network={\n")
-                        fout.write('\tssid="{}"\n'.format(key))
-                        fout.write("\tkey_mgmt=NONE\n")
-                        fout.write('\tid_str="{}"\n'.format(key))
-                        fout.write("\tpriority=-999\n")
-                        fout.write("}\n")
-
-    def save_json(self, path: str, data: dict = None) -> None:
+        return export.save_wpa_supplicant(
+            path, data, include_open, locale, precompute_psk, psk_cache, since
+        )
+
+    def save_json(
+        self,
+        path: str,
+        data: dict = None,
+        ndjson: bool = False,
+        fsync: bool = True,
+        since=None,
+    ):
         if data is None:
             data = self.data
 
-        with open(os.path.join(path), "w") as fout:
-            json.dump(data, fout)
+        return export.save_json(path, data, ndjson, fsync, since)
 
     def get_number_visible_networks(self) -> int:
         self.get_visible_networks()
@@ -269,17 +395,18 @@ class WifiPasswordsWindows:
         return self.number_of_interfaces
 
     def get_number_profiles(self) -> int:
-        if self.number_of_profiles == 0:
+        # the cache holds every profile after get_passwords until the ttl expires
+        cached = self.cache.get_all()
+        if cached is not None:
+            self.number_of_profiles = len(cached)
+        elif self.number_of_profiles == 0:
             self.get_passwords()
         return self.number_of_profiles
 
-    def get_currently_connected_ssids(self) -> list:
+    @staticmethod
+    def _parse_connected_ssids(current_interfaces: str) -> list:
         connected_ssids = []
-        current_interfaces = self._command_runner(
-            ["netsh", "wlan", "show", "interfaces"]
-        ).split("\r\n")
-
-        for line in current_interfaces:
+        for line in current_interfaces.split("\r\n"):
             # space before ssid prevents BSSID being captured
             if " SSID" in line:
                 # what if ssid contains : ? could it? would need workaround logic if so
@@ -287,39 +414,82 @@ class WifiPasswordsWindows:
 
         return connected_ssids
 
+    def get_currently_connected_ssids(self) -> list:
+        return self._parse_connected_ssids(
+            self._command_runner(["netsh", "wlan", "show", "interfaces"])
+        )
+
+    async def get_currently_connected_ssids_async(self, command_runner) -> list:
+        return self._parse_connected_ssids(
+            await command_runner(["netsh", "wlan", "show", "interfaces"])
+        )
+
+    @staticmethod
+    def _parse_key_content(key_data: str) -> str:
+        psk = ""
+        for row in key_data.split("\r\n"):
+            if "Key Content" in row:
+                psk = row.split(": ")[1].strip()
+        return psk
+
     def get_currently_connected_passwords(self) -> list:
         connected_passwords = []
         connected_ssids = self.get_currently_connected_ssids()
 
         for ssid in connected_ssids:
-            key_data = self._command_runner(
-                ["netsh", "wlan", "show", "profile", ssid, "key=clear"]
-            ).split("\r\n")
-            psk = ""
-            for row in key_data:
-                if "Key Content" in row:
-                    psk = row.split(": ")[1].strip()
-            connected_passwords.append((ssid, psk))
+            try:
+                connected_passwords.append((ssid, self.get_single_password(ssid)))
+            except ValueError:
+                connected_passwords.append((ssid, ""))
 
         return connected_passwords
 
-    def get_known_ssids(self) -> list:
-        profiles_list = self._command_runner(
-            ["netsh", "wlan", "show", "profiles"],
-        ).split("\r\n")
+    async def get_currently_connected_passwords_async(self, command_runner) -> list:
+        import asyncio
+
+        connected_ssids = await self.get_currently_connected_ssids_async(command_runner)
+        psks = await asyncio.gather(
+            *[
+                self.get_single_password_async(command_runner, ssid)
+                for ssid in connected_ssids
+            ],
+            return_exceptions=True,
+        )
+        return [
+            (ssid, "" if isinstance(psk, ValueError) else psk)
+            for ssid, psk in zip(connected_ssids, psks)
+        ]
 
-        return [(row.split(": ")[1]) for row in profiles_list if "Profile     :" in row]
+    def get_known_ssids(self) -> list:
+        return self._parse_profile_names(
+            self._command_runner(["netsh", "wlan", "show", "profiles"])
+        )
 
-    def get_single_password(self, ssid) -> str:
-        profile_info = self._command_runner(
-            ["netsh", "wlan", "show", "profile", ssid, "key=clear"]
+    async def get_known_ssids_async(self, command_runner) -> list:
+        return self._parse_profile_names(
+            await command_runner(["netsh", "wlan", "show", "profiles"])
         )
 
+    def _parse_single_password(self, ssid: str, profile_info: str) -> str:
         if "not found on the system" in profile_info:
+            self.cache.put_missing(ssid)
             raise ValueError("SSID not known.")
+        psk = self._parse_key_content(profile_info)
+        self.cache.put(ssid, {"psk": psk})
+        return psk
 
-        for row in profile_info.split("\r\n"):
-            if "Key Content" in row:
-                psk = row.split(": ")[1].strip()
-                return psk
-        return ""
+    def get_single_password(self, ssid) -> str:
+        psk = self.cache.get_psk(ssid)
+        if psk is not None:
+            return psk
+        return self._parse_single_password(
+            ssid, self._command_runner(self._profile_command(ssid))
+        )
+
+    async def get_single_password_async(self, command_runner, ssid) -> str:
+        psk = self.cache.get_psk(ssid)
+        if psk is not None:
+            return psk
+        return self._parse_single_password(
+            ssid, await command_runner(self._profile_command(ssid))
+        )
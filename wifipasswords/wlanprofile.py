@@ -0,0 +1,222 @@
+__copyright__ = "Copyright (C) 2019-2021 Joe Campbell"
+
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY
+# without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see < https: // www.gnu.org/licenses/>.
+
+import os
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import escape
+
+from .records import NetworkProfile
+
+# WLANProfile authentication values and the names netsh wlan show profile prints for them
+AUTHENTICATION_NAMES = {
+    "open": "Open",
+    "shared": "Shared",
+    "WPA": "WPA-Enterprise",
+    "WPAPSK": "WPA-Personal",
+    "WPA2": "WPA2-Enterprise",
+    "WPA2PSK": "WPA2-Personal",
+    "WPA3": "WPA3-Enterprise",
+    "WPA3ENT": "WPA3-Enterprise",
+    "WPA3ENT192": "WPA3-Enterprise",
+    "WPA3SAE": "WPA3-Personal",
+    "OWE": "OWE",
+}
+
+# auth values of every platform (lower case) as WLANProfile authentication and encryption,
+# enterprise and WEP networks have no exportable key and aren't included
+AUTHENTICATION_VALUES = {
+    "": ("open", "none"),
+    "open": ("open", "none"),
+    "wpa-personal": ("WPAPSK", "AES"),
+    "wpa2-personal": ("WPA2PSK", "AES"),
+    "wpa-psk": ("WPA2PSK", "AES"),
+    "wpa3-personal": ("WPA3SAE", "AES"),
+    "sae": ("WPA3SAE", "AES"),
+}
+
+_PROFILE_TEMPLATE = """<?xml version="1.0"?>
+<WLANProfile xmlns="http://www.microsoft.com/networking/WLAN/profile/v1">
+\t<name>{name}</name>
+\t<SSIDConfig>
+\t\t<SSID>
+\t\t\t<hex>{hex}</hex>
+\t\t\t<name>{name}</name>
+\t\t</SSID>
+\t</SSIDConfig>
+\t<connectionType>ESS</connectionType>
+\t<connectionMode>auto</connectionMode>
+\t<MSM>
+\t\t<security>
+\t\t\t<authEncryption>
+\t\t\t\t<authentication>{authentication}</authentication>
+\t\t\t\t<encryption>{encryption}</encryption>
+\t\t\t\t<useOneX>false</useOneX>
+\t\t\t</authEncryption>
+{shared_key}\t\t</security>
+\t</MSM>
+{mac_randomization}</WLANProfile>
+"""
+
+_SHARED_KEY_TEMPLATE = """\t\t\t<sharedKey>
+\t\t\t\t<keyType>{key_type}</keyType>
+\t\t\t\t<protected>false</protected>
+\t\t\t\t<keyMaterial>{key}</keyMaterial>
+\t\t\t</sharedKey>
+"""
+
+_MAC_RANDOMIZATION_TEMPLATE = """\t<MacRandomization xmlns="http://www.microsoft.com/networking/WLAN/profile/v3">
+\t\t<enableRandomization>true</enableRandomization>
+{everyday}\t</MacRandomization>
+"""
+
+
+def _local_name(tag: str) -> str:
+    # profile elements come from several schema versions, match on the name alone
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find(element, *path):
+    for name in path:
+        if element is None:
+            return None
+        element = next((child for child in element if _local_name(child.tag) == name), None)
+    return element
+
+
+def _text(element, *path) -> str:
+    element = _find(element, *path)
+    if element is None or element.text is None:
+        return ""
+    return element.text.strip()
+
+
+def decode_ssid_hex(ssid_hex: str) -> str:
+    """
+    Decodes the <hex> SSID of a profile, bytes that aren't utf-8 are replaced.\n
+    """
+    try:
+        return bytes.fromhex(ssid_hex).decode("utf-8", errors="replace")
+    except ValueError:
+        return ""
+
+
+def parse_wlan_profile(xml) -> tuple:
+    """
+    Parses one WLANProfile XML document as written by netsh wlan export profile key=clear.\n
+    Returns (profile name, NetworkProfile).\n
+    Exported profiles don't include the network cost, so metered is always False.\n
+    Raises ValueError if the document is not a WLANProfile.\n
+    Arguments:\n
+    - xml: XML document as str or bytes.\n
+    """
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"invalid profile XML: {e}") from e
+    if _local_name(root.tag) != "WLANProfile":
+        raise ValueError("not a WLANProfile document")
+
+    ssid = _find(root, "SSIDConfig", "SSID")
+    name = _text(root, "name") or _text(ssid, "name") or decode_ssid_hex(_text(ssid, "hex"))
+
+    security = _find(root, "MSM", "security")
+    authentication = _text(security, "authEncryption", "authentication")
+    network = NetworkProfile(
+        auth=AUTHENTICATION_NAMES.get(authentication, authentication),
+        psk=_text(security, "sharedKey", "keyMaterial"),
+    )
+
+    mac_randomization = _find(root, "MacRandomization")
+    if _text(mac_randomization, "enableRandomization") == "true":
+        if _text(mac_randomization, "randomizeEveryday") == "true":
+            network.macrandom = "Daily"
+        else:
+            network.macrandom = "Enabled"
+    return name, network
+
+
+def build_wlan_profile(name: str, network):
+    """
+    Returns a WLANProfile XML document for a profile, as netsh wlan export profile key=clear
+    writes and netsh wlan add profile reads.\n
+    Returns None for profiles without an exportable key, e.g. enterprise and WEP networks.\n
+    """
+    values = AUTHENTICATION_VALUES.get(network["auth"].lower())
+    if values is None:
+        return None
+    authentication, encryption = values
+
+    shared_key = ""
+    if authentication != "open":
+        psk = network["psk"]
+        is_hex = len(psk) == 64 and all(c in "0123456789abcdefABCDEF" for c in psk)
+        shared_key = _SHARED_KEY_TEMPLATE.format(
+            key_type="networkKey" if is_hex else "passPhrase", key=escape(psk)
+        )
+    mac_randomization = ""
+    if network.get("macrandom") in ("Enabled", "Daily"):
+        mac_randomization = _MAC_RANDOMIZATION_TEMPLATE.format(
+            everyday=(
+                "\t\t<randomizeEveryday>true</randomizeEveryday>\n"
+                if network.get("macrandom") == "Daily"
+                else ""
+            )
+        )
+    return _PROFILE_TEMPLATE.format(
+        name=escape(name),
+        hex=name.encode("utf-8").hex().upper(),
+        authentication=authentication,
+        encryption=encryption,
+        shared_key=shared_key,
+        mac_randomization=mac_randomization,
+    )
+
+
+def _parse_file(path: str):
+    try:
+        with open(path, "rb") as fin:
+            return parse_wlan_profile(fin.read())
+    except (OSError, ValueError):
+        return None
+
+
+def parse_profile_directory(folder: str, threads: int = 4) -> dict:
+    """
+    Parses every *.xml WLANProfile in folder, as written by one netsh wlan export profile.\n
+    Files are read and parsed on a thread pool, unreadable or invalid files are skipped.\n
+    Returns {profile name: NetworkProfile} sorted by profile name.\n
+    Arguments:\n
+    - threads: number of worker threads.\n
+    """
+    paths = [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(".xml")
+    ]
+    if len(paths) > 1 and threads > 1:
+        from multiprocessing.dummy import Pool as ThreadPool
+
+        pool = ThreadPool(min(threads, len(paths)))
+        try:
+            parsed = pool.map(_parse_file, paths, chunksize=16)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        parsed = [_parse_file(path) for path in paths]
+    return dict(
+        sorted((result for result in parsed if result is not None), key=lambda r: r[0])
+    )